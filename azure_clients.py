@@ -0,0 +1,174 @@
+import os
+import time
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resource_graph import active_span
+
+# Placeholder subscription for a local ARM stub when none is configured
+LOCAL_SUBSCRIPTION_ID = '00000000-0000-0000-0000-000000000000'
+
+# Attributes every HTTP attempt the clients make to the provisioning span it belongs to (see
+# resource_graph.run_graph). Requests sent while a node's start()/current() runs on the calling thread
+# belong to that node; so do the later requests, from the SDK's poller threads, to the polling URLs
+# (Azure-AsyncOperation/Location) and the resource URL its responses pointed at. Those count as polls.
+class OperationTracker:
+    POLLING_HEADERS = ('Azure-AsyncOperation', 'Location', 'Operation-Location')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans_by_url = {}
+
+    @staticmethod
+    def _key(url):
+        return url.split('?')[0].lower()
+
+    def send(self, next_policy, request):
+        url = request.http_request.url
+        scope = active_span()
+        polling = scope is None
+        if polling:
+            with self._lock:
+                scope = self._spans_by_url.get(self._key(url))
+        # The pipeline context is shared by the retries of one request
+        attempt = request.context.get('operation_attempt', 0) + 1
+        request.context['operation_attempt'] = attempt
+        started = time.monotonic()
+        response = None
+        try:
+            response = next_policy.send(request)
+            return response
+        finally:
+            if scope is not None:
+                self._record(scope, request.http_request.method, url, response, started, attempt, polling)
+
+    def _record(self, scope, method, url, response, started, attempt, polling):
+        span, origin = scope
+        http_response = response.http_response if response is not None else None
+        with self._lock:
+            if http_response is not None:
+                if not polling:
+                    self._spans_by_url[self._key(url)] = scope
+                for header in self.POLLING_HEADERS:
+                    if http_response.headers.get(header):
+                        self._spans_by_url[self._key(http_response.headers[header])] = scope
+            span['http_requests'] = span.get('http_requests', 0) + 1
+            span['polls'] = span.get('polls', 0) + (1 if polling else 0)
+            span['retries'] = span.get('retries', 0) + (1 if attempt > 1 else 0)
+            span.setdefault('requests', []).append({
+                'method': method, 'path': urlsplit(url).path, 'status': http_response.status_code if http_response is not None else 'error',
+                'start_s': round(started - origin, 3), 'seconds': round(time.monotonic() - started, 3), 'attempt': attempt, 'poll': polling})
+
+# Per-retry pipeline policy handing each attempt to the shared tracker (a policy instance belongs to one pipeline)
+class OperationRecorder:
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.next = None
+
+    def send(self, request):
+        return self.tracker.send(self.next, request)
+
+# Azure management clients, each created on first use. All of them share one credential (so a token is
+# fetched once per scope, not once per client) and one requests session (one connection pool), and
+# nothing authenticates or even imports the SDK until a client is actually needed.
+# arm_endpoint (or AZURE_ARM_ENDPOINT) points the clients at another ARM endpoint; a plain http:// one
+# is treated as a local stub (see benchmarks/fake_arm.py): no credentials, no authentication.
+class AzureClients:
+    def __init__(self, subscription_id=None, tenant_id=None, client_id=None, client_secret=None, pool_size=20, arm_endpoint=None,
+                 polling_interval=None):
+        self.arm_endpoint = arm_endpoint or os.getenv('AZURE_ARM_ENDPOINT')
+        self.local = bool(self.arm_endpoint) and self.arm_endpoint.startswith('http://')
+        self.subscription_id = subscription_id or os.getenv('AZURE_SUBSCRIPTION_ID') or (LOCAL_SUBSCRIPTION_ID if self.local else None)
+        self.tenant_id = tenant_id or os.getenv('AZURE_TENANT_ID')
+        self.client_id = client_id or os.getenv('AZURE_CLIENT_ID')
+        self.client_secret = client_secret or os.getenv('AZURE_CLIENT_SECRET')
+        self.pool_size = pool_size
+        self.polling_interval = polling_interval  # LRO poll interval when ARM sends no Retry-After (SDK default: 30s)
+        self._lock = threading.RLock()
+        self._session = None
+        self._credential = None
+        self._clients = {}
+        self.tracker = OperationTracker()
+
+    def _transport(self):
+        from azure.core.pipeline.transport import RequestsTransport
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                self._session.mount('https://', adapter)
+                self._session.mount('http://', adapter)
+        # Each client gets its own transport wrapper; none of them owns (or closes) the shared session
+        return RequestsTransport(session=self._session, session_owner=False)
+
+    @property
+    def credential(self):
+        with self._lock:
+            if self._credential is None and self.local:
+                self._credential = object()  # Never asked for a token: the stub clients skip authentication
+            if self._credential is None:
+                if not all([self.subscription_id, self.tenant_id, self.client_id, self.client_secret]):
+                    raise EnvironmentError("One or more Azure credentials are not set in the environment variables.")
+                from azure.identity import ClientSecretCredential
+                self._credential = ClientSecretCredential(self.tenant_id, self.client_id, self.client_secret, transport=self._transport())
+            return self._credential
+
+    def _client(self, name, factory):
+        with self._lock:
+            if name not in self._clients:
+                kwargs = {'transport': self._transport(), 'per_retry_policies': [OperationRecorder(self.tracker)]}
+                if self.arm_endpoint:
+                    kwargs['base_url'] = self.arm_endpoint
+                if self.polling_interval is not None:
+                    kwargs['polling_interval'] = self.polling_interval
+                if self.local:
+                    from azure.core.pipeline.policies import SansIOHTTPPolicy
+                    kwargs['authentication_policy'] = SansIOHTTPPolicy()
+                self._clients[name] = factory(self.credential, self.subscription_id, **kwargs)
+            return self._clients[name]
+
+    @property
+    def resource(self):
+        from azure.mgmt.resource import ResourceManagementClient
+        return self._client('resource', ResourceManagementClient)
+
+    @property
+    def network(self):
+        from azure.mgmt.network import NetworkManagementClient
+        return self._client('network', NetworkManagementClient)
+
+    @property
+    def acr(self):
+        from azure.mgmt.containerregistry import ContainerRegistryManagementClient
+        return self._client('acr', ContainerRegistryManagementClient)
+
+    @property
+    def key_vault(self):
+        from azure.mgmt.keyvault import KeyVaultManagementClient
+        return self._client('key_vault', KeyVaultManagementClient)
+
+    @property
+    def storage(self):
+        from azure.mgmt.storage import StorageManagementClient
+        return self._client('storage', StorageManagementClient)
+
+    @property
+    def aks(self):
+        from azure.mgmt.containerservice import ContainerServiceClient
+        return self._client('aks', ContainerServiceClient)
+
+    @property
+    def compute(self):
+        from azure.mgmt.compute import ComputeManagementClient
+        return self._client('compute', ComputeManagementClient)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            self._clients.clear()
+            self._credential = None
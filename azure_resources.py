@@ -1,233 +1,346 @@
-import os
+import re
 import uuid
+import argparse
 import datetime
-from azure.identity import ClientSecretCredential
-from azure.mgmt.resource import ResourceManagementClient
-from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.containerregistry import ContainerRegistryManagementClient
-from azure.mgmt.keyvault import KeyVaultManagementClient
-from azure.mgmt.storage import StorageManagementClient
-from azure.mgmt.containerservice import ContainerServiceClient
-from azure.storage.fileshare import ShareServiceClient
-
-# Fetch credentials from environment variables
-subscription_id = os.getenv('AZURE_SUBSCRIPTION_ID')
-tenant_id = os.getenv('AZURE_TENANT_ID')
-client_id = os.getenv('AZURE_CLIENT_ID')
-client_secret = os.getenv('AZURE_CLIENT_SECRET')
-
-if not all([subscription_id, tenant_id, client_id, client_secret]):
-    raise EnvironmentError("One or more Azure credentials are not set in the environment variables.")
+from resource_graph import run_graph, print_timeline, write_timeline, GraphError
+from azure_clients import AzureClients
+from metadata_cache import MetadataCache, DEFAULT_CACHE_DIR
 
+# Credentials come from AZURE_SUBSCRIPTION_ID/AZURE_TENANT_ID/AZURE_CLIENT_ID/AZURE_CLIENT_SECRET,
+# read by AzureClients when the first client is created (importing this module does not authenticate)
 location = 'eastus'
+environment_ttl_days = 2  # Environments are due for teardown this many days after creation
 tags = {
     'DateOfCommission': datetime.datetime.now().strftime("%Y-%m-%d"),
-    'DateOfDecommission': 'TBD',
+    'DateOfDecommission': (datetime.datetime.now() + datetime.timedelta(days=environment_ttl_days)).strftime("%Y-%m-%d"),
     'CreatedBy': 'YourName',
     'PurposeOfCreation': 'Testing'
 }
 vnet_address_space = '10.4.0.0/20'
 custom_vnet_address_space = None  # Set this to customize VNET address space
+subnet_address_prefix = '10.4.0.0/24'
+file_share_quota = 5
+aks_node_count = 3
+aks_vm_size = 'Standard_E4s_v3'
+
+# Tags that legitimately differ between runs and are not treated as drift when reconciling
+reconcile_ignored_tags = {'DateOfCommission', 'DateOfDecommission'}
+
+# A stable, named environment is kept until someone removes it, so it never expires by date (environment_gc
+# would otherwise delete it environment_ttl_days after it was first created, however often it is reconciled)
+stable_environment_tags = {'DateOfDecommission': 'TBD'}
+
+# Environments are due for teardown on their DateOfDecommission; 'TBD' or a missing tag never expires by date
+def past_decommission(resource_group):
+    try:
+        return datetime.datetime.strptime((resource_group.tags or {}).get('DateOfDecommission', ''), "%Y-%m-%d").date() <= datetime.date.today()
+    except ValueError:
+        return False
 
 # Generate a consistent UUID
 unique_id = uuid.uuid4().hex[:5]
 
-# Authenticate using service principal
-credential = ClientSecretCredential(tenant_id, client_id, client_secret)
-
 def get_supported_aks_versions(aks_client, location):
-    try:
-        orchestrators = aks_client.container_services.list_orchestrators(location, resource_type='managedClusters')
-        versions = [version.orchestrator_version for version in orchestrators.orchestrators]
-        versions.sort(key=lambda x: list(map(int, x.split('.'))))  # Sort versions
-        return versions
-    except Exception as e:
-        print(f"Failed to get AKS versions: {e}")
-        exit(1)
+    orchestrators = aks_client.container_services.list_orchestrators(location, resource_type='managedClusters')
+    versions = [version.orchestrator_version for version in orchestrators.orchestrators]
+    versions.sort(key=lambda x: list(map(int, x.split('.'))))  # Sort versions
+    return versions
 
-def create_resource_group(resource_client, resource_group_name):
-    try:
-        resource_group_params = {'location': location, 'tags': tags}
-        resource_group = resource_client.resource_groups.create_or_update(resource_group_name, resource_group_params)
-        print(f"Resource group '{resource_group_name}' created.")
-        return resource_group
-    except Exception as e:
-        print(f"Failed to create resource group: {e}")
-        exit(1)
+# VM sizes the subscription may deploy in a location (sizes with a location-wide restriction are left out)
+def get_available_vm_sizes(compute_client, location):
+    skus = compute_client.resource_skus.list(filter=f"location eq '{location}'")
+    return sorted({sku.name for sku in skus if sku.resource_type == 'virtualMachines'
+                   and not any(restriction.type == 'Location' for restriction in sku.restrictions or [])})
 
-def create_virtual_network(network_client, resource_group_name, vnet_name, custom_vnet_address_space):
-    try:
-        vnet_params = {
-            'location': location,
-            'address_space': {
-                'address_prefixes': [custom_vnet_address_space or vnet_address_space]
-            }
-        }
-        vnet_result = network_client.virtual_networks.begin_create_or_update(resource_group_name, vnet_name, vnet_params).result()
-        print(f"Virtual network '{vnet_name}' created.")
-        return vnet_result
-    except Exception as e:
-        print(f"Failed to create virtual network: {e}")
-        exit(1)
+# Slow-changing lookups go through the metadata cache when there is one
+def cached(metadata_cache, key, fetch):
+    return metadata_cache.get(key, fetch) if metadata_cache else fetch()
 
-def create_subnet(network_client, resource_group_name, vnet_name, subnet_name):
-    try:
-        subnet_params = {
-            'address_prefix': '10.4.0.0/24',
-            'service_endpoints': [{'service': 'Microsoft.Storage'}]  # Add service endpoint
-        }
-        subnet_result = network_client.subnets.begin_create_or_update(resource_group_name, vnet_name, subnet_name, subnet_params).result()
-        print(f"Subnet '{subnet_name}' created with Microsoft.Storage service endpoint.")
-        return subnet_result
-    except Exception as e:
-        print(f"Failed to create subnet: {e}")
-        exit(1)
+# The begin_* functions submit a resource and return its LROPoller without waiting for it;
+# run_graph polls the in-flight operations together. Synchronous APIs return the final result.
+def create_resource_group(resource_client, resource_group_name, extra_tags=None):
+    resource_group_params = {'location': location, 'tags': {**tags, **(extra_tags or {})}}
+    return resource_client.resource_groups.create_or_update(resource_group_name, resource_group_params)
 
-def create_container_registry(acr_client, resource_group_name, acr_name):
-    try:
-        acr_params = {
-            'location': location,
-            'sku': {'name': 'Basic'},
-            'admin_user_enabled': True,
-            'tags': tags
+def begin_virtual_network(network_client, resource_group_name, vnet_name, custom_vnet_address_space):
+    vnet_params = {
+        'location': location,
+        'address_space': {
+            'address_prefixes': [custom_vnet_address_space or vnet_address_space]
         }
-        acr_result = acr_client.registries.begin_create(resource_group_name, acr_name, acr_params).result()
-        print(f"Container registry '{acr_name}' created.")
-        return acr_result
-    except Exception as e:
-        print(f"Failed to create container registry: {e}")
-        exit(1)
+    }
+    return network_client.virtual_networks.begin_create_or_update(resource_group_name, vnet_name, vnet_params)
 
-def create_key_vault(key_vault_client, resource_group_name, kv_name):
-    try:
-        kv_params = {
-            'location': location,
-            'properties': {
-                'sku': {'family': 'A', 'name': 'standard'},
-                'tenant_id': tenant_id,
-                'access_policies': []
-            },
-            'tags': tags
-        }
-        kv_result = key_vault_client.vaults.begin_create_or_update(resource_group_name, kv_name, kv_params).result()
-        print(f"Key Vault '{kv_name}' created.")
-        return kv_result
-    except Exception as e:
-        print(f"Failed to create key vault: {e}")
-        exit(1)
+def begin_subnet(network_client, resource_group_name, vnet_name, subnet_name):
+    subnet_params = {
+        'address_prefix': subnet_address_prefix,
+        'service_endpoints': [{'service': 'Microsoft.Storage'}]  # Add service endpoint
+    }
+    return network_client.subnets.begin_create_or_update(resource_group_name, vnet_name, subnet_name, subnet_params)
 
-def create_storage_account(storage_client, resource_group_name, storage_account_name, vnet_name, subnet_name):
-    try:
-        storage_params = {
-            'location': location,
-            'sku': {'name': 'Standard_LRS'},
-            'kind': 'StorageV2',
-            'tags': tags,
-            'properties': {
-                'publicNetworkAccess': 'Disabled',  # Disable public network access
-                'allowBlobPublicAccess': False,  # Explicitly deny blob public access
-                'networkAcls': {
-                    'bypass': 'AzureServices',
-                    'virtualNetworkRules': [
-                        {
-                            'id': f'/subscriptions/{subscription_id}/resourceGroups/{resource_group_name}/providers/Microsoft.Network/virtualNetworks/{vnet_name}/subnets/{subnet_name}'
-                        }
-                    ],
-                    'defaultAction': 'Deny'
-                }
+def begin_container_registry(acr_client, resource_group_name, acr_name):
+    acr_params = {
+        'location': location,
+        'sku': {'name': 'Basic'},
+        'admin_user_enabled': True,
+        'tags': tags
+    }
+    return acr_client.registries.begin_create(resource_group_name, acr_name, acr_params)
+
+def begin_key_vault(key_vault_client, resource_group_name, kv_name, tenant_id):
+    kv_params = {
+        'location': location,
+        'properties': {
+            'sku': {'family': 'A', 'name': 'standard'},
+            'tenant_id': tenant_id,
+            'access_policies': []
+        },
+        'tags': tags
+    }
+    return key_vault_client.vaults.begin_create_or_update(resource_group_name, kv_name, kv_params)
+
+def begin_storage_account(storage_client, resource_group_name, storage_account_name, vnet_name, subnet_name, subscription_id):
+    storage_params = {
+        'location': location,
+        'sku': {'name': 'Standard_LRS'},
+        'kind': 'StorageV2',
+        'tags': tags,
+        'properties': {
+            'publicNetworkAccess': 'Disabled',  # Disable public network access
+            'allowBlobPublicAccess': False,  # Explicitly deny blob public access
+            'networkAcls': {
+                'bypass': 'AzureServices',
+                'virtualNetworkRules': [
+                    {
+                        'id': f'/subscriptions/{subscription_id}/resourceGroups/{resource_group_name}/providers/Microsoft.Network/virtualNetworks/{vnet_name}/subnets/{subnet_name}'
+                    }
+                ],
+                'defaultAction': 'Deny'
             }
         }
-        storage_account = storage_client.storage_accounts.begin_create(resource_group_name, storage_account_name, storage_params).result()
-        print(f"Storage account '{storage_account_name}' created with restricted network access and no public blob access.")
-        return storage_account
-    except Exception as e:
-        print(f"Failed to create storage account: {e}")
-        exit(1)
+    }
+    return storage_client.storage_accounts.begin_create(resource_group_name, storage_account_name, storage_params)
 
 def create_file_share(storage_client, resource_group_name, storage_account_name, file_share_name):
-    try:
-        share_params = {'share_quota': 5}
-        file_share = storage_client.file_shares.create(resource_group_name, storage_account_name, file_share_name, share_params)
-        print(f"File share '{file_share_name}' created.")
-        return file_share
-    except Exception as e:
-        print(f"Failed to create file share: {e}")
-        exit(1)
+    share_params = {'share_quota': file_share_quota}
+    return storage_client.file_shares.create(resource_group_name, storage_account_name, file_share_name, share_params)
 
-def create_aks_cluster(aks_client, resource_group_name, aks_name, subnet_result):
-    try:
-        supported_versions = get_supported_aks_versions(aks_client, location)
+def begin_aks_cluster(aks_client, resource_group_name, aks_name, subnet_result, supported_versions, service_principal,
+                      available_vm_sizes=None, kubernetes_version=None):
+    if available_vm_sizes is not None and aks_vm_size not in available_vm_sizes:
+        raise ValueError(f"VM size {aks_vm_size} is not available to this subscription in {location}")
+
+    # An existing cluster being reconciled keeps its version; a new one gets n-1
+    if not kubernetes_version:
         if len(supported_versions) < 2:
-            print("Not enough AKS versions available to determine n-1 version.")
-            exit(1)
-        
-        # Select n-1 version
+            raise ValueError("Not enough AKS versions available to determine n-1 version.")
         kubernetes_version = supported_versions[-2]
-        print(f"Using AKS version: {kubernetes_version}")
-
-        aks_params = {
-            'location': location,
-            'kubernetes_version': kubernetes_version,
-            'agent_pool_profiles': [{
-                'name': 'nodepool1',
-                'count': 3,
-                'vm_size': 'Standard_E4s_v3',
-                'os_type': 'Linux',
-                'vnet_subnet_id': subnet_result.id,
-                'mode': 'System'
-            }],
-            'dns_prefix': 'aksdns',
-            'service_principal_profile': {
-                'client_id': client_id,
-                'secret': client_secret
-            },
-            'tags': tags
-        }
-        aks_result = aks_client.managed_clusters.begin_create_or_update(resource_group_name, aks_name, aks_params).result()
-        print(f"AKS Cluster '{aks_name}' created.")
-        return aks_result
-    except Exception as e:
-        print(f"Failed to create AKS cluster: {e}")
-        exit(1)
+    print(f"Using AKS version: {kubernetes_version}")
+
+    aks_params = {
+        'location': location,
+        'kubernetes_version': kubernetes_version,
+        'agent_pool_profiles': [{
+            'name': 'nodepool1',
+            'count': aks_node_count,
+            'vm_size': aks_vm_size,
+            'os_type': 'Linux',
+            'vnet_subnet_id': subnet_result.id,
+            'mode': 'System'
+        }],
+        'dns_prefix': 'aksdns',
+        'service_principal_profile': service_principal,
+        'tags': tags
+    }
+    return aks_client.managed_clusters.begin_create_or_update(resource_group_name, aks_name, aks_params)
+
+# GET a resource, returning None when it does not exist
+def get_or_none(get, *args):
+    from azure.core.exceptions import ResourceNotFoundError
+    try:
+        return get(*args)
+    except ResourceNotFoundError:
+        return None
+
+def _normalise_location(value):
+    return (value or '').replace(' ', '').lower()
+
+# Compare (label, actual, desired) triples, returning a description of each mismatch
+def drift(checks):
+    return [f"{label} is {actual!r}, want {desired!r}" for label, actual, desired in checks if actual != desired]
+
+def tag_checks(existing_tags):
+    existing_tags = existing_tags or {}
+    return [(f"tag {key}", existing_tags.get(key), value) for key, value in tags.items() if key not in reconcile_ignored_tags]
 
-# Resource Management Client
-resource_client = ResourceManagementClient(credential, subscription_id)
-resource_group_name = f'rg-{unique_id}'
-create_resource_group(resource_client, resource_group_name)
+# Tags passed in for this environment (extra_tags) are always compared, including the dates
+def resource_group_drift(resource_group, extra_tags=None):
+    extra = [(f"tag {key}", (resource_group.tags or {}).get(key), value) for key, value in (extra_tags or {}).items()]
+    return drift([('location', _normalise_location(resource_group.location), location)] + tag_checks(resource_group.tags) + extra)
 
-# Network Management Client
-network_client = NetworkManagementClient(credential, subscription_id)
-vnet_name = f'vnet-{unique_id}'
-vnet_result = create_virtual_network(network_client, resource_group_name, vnet_name, custom_vnet_address_space)
+def vnet_drift(vnet):
+    return drift([('location', _normalise_location(vnet.location), location),
+                  ('address prefixes', list(vnet.address_space.address_prefixes or []), [custom_vnet_address_space or vnet_address_space])])
 
-subnet_name = f'subnet-{unique_id}'
-subnet_result = create_subnet(network_client, resource_group_name, vnet_name, subnet_name)
+def subnet_drift(subnet):
+    services = sorted(endpoint.service for endpoint in subnet.service_endpoints or [])
+    return drift([('address prefix', subnet.address_prefix, subnet_address_prefix),
+                  ('service endpoints', services, ['Microsoft.Storage'])])
 
-# Container Registry Management Client
-acr_client = ContainerRegistryManagementClient(credential, subscription_id)
-acr_name = f'acr{unique_id}'
-create_container_registry(acr_client, resource_group_name, acr_name)
+def container_registry_drift(registry):
+    return drift([('location', _normalise_location(registry.location), location), ('sku', registry.sku.name, 'Basic'),
+                  ('admin user', registry.admin_user_enabled, True)] + tag_checks(registry.tags))
 
-# Key Vault Management Client
-key_vault_client = KeyVaultManagementClient(credential, subscription_id)
-kv_name = f'kv-{unique_id}'
-create_key_vault(key_vault_client, resource_group_name, kv_name)
+def key_vault_drift(vault):
+    return drift([('location', _normalise_location(vault.location), location), ('sku', vault.properties.sku.name, 'standard')]
+                 + tag_checks(vault.tags))
 
-# Storage Management Client
-storage_client = StorageManagementClient(credential, subscription_id)
-storage_account_name = f'sa{unique_id}'
-storage_account = create_storage_account(storage_client, resource_group_name, storage_account_name, vnet_name, subnet_name)
+def storage_account_drift(account):
+    return drift([('location', _normalise_location(account.location), location), ('sku', account.sku.name, 'Standard_LRS'),
+                  ('kind', account.kind, 'StorageV2')] + tag_checks(account.tags))
 
-file_share_name = 'tafjud'
-create_file_share(storage_client, resource_group_name, storage_account_name, file_share_name)
+def file_share_drift(share):
+    return drift([('quota', share.share_quota, file_share_quota)])
+
+def aks_cluster_drift(cluster):
+    pool = (cluster.agent_pool_profiles or [None])[0]
+    return drift([('location', _normalise_location(cluster.location), location),
+                  ('node count', pool.count if pool else None, aks_node_count),
+                  ('vm_size', pool.vm_size if pool else None, aks_vm_size)] + tag_checks(cluster.tags))
+
+# Resource DAG: RG -> VNet -> Subnet -> {Storage -> FileShare, AKS}; RG -> {ACR, KeyVault}.
+# The AKS version and VM size lookups have no dependencies and run on worker threads (background nodes),
+# so they overlap the resource group and network instead of delaying them (and come from the metadata
+# cache when it is fresh).
+# With reconcile, every resource is read first and only created/updated when missing or drifted.
+# clients is an AzureClients registry; only the clients a node actually uses get created.
+def environment_graph(clients, names, reconcile=False, extra_tags=None, metadata_cache=None):
+    rg = names['resource_group']
+    service_principal = {'client_id': clients.client_id, 'secret': clients.client_secret}
+    nodes = [
+        {'name': 'aks_versions', 'deps': [],
+         'start': lambda r: cached(metadata_cache, f"aks-versions-{location}", lambda: get_supported_aks_versions(clients.aks, location)),
+         'description': f"AKS version list for {location}", 'background': True,
+         'done': lambda versions: f"Supported AKS versions in {location}: {', '.join(versions)}"},
+        {'name': 'vm_sizes', 'deps': [],
+         'start': lambda r: cached(metadata_cache, f"vm-sizes-{clients.subscription_id}-{location}", lambda: get_available_vm_sizes(clients.compute, location)),
+         'description': f"VM size availability for {location}", 'background': True,
+         'done': lambda sizes: f"{len(sizes)} VM sizes available in {location}"},
+        {'name': 'resource_group', 'deps': [],
+         'start': lambda r: create_resource_group(clients.resource, rg, extra_tags),
+         'description': f"Resource group '{rg}'"},
+        {'name': 'vnet', 'deps': ['resource_group'],
+         'start': lambda r: begin_virtual_network(clients.network, rg, names['vnet'], custom_vnet_address_space),
+         'description': f"Virtual network '{names['vnet']}'"},
+        {'name': 'subnet', 'deps': ['vnet'],
+         'start': lambda r: begin_subnet(clients.network, rg, names['vnet'], names['subnet']),
+         'description': f"Subnet '{names['subnet']}'",
+         'done': lambda subnet: f"Subnet '{names['subnet']}' created with Microsoft.Storage service endpoint."},
+        {'name': 'acr', 'deps': ['resource_group'],
+         'start': lambda r: begin_container_registry(clients.acr, rg, names['acr']),
+         'description': f"Container registry '{names['acr']}'"},
+        {'name': 'key_vault', 'deps': ['resource_group'],
+         'start': lambda r: begin_key_vault(clients.key_vault, rg, names['key_vault'], clients.tenant_id),
+         'description': f"Key Vault '{names['key_vault']}'"},
+        {'name': 'storage', 'deps': ['subnet'],
+         'start': lambda r: begin_storage_account(clients.storage, rg, names['storage_account'], names['vnet'], names['subnet'],
+                                                  clients.subscription_id),
+         'description': f"Storage account '{names['storage_account']}'",
+         'done': lambda account: f"Storage account '{names['storage_account']}' created with restricted network access and no public blob access."},
+        {'name': 'file_share', 'deps': ['storage'],
+         'start': lambda r: create_file_share(clients.storage, rg, names['storage_account'], names['file_share']),
+         'description': f"File share '{names['file_share']}'"},
+        {'name': 'aks', 'deps': ['subnet', 'aks_versions', 'vm_sizes'],
+         'start': lambda r: begin_aks_cluster(clients.aks, rg, names['aks'], r['subnet'], r['aks_versions'], service_principal, r['vm_sizes']),
+         'description': f"AKS Cluster '{names['aks']}'"},
+    ]
+    if not reconcile:
+        return nodes
+
+    checks = {
+        'resource_group': (lambda r: get_or_none(clients.resource.resource_groups.get, rg), lambda group: resource_group_drift(group, extra_tags)),
+        'vnet': (lambda r: get_or_none(clients.network.virtual_networks.get, rg, names['vnet']), vnet_drift),
+        'subnet': (lambda r: get_or_none(clients.network.subnets.get, rg, names['vnet'], names['subnet']), subnet_drift),
+        'acr': (lambda r: get_or_none(clients.acr.registries.get, rg, names['acr']), container_registry_drift),
+        'key_vault': (lambda r: get_or_none(clients.key_vault.vaults.get, rg, names['key_vault']), key_vault_drift),
+        'storage': (lambda r: get_or_none(clients.storage.storage_accounts.get_properties, rg, names['storage_account']), storage_account_drift),
+        'file_share': (lambda r: get_or_none(clients.storage.file_shares.get, rg, names['storage_account'], names['file_share']), file_share_drift),
+        'aks': (lambda r: get_or_none(clients.aks.managed_clusters.get, rg, names['aks']), aks_cluster_drift),
+    }
+    for node in nodes:
+        if node['name'] not in checks:
+            continue
+        node['current'], node['drift'] = checks[node['name']]
+        if node['name'] == 'aks':
+            node['start'] = lambda r, existing: begin_aks_cluster(clients.aks, rg, names['aks'], r['subnet'], r['aks_versions'], service_principal,
+                                                                  r['vm_sizes'], kubernetes_version=existing.kubernetes_version if existing else None)
+        else:
+            node['start'] = lambda r, existing, start=node['start']: start(r)
+    return nodes
+
+def environment_names(unique_id):
+    return {
+        'resource_group': f'rg-{unique_id}',
+        'vnet': f'vnet-{unique_id}',
+        'subnet': f'subnet-{unique_id}',
+        'acr': f'acr{unique_id}',
+        'key_vault': f'kv-{unique_id}',
+        'storage_account': f'sa{unique_id}',
+        'file_share': 'tafjud',
+        'aks': f'aks-{unique_id}',
+    }
+
+# Names for a stable, named environment; ACR and storage account names only allow alphanumerics
+def stable_environment_names(name):
+    names = environment_names(name)
+    names.update(acr=f"acr{name.replace('-', '')}", storage_account=f"sa{name.replace('-', '')}")
+    return names
+
+def create_clients():
+    return AzureClients()
+
+# Names for a stable environment must fit the strictest resource rules (Key Vault: 24 characters). No '-':
+# ACR and storage account names drop it, so 'a-b' and 'ab' would share them
+def validate_environment_name(name):
+    if not re.fullmatch(r'[a-z0-9]{1,20}', name):
+        raise argparse.ArgumentTypeError("Environment name must be 1-20 lowercase letters or digits")
+    return name
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision the Azure test environment (resource group, network, ACR, Key Vault, storage, AKS)")
+    parser.add_argument('--environment', type=validate_environment_name,
+                        help="Reconcile a stable, named environment: reuse what exists and only create missing or drifted resources")
+    parser.add_argument('--metadata_cache_dir', default=DEFAULT_CACHE_DIR, help="Where AKS version and VM size lookups are cached")
+    parser.add_argument('--metadata_ttl', type=int, default=24 * 3600, help="Seconds a cached lookup is reused (0 refreshes it)")
+    parser.add_argument('--spans_file', help="Write per-operation spans (submit, LRO time, polls, retries, requests) as JSON")
+    parser.add_argument('--trace_file', help="Write the provisioning timeline in Chrome trace format")
+    args = parser.parse_args()
+
+    clients = create_clients()
+    if args.environment:
+        names = stable_environment_names(args.environment)
+        print(f"Reconciling environment '{args.environment}'")
+    else:
+        names = environment_names(unique_id)
+
+    try:
+        results, timeline = run_graph(environment_graph(clients, names, reconcile=bool(args.environment),
+                                                        extra_tags=stable_environment_tags if args.environment else None,
+                                                        metadata_cache=MetadataCache(args.metadata_cache_dir, args.metadata_ttl)))
+    except GraphError as e:
+        print(e)
+        # The timings of a failed run are the interesting ones; write them before giving up
+        print_timeline(e.timeline)
+        write_timeline(e.timeline, args.spans_file, args.trace_file)
+        exit(1)
+    print_timeline(timeline)
+    write_timeline(timeline, args.spans_file, args.trace_file)
 
-# Container Service Client
-aks_client = ContainerServiceClient(credential, subscription_id)
-aks_name = f'aks-{unique_id}'
-create_aks_cluster(aks_client, resource_group_name, aks_name, subnet_result)
+    # Print the resource group and AKS cluster names for Jenkins
+    print(f"RESOURCE_GROUP={names['resource_group']}")
+    print(f"AKS_CLUSTER={names['aks']}")
 
-# Print the resource group and AKS cluster names for Jenkins
-print(f"RESOURCE_GROUP={resource_group_name}")
-print(f"AKS_CLUSTER={aks_name}")
+    print("Script execution completed.")
 
-print("Script execution completed.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from fake_arm import ArmStore, SUBSCRIPTION_ID, start_server, parse_lro_overrides
+from azure_clients import AzureClients
+from azure_resources import environment_graph, environment_names
+from resource_graph import run_graph, critical_path, write_timeline
+
+# Typical create times in Azure (seconds); --time_scale shrinks them to something a benchmark can wait for
+DEFAULT_LRO_SECONDS = {
+    'Microsoft.ContainerService/managedClusters': 420,
+    'Microsoft.Storage/storageAccounts': 30,
+    'Microsoft.KeyVault/vaults': 20,
+    'Microsoft.ContainerRegistry/registries': 15,
+    'Microsoft.Network/virtualNetworks': 5,
+    'Microsoft.Network/virtualNetworks/subnets': 5,
+}
+
+# The same nodes one at a time in list order (environment_graph lists them in dependency order),
+# i.e. how provisioning behaved before it became a graph
+def sequential(nodes):
+    chained = []
+    for index, node in enumerate(nodes):
+        previous = [nodes[index - 1]['name']] if index else []
+        chained.append({**node, 'deps': node['deps'] + [name for name in previous if name not in node['deps']]})
+    return chained
+
+STRATEGIES = {'sequential': sequential, 'concurrent': lambda nodes: nodes}
+
+def run_once(base_url, strategy, run, poll_interval, trace_dir=None):
+    clients = AzureClients(arm_endpoint=base_url, tenant_id=SUBSCRIPTION_ID, client_id='bench', client_secret='bench',
+                           polling_interval=poll_interval)
+    names = environment_names(f"{strategy[:3]}{run}")
+    nodes = STRATEGIES[strategy](environment_graph(clients, names))
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, timeline = run_graph(nodes, poll_interval=poll_interval)
+    wall = time.monotonic() - start
+    clients.close()
+    if trace_dir:
+        write_timeline(timeline, os.path.join(trace_dir, f"{strategy}-{run}-spans.json"), os.path.join(trace_dir, f"{strategy}-{run}-trace.json"))
+    return {
+        'strategy': strategy,
+        'run': run,
+        'wall_s': round(wall, 3),
+        'critical_path': critical_path(timeline),
+        'http_requests': sum(span.get('http_requests', 0) for span in timeline.values()),
+        'polls': sum(span.get('polls', 0) for span in timeline.values()),
+        'retries': sum(span.get('retries', 0) for span in timeline.values()),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs concurrent environment provisioning against a local fake ARM")
+    parser.add_argument('--strategy', choices=['sequential', 'concurrent', 'both'], default='both')
+    parser.add_argument('--runs', type=int, default=1, help="Runs per strategy")
+    parser.add_argument('--time_scale', type=float, default=0.02, help="Multiplier applied to the default create times")
+    parser.add_argument('--lro', action='append', default=[], help="TYPE=SECONDS create time (after scaling) for one resource type")
+    parser.add_argument('--lro_seconds', type=float, default=0.2, help="Create time of resource types without a default")
+    parser.add_argument('--retry_after', type=int, default=0, help="Retry-After seconds the fake ARM sends (0: use --poll_interval)")
+    parser.add_argument('--poll_interval', type=float, default=0.2, help="LRO poll interval of the SDK pollers and of run_graph")
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help="Fraction of requests the fake ARM throttles with 429")
+    parser.add_argument('--trace_dir', help="Write spans and a Chrome trace per run into this directory")
+    parser.add_argument('--json', help="Write the results as JSON")
+    args = parser.parse_args()
+
+    durations = {resource_type: seconds * args.time_scale for resource_type, seconds in DEFAULT_LRO_SECONDS.items()}
+    durations.update(parse_lro_overrides(args.lro))
+    store = ArmStore(lro_seconds=args.lro_seconds, lro_overrides=durations, throttle_rate=args.throttle_rate)
+    server, base_url = start_server(store, retry_after=args.retry_after)
+    if args.trace_dir:
+        os.makedirs(args.trace_dir, exist_ok=True)
+
+    strategies = ['sequential', 'concurrent'] if args.strategy == 'both' else [args.strategy]
+    results = []
+    print(f"{'Strategy':<11} {'Run':>3} {'Wall s':>8} {'Requests':>8} {'Polls':>6} {'Retries':>7}  Critical path")
+    for run in range(args.runs):
+        for strategy in strategies:
+            result = run_once(base_url, strategy, run, args.poll_interval, args.trace_dir)
+            results.append(result)
+            print(f"{strategy:<11} {run:>3} {result['wall_s']:8.2f} {result['http_requests']:8} {result['polls']:6} {result['retries']:7}"
+                  f"  {' -> '.join(result['critical_path'])}")
+    server.shutdown()
+
+    means = {strategy: statistics.mean(r['wall_s'] for r in results if r['strategy'] == strategy) for strategy in strategies}
+    for strategy, mean in means.items():
+        print(f"{strategy}: mean {mean:.2f}s over {args.runs} run(s)")
+    if len(means) == 2:
+        print(f"concurrent is {means['sequential'] / means['concurrent']:.2f}x faster than sequential")
+    if store.stats['throttled']:
+        print(f"{store.stats['throttled']} request(s) throttled by the fake ARM")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'durations': durations, 'results': results, 'mean_wall_s': means}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import argparse
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+SUBSCRIPTION_ID = '00000000-0000-0000-0000-000000000000'
+AKS_VERSIONS = ['1.29.9', '1.30.5', '1.31.1']
+VM_SIZES = ['Standard_D4s_v3', 'Standard_E4s_v3', 'Standard_E8s_v3']
+
+# Resource types whose create is answered 202 Accepted without a body (the others get 201 Created)
+ACCEPTED_CREATES = {'microsoft.storage/storageaccounts'}
+
+# In-memory Azure Resource Manager: resource groups plus generic resources under
+# /subscriptions/{sub}/resourceGroups/{rg}/providers/{namespace}/{type}/{name}[/{type}/{name}...].
+# ARM paths are case-insensitive, so everything is keyed by the lower-cased path. Long-running
+# operations are timestamps, settled lazily whenever a request comes in (no background threads).
+# lro_overrides maps a resource type (Microsoft.ContainerService/managedClusters) to its create time;
+# throttle_rate answers that fraction of requests with 429 + Retry-After.
+class ArmStore:
+    def __init__(self, delete_seconds=2.0, lro_seconds=1.0, lro_overrides=None, throttle_rate=0.0, seed=0):
+        self.delete_seconds = delete_seconds
+        self.lro_seconds = lro_seconds
+        self.lro_overrides = {resource_type.lower(): seconds for resource_type, seconds in (lro_overrides or {}).items()}
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.resource_groups = {}  # lower-cased name -> resource group JSON
+        self.resources = {}        # lower-cased path -> resource JSON
+        self.operations = {}       # operation id -> {'done_at', 'kind', 'target'}
+        self.stats = {'requests': 0, 'throttled': 0, 'deleted_resource_groups': 0, 'deleted_resources': 0}
+        self.lock = threading.Lock()
+
+    def lro_duration(self, resource_type):
+        return self.lro_overrides.get(resource_type.lower(), self.lro_seconds)
+
+    @staticmethod
+    def group_path(subscription, name):
+        return f"/subscriptions/{subscription}/resourceGroups/{name}"
+
+    def add_resource_group(self, subscription, name, location='eastus', tags=None):
+        self.resource_groups[name.lower()] = {
+            'id': self.group_path(subscription, name), 'name': name, 'type': 'Microsoft.Resources/resourceGroups',
+            'location': location, 'tags': tags or {}, 'properties': {'provisioningState': 'Succeeded'},
+        }
+        return self.resource_groups[name.lower()]
+
+    def add_resource(self, path, body, state='Succeeded'):
+        segments = path.strip('/').split('/')
+        resource = dict(body)
+        resource.update(id=path, name=segments[-1], type='/'.join([segments[5]] + segments[6::2]))
+        resource['properties'] = dict(resource.get('properties') or {}, provisioningState=state)
+        self.resources[path.lower()] = resource
+        return resource
+
+    def start_operation(self, kind, target, seconds):
+        operation_id = uuid.uuid4().hex
+        self.operations[operation_id] = {'done_at': time.monotonic() + seconds, 'kind': kind, 'target': target}
+        return operation_id
+
+    # Apply every operation whose time has come; called with the lock held
+    def settle(self):
+        now = time.monotonic()
+        for operation in self.operations.values():
+            if operation.get('settled') or operation['done_at'] > now:
+                continue
+            operation['settled'] = True
+            if operation['kind'] == 'delete_group':
+                group = self.resource_groups.pop(operation['target'], None)
+                if group:
+                    prefix = group['id'].lower() + '/'
+                    doomed = [path for path in self.resources if path.startswith(prefix)]
+                    for path in doomed:
+                        del self.resources[path]
+                    self.stats['deleted_resource_groups'] += 1
+                    self.stats['deleted_resources'] += len(doomed)
+            elif operation['kind'] == 'put' and operation['target'] in self.resources:
+                self.resources[operation['target']]['properties']['provisioningState'] = 'Succeeded'
+
+    # Top-level resources of a group, as the generic resources API lists them
+    def group_resources(self, group):
+        prefix = group['id'].lower() + '/providers/'
+        return [resource for path, resource in self.resources.items()
+                if path.startswith(prefix) and len(path[len(prefix):].split('/')) == 3]
+
+    # Resources directly under a collection path (.../providers/{namespace}/{type})
+    def collection(self, path):
+        prefix = path.lower().rstrip('/') + '/'
+        return [resource for key, resource in self.resources.items() if key.startswith(prefix) and '/' not in key[len(prefix):]]
+
+# Test environments shaped like the ones azure_resources.py creates; every other one is already
+# past its DateOfDecommission
+def seed_environments(store, count, subscription=SUBSCRIPTION_ID):
+    today = datetime.date.today()
+    for index in range(count):
+        expired = index % 2 == 0
+        commissioned = today - datetime.timedelta(days=5 if expired else 0)
+        decommission = today - datetime.timedelta(days=1) if expired else today + datetime.timedelta(days=2)
+        suffix = f"seed{index}"
+        group = store.add_resource_group(subscription, f"rg-{suffix}", tags={
+            'DateOfCommission': commissioned.isoformat(), 'DateOfDecommission': decommission.isoformat(),
+            'CreatedBy': 'fake_arm', 'PurposeOfCreation': 'Testing'})
+        base = group['id'] + '/providers'
+        store.add_resource(f"{base}/Microsoft.Network/virtualNetworks/vnet-{suffix}", {'location': 'eastus'})
+        store.add_resource(f"{base}/Microsoft.Network/virtualNetworks/vnet-{suffix}/subnets/subnet-{suffix}", {})
+        store.add_resource(f"{base}/Microsoft.ContainerRegistry/registries/acr{suffix}", {'location': 'eastus', 'sku': {'name': 'Basic'}})
+        store.add_resource(f"{base}/Microsoft.KeyVault/vaults/kv-{suffix}", {'location': 'eastus'})
+        store.add_resource(f"{base}/Microsoft.Storage/storageAccounts/st{suffix}", {'location': 'eastus', 'kind': 'FileStorage'})
+        store.add_resource(f"{base}/Microsoft.ContainerService/managedClusters/aks-{suffix}", {
+            'location': 'eastus', 'properties': {'agentPoolProfiles': [{'name': 'agentpool', 'count': 3, 'vmSize': 'Standard_E4s_v3'}]}})
+    # Something that is not a test environment and must never be selected
+    store.add_resource_group(subscription, 'rg-shared-infra', tags={'PurposeOfCreation': 'Shared'})
+
+class ArmRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    store = None
+    retry_after = 1
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('x-ms-request-id', uuid.uuid4().hex)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, code, message):
+        self._send(status, {'error': {'code': code, 'message': message}})
+
+    def _body(self):
+        return json.loads(self.request_body) if self.request_body else {}
+
+    def _operation_url(self, operation_id):
+        return f"http://{self.headers.get('Host')}/_operations/{operation_id}"
+
+    def _dispatch(self):
+        # Read the body up front, whatever the answer, so a kept-alive connection stays in sync
+        self.request_body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        url = urlsplit(self.path)
+        segments = url.path.strip('/').split('/')
+        lowered = [segment.lower() for segment in segments]
+        store = self.store
+        with store.lock:
+            store.stats['requests'] += 1
+            store.settle()
+            if lowered[0] == '_stats':
+                return self._send(200, store.stats)
+            if store.throttle_rate and store.random.random() < store.throttle_rate:
+                store.stats['throttled'] += 1
+                return self._send(429, {'error': {'code': 'TooManyRequests', 'message': 'Throttled (injected)'}},
+                                  headers={'Retry-After': str(self.retry_after)})
+            if lowered[0] == '_operations' and len(segments) == 2:
+                return self._operation(segments[1])
+            if len(segments) >= 3 and lowered[0] == 'subscriptions' and lowered[2] == 'providers':
+                return self._provider(url.path, lowered[3:])
+            if len(segments) < 3 or lowered[0] != 'subscriptions' or lowered[2] != 'resourcegroups':
+                return self._error(404, 'NotFound', f"No route for {url.path}")
+            subscription = segments[1]
+            if len(segments) == 3:
+                return self._list_groups(parse_qs(url.query).get('$filter', [''])[0])
+            group = store.resource_groups.get(lowered[3])
+            if len(segments) == 4:
+                return self._group(subscription, segments[3], group)
+            if group is None:
+                return self._error(404, 'ResourceGroupNotFound', f"Resource group '{segments[3]}' could not be found.")
+            if len(segments) == 5 and lowered[4] == 'resources':
+                return self._send(200, {'value': store.group_resources(group)})
+            if lowered[4] != 'providers' or len(segments) < 7:
+                return self._error(404, 'NotFound', f"No route for {url.path}")
+            path = '/' + '/'.join(segments)
+            if len(segments) % 2 == 1:
+                return self._send(200, {'value': store.collection(path)})
+            return self._resource(path)
+
+    def _operation(self, operation_id):
+        operation = self.store.operations.get(operation_id)
+        if operation is None:
+            return self._error(404, 'NotFound', f"Operation {operation_id} not found")
+        if operation['kind'] == 'delete_group':
+            # Location-header polling: 202 while running, 200 once the group is gone
+            if operation.get('settled'):
+                return self._send(200)
+            return self._send(202, headers={'Location': self._operation_url(operation_id), 'Retry-After': str(self.retry_after)})
+        status = 'Succeeded' if operation.get('settled') else 'InProgress'
+        self._send(200, {'id': operation_id, 'status': status}, headers={'Retry-After': str(self.retry_after)})
+
+    # The subscription-level lookups azure_resources.py makes before creating AKS
+    def _provider(self, path, segments):
+        if segments[:2] == ['microsoft.containerservice', 'locations'] and segments[3:] == ['orchestrators']:
+            return self._send(200, {'id': path, 'name': 'default', 'type': 'Microsoft.ContainerService/locations/orchestrators',
+                                    'properties': {'orchestrators': [{'orchestratorType': 'Kubernetes', 'orchestratorVersion': version}
+                                                                     for version in AKS_VERSIONS]}})
+        if segments == ['microsoft.compute', 'skus']:
+            return self._send(200, {'value': [{'resourceType': 'virtualMachines', 'name': size, 'locations': ['eastus'], 'restrictions': []}
+                                              for size in VM_SIZES]})
+        self._error(404, 'NotFound', f"No route for {path}")
+
+    def _list_groups(self, filter_expression):
+        groups = list(self.store.resource_groups.values())
+        if filter_expression:
+            # Only the form the SDK callers use: tagName eq 'X' and tagValue eq 'Y'
+            parts = filter_expression.split("'")
+            name, value = parts[1], parts[3] if len(parts) > 3 else None
+            groups = [g for g in groups if name in g['tags'] and (value is None or g['tags'][name] == value)]
+        self._send(200, {'value': groups})
+
+    def _group(self, subscription, name, group):
+        store = self.store
+        if self.command == 'GET':
+            if group is None:
+                return self._error(404, 'ResourceGroupNotFound', f"Resource group '{name}' could not be found.")
+            return self._send(200, group)
+        if self.command == 'PUT':
+            body = self._body()
+            status = 200 if group else 201
+            group = store.add_resource_group(subscription, name, body.get('location', 'eastus'), body.get('tags'))
+            return self._send(status, group)
+        if self.command == 'PATCH':
+            if group is None:
+                return self._error(404, 'ResourceGroupNotFound', f"Resource group '{name}' could not be found.")
+            body = self._body()
+            if 'tags' in body:
+                group['tags'] = body['tags'] or {}
+            return self._send(200, group)
+        if self.command == 'DELETE':
+            if group is None:
+                return self._send(204)
+            group['properties']['provisioningState'] = 'Deleting'
+            operation_id = store.start_operation('delete_group', name.lower(), store.delete_seconds)
+            return self._send(202, headers={'Location': self._operation_url(operation_id), 'Retry-After': str(self.retry_after)})
+        self._error(405, 'MethodNotAllowed', self.command)
+
+    def _resource(self, path):
+        store = self.store
+        existing = store.resources.get(path.lower())
+        if self.command == 'GET':
+            if existing is None:
+                return self._error(404, 'ResourceNotFound', f"The Resource '{path}' was not found.")
+            return self._send(200, existing)
+        if self.command in ('PUT', 'PATCH'):
+            body = self._body()
+            if existing and self.command == 'PATCH':
+                body = {**existing, **body, 'properties': {**existing.get('properties', {}), **body.get('properties', {})}}
+            resource = store.add_resource(path, body, state='Updating' if existing else 'Creating')
+            operation_id = store.start_operation('put', path.lower(), store.lro_duration(resource['type']))
+            headers = {'Azure-AsyncOperation': self._operation_url(operation_id), 'Retry-After': str(self.retry_after)}
+            if not existing and resource['type'].lower() in ACCEPTED_CREATES:
+                return self._send(202, headers={**headers, 'Location': self._operation_url(operation_id)})
+            return self._send(200 if existing else 201, resource, headers=headers)
+        if self.command == 'DELETE':
+            prefix = path.lower() + '/'
+            for key in [key for key in store.resources if key == path.lower() or key.startswith(prefix)]:
+                del store.resources[key]
+            return self._send(200 if existing else 204)
+        self._error(405, 'MethodNotAllowed', self.command)
+
+    do_GET = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+# Start a server on a background thread; returns (server, base_url). Point the scripts at it with
+# AZURE_ARM_ENDPOINT=<base_url> (see azure_clients.py).
+def start_server(store, host='127.0.0.1', port=0, retry_after=1, verbose=False):
+    handler = type('Handler', (ArmRequestHandler,), {'store': store, 'retry_after': retry_after, 'verbose': verbose})
+    server = QuietHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+# TYPE=SECONDS pairs from the command line
+def parse_lro_overrides(specs):
+    overrides = {}
+    for spec in specs:
+        resource_type, _, seconds = spec.rpartition('=')
+        overrides[resource_type] = float(seconds)
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Azure Resource Manager REST API")
+    parser.add_argument('--port', type=int, default=8770, help="Port to listen on")
+    parser.add_argument('--seed_environments', type=int, default=0, help="Test environments to create at startup (every other one expired)")
+    parser.add_argument('--delete_seconds', type=float, default=2.0, help="Time a resource group deletion takes")
+    parser.add_argument('--lro_seconds', type=float, default=1.0, help="Time a resource create/update takes")
+    parser.add_argument('--lro', action='append', default=[], help="TYPE=SECONDS create time for one resource type, "
+                        "e.g. Microsoft.ContainerService/managedClusters=300")
+    parser.add_argument('--throttle_rate', type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument('--retry_after', type=int, default=1, help="Retry-After seconds sent to pollers and throttled clients "
+                        "(0 leaves the poll interval to the client)")
+    parser.add_argument('--verbose', action='store_true', help="Log every request")
+    args = parser.parse_args()
+
+    store = ArmStore(delete_seconds=args.delete_seconds, lro_seconds=args.lro_seconds, lro_overrides=parse_lro_overrides(args.lro),
+                     throttle_rate=args.throttle_rate)
+    seed_environments(store, args.seed_environments)
+    server, base_url = start_server(store, port=args.port, retry_after=args.retry_after, verbose=args.verbose)
+    print(f"Fake ARM with {len(store.resource_groups)} resource group(s) on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+import time
+import argparse
+import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from azure_resources import create_clients, past_decommission, stable_environment_tags
+from environment_pool import STATE_TAG, lease_abandoned
+
+# Teardown of test environments: every resource group carrying the selection tag (the tags azure_resources.py
+# and environment_pool.py put on everything they create) that is past its DateOfDecommission or older than
+# --max_age_days is deleted, --parallel at a time. Pool environments that are leased are left alone until
+# their lease is abandoned, and stable named environments (DateOfDecommission 'TBD') are never aged out.
+
+def _parse_date(value):
+    try:
+        return datetime.datetime.strptime(value or '', "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+# Why a resource group should be deleted, or None to keep it
+def expiry_reason(resource_group, max_age_days=None, max_lease_hours=12):
+    group_tags = resource_group.tags or {}
+    if group_tags.get(STATE_TAG) == 'leased' and not lease_abandoned(resource_group, max_lease_hours):
+        return None
+    if past_decommission(resource_group):
+        return f"decommission date {group_tags['DateOfDecommission']} reached"
+    if group_tags.get('DateOfDecommission') == stable_environment_tags['DateOfDecommission']:
+        return None
+    commissioned = _parse_date(group_tags.get('DateOfCommission'))
+    if max_age_days is not None and commissioned and (datetime.date.today() - commissioned).days > max_age_days:
+        return f"created {commissioned.isoformat()}, older than {max_age_days} days"
+    return None
+
+# Resource groups with the selection tag, split into (expired, kept); groups already being deleted are skipped
+def select_expired(resource_client, tag_name, tag_value, max_age_days=None, max_lease_hours=12, keep=()):
+    expired, kept = [], []
+    for group in resource_client.resource_groups.list(filter=f"tagName eq '{tag_name}' and tagValue eq '{tag_value}'"):
+        if group.properties.provisioning_state == 'Deleting' or group.name in keep:
+            kept.append(group)
+            continue
+        reason = expiry_reason(group, max_age_days, max_lease_hours)
+        if reason:
+            expired.append((group, reason))
+        else:
+            kept.append(group)
+    return sorted(expired, key=lambda item: item[0].name), kept
+
+# What deleting the group gives back: its resources by type and the AKS nodes (quota) they hold
+def inventory(clients, resource_group_name):
+    resources = list(clients.resource.resources.list_by_resource_group(resource_group_name))
+    nodes = Counter()
+    if any(resource.type.lower() == 'microsoft.containerservice/managedclusters' for resource in resources):
+        for cluster in clients.aks.managed_clusters.list_by_resource_group(resource_group_name):
+            for pool in cluster.agent_pool_profiles or []:
+                nodes[pool.vm_size] += pool.count or 0
+    return {'resources': dict(Counter(resource.type for resource in resources)), 'nodes': dict(nodes)}
+
+# Inventory and delete one resource group, waiting for the deletion unless wait is False
+def collect(clients, resource_group, reason, dry_run=False, wait=True):
+    start = time.monotonic()
+    record = {'resource_group': resource_group.name, 'reason': reason, 'tags': resource_group.tags or {}}
+    try:
+        record.update(inventory(clients, resource_group.name))
+        if dry_run:
+            record['status'] = 'would delete'
+        else:
+            poller = clients.resource.resource_groups.begin_delete(resource_group.name)
+            if wait:
+                poller.result()
+                record['status'] = 'deleted'
+            else:
+                record['status'] = 'delete submitted'
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = str(e)
+    record['seconds'] = round(time.monotonic() - start, 1)
+    return record
+
+def collect_all(clients, expired, parallel, dry_run=False, wait=True):
+    records = []
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        futures = [executor.submit(collect, clients, group, reason, dry_run, wait) for group, reason in expired]
+        for future in as_completed(futures):
+            record = future.result()
+            error = f": {record['error']}" if 'error' in record else ''
+            print(f"{record['resource_group']}: {record['status']} ({record['reason']}, {record['seconds']:.0f}s){error}")
+            records.append(record)
+    return sorted(records, key=lambda record: record['resource_group'])
+
+def print_summary(records, kept, dry_run):
+    reclaimed = [record for record in records if record['status'] != 'failed']
+    failed = [record for record in records if record['status'] == 'failed']
+    resources = Counter()
+    nodes = Counter()
+    for record in reclaimed:
+        resources.update(record.get('resources', {}))
+        nodes.update(record.get('nodes', {}))
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    print(f"{verb} {len(reclaimed)} resource group(s) with {sum(resources.values())} resource(s); "
+          f"{len(failed)} failed; {len(kept)} kept")
+    for resource_type, count in sorted(resources.items()):
+        print(f"  {count:4} {resource_type}")
+    if nodes:
+        print(f"  AKS nodes: {', '.join(f'{count} x {size}' for size, count in sorted(nodes.items()))}")
+    for record in failed:
+        print(f"  FAILED {record['resource_group']}: {record['error']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired test environments")
+    parser.add_argument('--tag', default='PurposeOfCreation=Testing', help="NAME=VALUE tag selecting the resource groups to consider")
+    parser.add_argument('--max_age_days', type=int, help="Also delete groups whose DateOfCommission is older than this")
+    parser.add_argument('--max_lease_hours', type=float, default=12, help="Leased pool environments are only deleted once the lease is this old")
+    parser.add_argument('--keep', action='append', default=[], help="Resource group to never delete (repeatable)")
+    parser.add_argument('--parallel', type=int, default=4, help="Resource groups deleted concurrently")
+    parser.add_argument('--dry_run', action='store_true', help="Only report what would be deleted")
+    parser.add_argument('--no_wait', action='store_true', help="Submit the deletions without waiting for them to finish")
+    parser.add_argument('--summary_file', help="Write the per-group results as JSON")
+    args = parser.parse_args()
+    tag_name, separator, tag_value = args.tag.partition('=')
+    if not separator or not tag_name or not tag_value:
+        parser.error("--tag must be NAME=VALUE")
+
+    clients = create_clients()
+    expired, kept = select_expired(clients.resource, tag_name, tag_value, args.max_age_days, args.max_lease_hours, set(args.keep))
+    print(f"{len(expired)} of {len(expired) + len(kept)} resource group(s) tagged {tag_name}={tag_value} are expired")
+    records = collect_all(clients, expired, args.parallel, args.dry_run, not args.no_wait)
+    print_summary(records, kept, args.dry_run)
+    if args.summary_file:
+        with open(args.summary_file, 'w') as f:
+            json.dump({'dry_run': args.dry_run, 'kept': sorted(group.name for group in kept), 'resource_groups': records}, f, indent=2)
+    if any(record['status'] == 'failed' for record in records):
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import uuid
+import fcntl
+import random
+import argparse
+import datetime
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from azure_resources import create_clients, environment_graph, stable_environment_names, validate_environment_name, past_decommission
+from resource_graph import run_graph, print_timeline, GraphError
+from metadata_cache import MetadataCache
+
+# Tags that make a resource group a pool member. PoolState moves provisioning -> free -> leased -> free/deleted;
+# a lease is only ours once PoolLeaseId still holds our id after the settle delay (optimistic locking).
+# PoolProvisioningSince records when a fill started building the environment.
+POOL_TAG = 'EnvironmentPool'
+ENVIRONMENT_TAG = 'PoolEnvironment'
+STATE_TAG = 'PoolState'
+LEASE_TAG = 'PoolLeaseId'
+LEASED_BY_TAG = 'PoolLeasedBy'
+LEASED_AT_TAG = 'PoolLeasedAt'
+PROVISIONING_SINCE_TAG = 'PoolProvisioningSince'
+
+# Namespaces the pipeline creates in the cluster (see pipeline/Jenkinsfile); removed when a lease ends
+CLEAN_NAMESPACE_PREFIXES = ('postgres-', 'transact-', 'sanitytest-')
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def decommission_date(ttl_days):
+    return (datetime.datetime.now() + datetime.timedelta(days=ttl_days)).strftime("%Y-%m-%d")
+
+# A lease that was never released (crashed job) is abandoned after max_lease_hours
+def lease_abandoned(resource_group, max_lease_hours):
+    resource_tags = resource_group.tags or {}
+    if resource_tags.get(STATE_TAG) != 'leased' or not resource_tags.get(LEASED_AT_TAG):
+        return False
+    return _now() - datetime.datetime.fromisoformat(resource_tags[LEASED_AT_TAG]) > datetime.timedelta(hours=max_lease_hours)
+
+# An environment still 'provisioning' after max_provision_hours belongs to a fill that crashed; a healthy one is
+# free or leased well within that (AKS takes minutes)
+def provisioning_abandoned(resource_group, max_provision_hours):
+    resource_tags = resource_group.tags or {}
+    if resource_tags.get(STATE_TAG) != 'provisioning' or not resource_tags.get(PROVISIONING_SINCE_TAG):
+        return False
+    return _now() - datetime.datetime.fromisoformat(resource_tags[PROVISIONING_SINCE_TAG]) > datetime.timedelta(hours=max_provision_hours)
+
+# Environments in use are only reclaimed once their lease is abandoned, ones being built once their fill is
+# abandoned, and the rest once their TTL has passed
+def is_expired(resource_group, max_lease_hours, max_provision_hours=2):
+    if (resource_group.tags or {}).get(STATE_TAG) == 'leased':
+        return lease_abandoned(resource_group, max_lease_hours)
+    return provisioning_abandoned(resource_group, max_provision_hours) or past_decommission(resource_group)
+
+# Why is_expired holds for an environment, for the deletion message
+def expiry_reason(resource_group, max_lease_hours, max_provision_hours=2):
+    if lease_abandoned(resource_group, max_lease_hours):
+        return 'lease abandoned'
+    if provisioning_abandoned(resource_group, max_provision_hours):
+        return 'provisioning abandoned'
+    return 'TTL expired'
+
+# Resource groups of a pool that are not already being deleted
+def pool_environments(resource_client, pool):
+    groups = resource_client.resource_groups.list(filter=f"tagName eq '{POOL_TAG}' and tagValue eq '{pool}'")
+    return [group for group in groups if group.properties.provisioning_state != 'Deleting']
+
+# Read-modify-write of a resource group's tags (PATCH replaces the whole tag set)
+def update_tags(resource_client, resource_group_name, updates, remove=()):
+    current = resource_client.resource_groups.get(resource_group_name).tags or {}
+    merged = {key: value for key, value in {**current, **updates}.items() if key not in remove}
+    resource_client.resource_groups.update(resource_group_name, {'tags': merged})
+    return merged
+
+def lease_tags(owner):
+    return {STATE_TAG: 'leased', LEASE_TAG: uuid.uuid4().hex, LEASED_BY_TAG: owner, LEASED_AT_TAG: _now().isoformat(timespec='seconds')}
+
+# Claim a free environment: re-read its tags right before writing (the listed copy can be seconds old and
+# already leased by someone else), write our lease id, wait for competing writers to land, then check we won.
+# Resource groups have no ETag to make the write conditional (no If-Match on their update), so this stays a
+# heuristic: a competing write that lands more than `settle` after ours (a slow or retried request) is not seen
+# by our re-read, and both lessees think they won. The random order in lease() keeps that rare.
+def try_lease(resource_client, resource_group_name, owner, settle=3.0):
+    current = resource_client.resource_groups.get(resource_group_name).tags or {}
+    if current.get(STATE_TAG) != 'free' or current.get(LEASE_TAG):
+        return None
+    claim = lease_tags(owner)
+    update_tags(resource_client, resource_group_name, claim)
+    time.sleep(settle)
+    current = resource_client.resource_groups.get(resource_group_name).tags or {}
+    return claim[LEASE_TAG] if current.get(LEASE_TAG) == claim[LEASE_TAG] else None
+
+# Provision one pool environment through the normal resource graph, then mark it free. With owner set it is
+# leased to owner instead, in the same tag update, so it is never free for another lessee to take; returns the
+# names and that lease id (None when it went to the pool).
+def provision_environment(clients, pool, ttl_days, owner=None):
+    environment = f"{pool}-{uuid.uuid4().hex[:5]}"
+    names = stable_environment_names(environment)
+    extra_tags = {POOL_TAG: pool, ENVIRONMENT_TAG: environment, STATE_TAG: 'provisioning',
+                  PROVISIONING_SINCE_TAG: _now().isoformat(timespec='seconds'), 'DateOfDecommission': decommission_date(ttl_days)}
+    print(f"Provisioning pool environment '{environment}'")
+    try:
+        results, timeline = run_graph(environment_graph(clients, names, extra_tags=extra_tags, metadata_cache=MetadataCache()))
+    except GraphError as e:
+        # Half-built environments are never handed out; remove whatever was created
+        if 'end' in e.timeline.get('resource_group', {}) and 'error' not in e.timeline['resource_group']:
+            delete_environment(clients.resource, names['resource_group'], 'provisioning failed')
+        raise
+    print_timeline(timeline)
+    if owner:
+        claim = lease_tags(owner)
+        update_tags(clients.resource, names['resource_group'], claim)
+        print(f"Pool environment '{environment}' is ready, leased to {owner}.")
+        return names, claim[LEASE_TAG]
+    update_tags(clients.resource, names['resource_group'], {STATE_TAG: 'free'})
+    print(f"Pool environment '{environment}' is ready.")
+    return names, None
+
+def delete_environment(resource_client, resource_group_name, reason):
+    print(f"Deleting {resource_group_name} ({reason})")
+    resource_client.resource_groups.begin_delete(resource_group_name)  # Azure finishes the delete on its own
+
+# Bring the pool back to `size` usable environments: expired ones are deleted, missing ones provisioned concurrently.
+# Environments another fill is still building count as usable. Only one fill per pool runs on an agent at a time.
+def fill_pool(clients, pool, size, ttl_days, max_lease_hours, parallel, max_provision_hours=2):
+    lock_file = open(os.path.join(tempfile.gettempdir(), f"environment-pool-{pool}.lock"), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"Another fill of pool '{pool}' is running, leaving it to that one")
+        return 0
+
+    resource_client = clients.resource
+    usable = 0
+    for group in pool_environments(resource_client, pool):
+        if is_expired(group, max_lease_hours, max_provision_hours):
+            delete_environment(resource_client, group.name, expiry_reason(group, max_lease_hours, max_provision_hours))
+        else:
+            usable += 1
+    missing = max(0, size - usable)
+    print(f"Pool '{pool}': {usable} usable environment(s), provisioning {missing}")
+    if not missing:
+        return 0
+
+    def provision(_):
+        try:
+            provision_environment(clients, pool, ttl_days)
+            return True
+        except GraphError as e:
+            print(e)
+            print_timeline(e.timeline)
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(parallel, missing))) as executor:
+        failures = list(executor.map(provision, range(missing))).count(False)
+    if failures:
+        print(f"{failures} pool environment(s) failed to provision")
+    return failures
+
+# Refill in a detached process so the caller (a pipeline stage) does not wait for AKS
+def start_background_fill(args):
+    log_path = os.path.join(tempfile.gettempdir(), f"environment-pool-{args.pool}-fill.log")
+    command = [sys.executable, os.path.abspath(__file__), 'fill', '--pool', args.pool, '--size', str(args.size),
+               '--ttl_days', str(args.ttl_days), '--max_lease_hours', str(args.max_lease_hours),
+               '--max_provision_hours', str(args.max_provision_hours)]
+    # Jenkins kills every process of a finished build unless it carries a different cookie
+    env = {**os.environ, 'JENKINS_NODE_COOKIE': 'dontKillMe', 'BUILD_ID': 'dontKillMe'}
+    with open(log_path, 'a') as log:
+        subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, env=env, start_new_session=True)
+    print(f"Refilling pool '{args.pool}' in the background (log: {log_path})")
+
+# Delete the namespaces a pipeline run left behind in the cluster
+def clean_environment(clients, names):
+    aks_client = clients.aks
+    credentials = aks_client.managed_clusters.list_cluster_admin_credentials(names['resource_group'], names['aks'])
+    with tempfile.NamedTemporaryFile('wb', suffix='.kubeconfig') as kubeconfig:
+        kubeconfig.write(credentials.kubeconfigs[0].value)
+        kubeconfig.flush()
+        output = subprocess.run(['kubectl', '--kubeconfig', kubeconfig.name, 'get', 'namespaces', '-o', 'name'],
+                                capture_output=True, text=True, check=True).stdout
+        namespaces = [line.split('/', 1)[1] for line in output.split() if line.split('/', 1)[1].startswith(CLEAN_NAMESPACE_PREFIXES)]
+        if namespaces:
+            print(f"Deleting namespaces {', '.join(namespaces)}")
+            subprocess.run(['kubectl', '--kubeconfig', kubeconfig.name, 'delete', 'namespace', '--wait=false', *namespaces], check=True)
+
+def lease(args, clients):
+    resource_client = clients.resource
+    owner = args.owner or os.getenv('BUILD_TAG') or os.getenv('USER') or 'unknown'
+    candidates = [group for group in pool_environments(resource_client, args.pool)
+                  if (group.tags or {}).get(STATE_TAG) == 'free' and not past_decommission(group)]
+    random.shuffle(candidates)  # Concurrent lessees rarely race for the same environment
+    lease_id = None
+    for group in candidates:
+        lease_id = try_lease(resource_client, group.name, owner, settle=args.settle)
+        if lease_id:
+            names = stable_environment_names(group.tags[ENVIRONMENT_TAG])
+            break
+        print(f"Lost the race for {group.name}, trying the next free environment")
+
+    if not lease_id:
+        if not args.provision_if_empty:
+            print(f"No free environment in pool '{args.pool}'")
+            exit(1)
+        # Slow path: build one for this run, outside the pool's free list
+        print(f"No free environment in pool '{args.pool}', provisioning one for this run")
+        try:
+            names, lease_id = provision_environment(clients, args.pool, args.ttl_days, owner=owner)
+        except GraphError as e:
+            print(e)
+            print_timeline(e.timeline)
+            exit(1)
+
+    start_background_fill(args)
+    # Same lines as azure_resources.py, plus the lease id needed to release the environment
+    print(f"RESOURCE_GROUP={names['resource_group']}")
+    print(f"AKS_CLUSTER={names['aks']}")
+    print(f"LEASE_ID={lease_id}")
+
+def release(args, clients):
+    resource_client = clients.resource
+    group = resource_client.resource_groups.get(args.resource_group)
+    group_tags = group.tags or {}
+    if group_tags.get(LEASE_TAG) != args.lease_id:
+        print(f"{args.resource_group} is not leased with {args.lease_id} (lease: {group_tags.get(LEASE_TAG)}), leaving it alone")
+        exit(1)
+
+    if args.destroy or past_decommission(group):
+        delete_environment(resource_client, args.resource_group, 'destroy requested' if args.destroy else 'TTL expired')
+    else:
+        try:
+            clean_environment(clients, stable_environment_names(group_tags[ENVIRONMENT_TAG]))
+        except (subprocess.CalledProcessError, OSError) as e:
+            # An environment that cannot be cleaned must not be handed to the next run
+            print(f"Failed to clean {args.resource_group}: {e}")
+            delete_environment(resource_client, args.resource_group, 'cleanup failed')
+        else:
+            update_tags(resource_client, args.resource_group, {STATE_TAG: 'free'}, remove=(LEASE_TAG, LEASED_BY_TAG, LEASED_AT_TAG))
+            print(f"Returned {args.resource_group} to pool '{args.pool}'")
+    start_background_fill(args)
+
+def status(args, clients):
+    groups = pool_environments(clients.resource, args.pool)
+    print(f"Pool '{args.pool}': {len(groups)} environment(s)")
+    for group in sorted(groups, key=lambda g: g.name):
+        group_tags = group.tags or {}
+        expired = ' (expired)' if is_expired(group, args.max_lease_hours, args.max_provision_hours) else ''
+        leased = f" by {group_tags.get(LEASED_BY_TAG)} since {group_tags.get(LEASED_AT_TAG)}" if group_tags.get(STATE_TAG) == 'leased' else ''
+        print(f"  {group.name:<24} {group_tags.get(STATE_TAG, '?'):<12} decommission {group_tags.get('DateOfDecommission')}{leased}{expired}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm pool of pre-provisioned AKS test environments")
+    parser.add_argument('command', choices=['fill', 'lease', 'release', 'status'])
+    parser.add_argument('--pool', type=validate_environment_name, default='sanity', help="Pool name (tag value and environment name prefix)")
+    parser.add_argument('--size', type=int, default=2, help="Number of usable environments the pool keeps")
+    parser.add_argument('--ttl_days', type=int, default=3, help="Days before a pool environment is destroyed instead of reused")
+    parser.add_argument('--max_lease_hours', type=float, default=12, help="Leases older than this are treated as abandoned")
+    parser.add_argument('--max_provision_hours', type=float, default=2, help="Environments still provisioning after this are treated as abandoned")
+    parser.add_argument('--parallel', type=int, default=2, help="Environments provisioned concurrently by fill")
+    parser.add_argument('--settle', type=float, default=3.0, help="Seconds to wait before confirming a lease")
+    parser.add_argument('--owner', help="Recorded on the lease (default: $BUILD_TAG)")
+    parser.add_argument('--provision_if_empty', action='store_true', help="lease: provision a new environment when none is free")
+    parser.add_argument('--resource_group', help="release: resource group of the lease")
+    parser.add_argument('--lease_id', help="release: LEASE_ID printed by lease")
+    parser.add_argument('--destroy', action='store_true', help="release: delete the environment instead of returning it")
+    args = parser.parse_args()
+    # Pool environment names get a 6-character suffix and must still fit the 20-character limit
+    if len(args.pool) > 14:
+        parser.error("--pool must be at most 14 characters")
+    if args.command == 'release' and not (args.resource_group and args.lease_id):
+        parser.error("release needs --resource_group and --lease_id")
+
+    clients = create_clients()
+    if args.command == 'fill':
+        if fill_pool(clients, args.pool, args.size, args.ttl_days, args.max_lease_hours, args.parallel, args.max_provision_hours):
+            exit(1)
+    elif args.command == 'lease':
+        lease(args, clients)
+    elif args.command == 'release':
+        release(args, clients)
+    else:
+        status(args, clients)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import re
+import json
+import time
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'imagebuild', 'azure-metadata')
+
+# Small on-disk cache for slow-changing lookups (AKS versions, VM SKU availability per location).
+# Entries are JSON files reused for `ttl` seconds; ttl=0 always refetches but still refreshes the file.
+class MetadataCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=24 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + '.json')
+
+    def get(self, key, fetch):
+        path = self._path(key)
+        if self.ttl > 0:
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                if time.time() - entry['fetched_at'] < self.ttl:
+                    return entry['value']
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+        value = fetch()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'key': key, 'fetched_at': time.time(), 'value': value}, f)
+        os.replace(tmp_path, path)
+        return value
@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BLOCK_SIZE = 1024 * 1024
+
+# Generated artifacts: deterministic pseudo-random content, never held in memory as a whole
+class ArtifactStore:
+    def __init__(self):
+        self.artifacts = {}
+        self.created = formatdate(usegmt=True)
+        self._blocks = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def add(self, path, size, seed=None):
+        self.artifacts[path] = {'size': size, 'seed': seed if seed is not None else path}
+
+    def _block(self, seed):
+        with self._lock:
+            if seed not in self._blocks:
+                self._blocks[seed] = random.Random(seed).randbytes(BLOCK_SIZE)
+            return self._blocks[seed]
+
+    # Yield the bytes [start, end] of an artifact in chunks of at most chunk_size
+    def read(self, path, start, end, chunk_size=64 * 1024):
+        block = self._block(self.artifacts[path]['seed'])
+        position = start
+        while position <= end:
+            offset = position % BLOCK_SIZE
+            length = min(chunk_size, BLOCK_SIZE - offset, end + 1 - position)
+            yield block[offset:offset + length]
+            position += length
+
+    def digest(self, path, algorithm):
+        key = (path, algorithm)
+        with self._lock:
+            if key in self._digests:
+                return self._digests[key]
+        h = hashlib.new(algorithm)
+        size = self.artifacts[path]['size']
+        for chunk in self.read(path, 0, size - 1, BLOCK_SIZE):
+            h.update(chunk)
+        with self._lock:
+            self._digests[key] = h.hexdigest()
+        return self._digests[key]
+
+    def etag(self, path):
+        artifact = self.artifacts[path]
+        return '"%s"' % hashlib.sha1(f"{path}:{artifact['size']}:{artifact['seed']}".encode()).hexdigest()
+
+    # Files directly under a directory path ending in '/'
+    def children(self, directory):
+        return sorted(path[len(directory):] for path in self.artifacts
+                      if path.startswith(directory) and '/' not in path[len(directory):])
+
+# Behaviour knobs shared by all handler threads
+class ServerOptions:
+    def __init__(self, latency=0.0, bandwidth=None, fail_rate=0.0, drop_rate=0.0, ranges=True, checksums='header', seed=0):
+        self.latency = latency          # seconds added before every response
+        self.bandwidth = bandwidth      # bytes/s per connection, None for unlimited
+        self.fail_rate = fail_rate      # fraction of requests answered with 502
+        self.drop_rate = drop_rate      # fraction of artifact bodies cut off half way
+        self.ranges = ranges            # advertise and honour Range requests
+        self.checksums = checksums      # 'header' (X-Checksum-*), 'sidecar' (.sha256 files) or 'none'
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def roll(self, rate):
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+# Maven/Nexus listings use absolute hrefs, Artifactory (/artifactory/...) relative ones plus the storage API
+class ArtifactRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    store = None
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='text/html', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        options = self.options
+        with options.lock:
+            options.requests += 1
+        if options.latency:
+            time.sleep(options.latency)
+        if options.roll(options.fail_rate):
+            return self._send(502, b'Bad Gateway (injected)')
+
+        path = self.path.split('?')[0]
+        if path.startswith('/artifactory/api/storage/'):
+            return self._storage_listing('/artifactory/' + path[len('/artifactory/api/storage/'):])
+        if path.endswith('/'):
+            return self._html_listing(path)
+        for extension, algorithm in (('.sha256', 'sha256'), ('.sha1', 'sha1'), ('.md5', 'md5')):
+            if path.endswith(extension) and path[:-len(extension)] in self.store.artifacts and options.checksums == 'sidecar':
+                artifact = path[:-len(extension)]
+                return self._send(200, f"{self.store.digest(artifact, algorithm)}  {artifact.split('/')[-1]}\n".encode(), 'text/plain')
+        if path in self.store.artifacts:
+            return self._artifact(path)
+        return self._send(404, b'Not Found')
+
+    def _html_listing(self, directory):
+        names = self.store.children(directory)
+        if not names and not any(p.startswith(directory) for p in self.store.artifacts):
+            return self._send(404, b'Not Found')
+        host = f"http://{self.headers.get('Host')}"
+        prefix = '' if directory.startswith('/artifactory/') else host + directory
+        rows = ''.join(f'<a href="{prefix}{name}">{name}</a>\n' for name in names)
+        self._send(200, f"<html><body><pre>{rows}</pre></body></html>".encode())
+
+    def _storage_listing(self, directory):
+        names = self.store.children(directory)
+        if not names:
+            return self._send(404, b'{"errors": [{"status": 404}]}', 'application/json')
+        payload = {'path': directory, 'children': [{'uri': '/' + name, 'folder': False} for name in names]}
+        self._send(200, json.dumps(payload).encode(), 'application/json')
+
+    def _artifact(self, path):
+        options = self.options
+        size = self.store.artifacts[path]['size']
+        etag = self.store.etag(path)
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, headers={'ETag': etag})
+
+        start, end, status = 0, size - 1, 200
+        range_header = self.headers.get('Range')
+        if options.ranges and range_header and self.headers.get('If-Range', etag) == etag:
+            first, _, last = range_header.split('=', 1)[1].split(',')[0].partition('-')
+            if first:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(0, size - int(last))
+            if start >= size:
+                return self._send(416, headers={'Content-Range': f"bytes */{size}"})
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', self.store.created)
+        if options.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        if options.checksums == 'header':
+            self.send_header('X-Checksum-Sha256', self.store.digest(path, 'sha256'))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        cut_at = start + (end - start + 1) // 2 if options.roll(options.drop_rate) else None
+        sent = 0
+        began = time.monotonic()
+        for chunk in self.store.read(path, start, end):
+            if cut_at is not None and start + sent + len(chunk) > cut_at:
+                self.wfile.write(chunk[:cut_at - start - sent])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            sent += len(chunk)
+            if options.bandwidth:
+                ahead = sent / options.bandwidth - (time.monotonic() - began)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+# Clients abandoning a body (segment probes, injected drops) are expected, not errors
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+# Start a server on a background thread; returns (server, base_url)
+def start_server(store, options=None, host='127.0.0.1', port=0):
+    handler = type('Handler', (ArtifactRequestHandler,), {'store': store, 'options': options or ServerOptions()})
+    server = QuietHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Maven/Artifactory stand-in serving generated artifacts")
+    parser.add_argument('--port', type=int, default=8081, help="Port to listen on")
+    parser.add_argument('--artifact', action='append', default=[], help="PATH:SIZE_MB, e.g. /artifactory/stable-dev/202408/tb-server/tb-server-1.war:200")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds of latency added to every response")
+    parser.add_argument('--bandwidth', type=float, help="Per-connection bandwidth cap in MB/s")
+    parser.add_argument('--fail_rate', type=float, default=0.0, help="Fraction of requests answered with 502")
+    parser.add_argument('--drop_rate', type=float, default=0.0, help="Fraction of artifact bodies cut off half way")
+    parser.add_argument('--no_ranges', action='store_true', help="Do not advertise or honour Range requests")
+    parser.add_argument('--checksums', choices=['header', 'sidecar', 'none'], default='header', help="How checksums are published")
+    args = parser.parse_args()
+
+    store = ArtifactStore()
+    for spec in args.artifact:
+        path, size_mb = spec.rsplit(':', 1)
+        store.add(path, int(float(size_mb) * 1024 * 1024))
+    options = ServerOptions(latency=args.latency, bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+                            fail_rate=args.fail_rate, drop_rate=args.drop_rate, ranges=not args.no_ranges, checksums=args.checksums)
+    server, base_url = start_server(store, options, port=args.port)
+    print(f"Serving {len(store.artifacts)} artifacts on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.join(BENCH_DIR, '..', 'script')
+sys.path.insert(0, SCRIPT_DIR)
+
+from artifact_server import ArtifactStore, ServerOptions, start_server
+
+RESULT_MARKER = 'BENCH_RESULT '
+
+# Package layout for a scenario: alternate Maven-style (absolute hrefs) and Artifactory-style directories
+def scenario_packages(base_url, packages, size_mb):
+    entries = []
+    for index in range(packages):
+        name = f"bench{index}-{size_mb}mb"
+        if index % 2:
+            entries.append({'package_name': name, 'base_url': f"{base_url}/artifactory/stable-dev", 'path': f"/bench/{name}/",
+                            'file_name_pattern': name, 'file_extension': '.war', 'is_utp_url': True, 'db_filter': False,
+                            'artifact': f"/artifactory/stable-dev/bench/{name}/{name}-1.war"})
+        else:
+            entries.append({'package_name': name, 'base_url': f"{base_url}/content/repositories/releases", 'path': f"/bench/{name}/",
+                            'file_name_pattern': name, 'file_extension': '.zip', 'is_utp_url': False, 'db_filter': True,
+                            'artifact': f"/content/repositories/releases/bench/{name}/{name}-1.zip"})
+    return entries
+
+# Child process: resolve and download every package through download_packages, then report metrics
+def run_one(spec_path):
+    with open(spec_path) as f:
+        spec = json.load(f)
+
+    import download_packages
+    from http_sessions import SessionPool
+
+    artifact_urls = {spec['base_url'] + package['artifact'] for package in spec['config']['products'][0]['packages']}
+
+    class TimingSessionPool(SessionPool):
+        ttfb = []
+
+        # With stream=True, get() returns once the response headers arrive
+        def get(self, url, auth=None, **kwargs):
+            start = time.perf_counter()
+            response = super().get(url, auth=auth, **kwargs)
+            if url in artifact_urls and kwargs.get('stream'):
+                self.ttfb.append(time.perf_counter() - start)
+            return response
+
+    sessions = TimingSessionPool(pool_size=spec['workers'] * max(1, spec['segments']), retries=3, backoff=0.05)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        jobs = download_packages.build_download_plan(spec['config'], [('BENCH', '1', 'pos')])
+        results = download_packages.fetch_packages(
+            jobs, spec['config']['download_dir'], max_workers=spec['workers'], max_per_host=spec['max_per_host'], sessions=sessions,
+            download_options={'chunk_size': spec['chunk_kb'] * 1024, 'segments': spec['segments'], 'segment_min_size': 1024 * 1024},
+            listing_options={'listing_cache': download_packages.ListingCache()})
+    wall = time.perf_counter() - start
+
+    downloaded = sum(r['bytes_downloaded'] for r in results)
+    ttfb = TimingSessionPool.ttfb
+    print(RESULT_MARKER + json.dumps({
+        'wall_time_s': round(wall, 3),
+        'bytes_downloaded': downloaded,
+        'throughput_mb_s': round(downloaded / (1024 * 1024) / wall, 2) if wall else None,
+        'ttfb_ms_median': round(statistics.median(ttfb) * 1000, 2) if ttfb else None,
+        'ttfb_ms_max': round(max(ttfb) * 1000, 2) if ttfb else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'failures': [r['package_name'] for r in results if r['status'] != 'ok'],
+        'http': sessions.stats(),
+    }))
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark download_packages.py against a local artifact server")
+    parser.add_argument('--packages', type=int, nargs='+', default=[1, 5], help="Package counts to benchmark")
+    parser.add_argument('--size_mb', type=int, nargs='+', default=[50], help="Artifact sizes in MB")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 5], help="--max_workers values")
+    parser.add_argument('--max_per_host', type=int, default=None, help="--max_per_host for every scenario")
+    parser.add_argument('--segments', type=int, default=1, help="--segments for every scenario")
+    parser.add_argument('--chunk_kb', type=int, default=1024, help="--chunk_size (KiB) for every scenario")
+    parser.add_argument('--latency', type=float, default=0.0, help="Server latency per response in seconds")
+    parser.add_argument('--bandwidth', type=float, help="Server bandwidth cap per connection in MB/s")
+    parser.add_argument('--fail_rate', type=float, default=0.0, help="Fraction of requests the server answers with 502")
+    parser.add_argument('--drop_rate', type=float, default=0.0, help="Fraction of artifact bodies the server cuts off")
+    parser.add_argument('--no_ranges', action='store_true', help="Server does not support Range requests")
+    parser.add_argument('--checksums', choices=['header', 'sidecar', 'none'], default='header', help="How the server publishes checksums")
+    parser.add_argument('--output', default='bench_downloads.json', help="JSON results file")
+    parser.add_argument('--run_one', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        return run_one(args.run_one)
+
+    store = ArtifactStore()
+    options = ServerOptions(latency=args.latency, bandwidth=args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+                            fail_rate=args.fail_rate, drop_rate=args.drop_rate, ranges=not args.no_ranges, checksums=args.checksums)
+    server, base_url = start_server(store, options)
+    for size_mb in args.size_mb:
+        for package in scenario_packages(base_url, max(args.packages), size_mb):
+            store.add(package['artifact'], size_mb * 1024 * 1024)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size_mb in args.size_mb:
+            for packages in args.packages:
+                for workers in args.workers:
+                    download_dir = tempfile.mkdtemp(dir=work_dir)
+                    spec = {
+                        'base_url': base_url, 'workers': workers, 'max_per_host': args.max_per_host,
+                        'segments': args.segments, 'chunk_kb': args.chunk_kb,
+                        'config': {'products': [{'name': 'BENCH', 'packages': scenario_packages(base_url, packages, size_mb)}],
+                                   'download_dir': download_dir},
+                    }
+                    spec_path = os.path.join(work_dir, 'spec.json')
+                    with open(spec_path, 'w') as f:
+                        json.dump(spec, f)
+                    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run_one', spec_path],
+                                            capture_output=True, text=True, check=True).stdout
+                    metrics = json.loads(next(line for line in output.splitlines() if line.startswith(RESULT_MARKER))[len(RESULT_MARKER):])
+                    metrics.update(packages=packages, size_mb=size_mb, workers=workers)
+                    results.append(metrics)
+                    print(f"packages={packages:3} size={size_mb:5}MB workers={workers:3}  wall={metrics['wall_time_s']:7.2f}s  "
+                          f"{metrics['throughput_mb_s'] or 0:8.1f} MB/s  ttfb(median)={metrics['ttfb_ms_median'] or 0:7.1f}ms  "
+                          f"rss={metrics['peak_rss_mb']:6.1f}MB  failures={len(metrics['failures'])}")
+                    for name in os.listdir(download_dir):
+                        os.remove(os.path.join(download_dir, name))
+    server.shutdown()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'server': {key: value for key, value in vars(args).items() if key in ('latency', 'bandwidth', 'fail_rate', 'drop_rate', 'no_ranges', 'checksums')},
+        'client': {'max_per_host': args.max_per_host, 'segments': args.segments, 'chunk_kb': args.chunk_kb},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
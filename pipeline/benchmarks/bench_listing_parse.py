@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'script'))
+
+from resolver import parse_html_listing, latest_matching
+
+# Build a Nexus-style HTML listing with `entries` artifacts across build numbers
+def generate_listing(entries, base_url="http://maven.example.com/content/repositories/releases/t24-jars/"):
+    rows = []
+    for build in range(1, entries + 1):
+        name = f"t24-jars-202408.0.0-{build}.zip"
+        rows.append(f'<tr><td><a href="{base_url}{name}">{name}</a></td><td>Mon Aug 05 10:00:00 UTC 2024</td><td>123456789</td></tr>')
+    return f"<html><body><table>{''.join(rows)}</table></body></html>"
+
+def time_it(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+# Old resolver: BeautifulSoup html.parser and a lexicographic sort
+def bs4_resolve(html, pattern, extension):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    files = [a['href'] for a in soup.find_all('a') if pattern in a['href'] and a['href'].endswith(extension)]
+    files.sort()
+    return files
+
+def regex_resolve(html, pattern, extension):
+    return latest_matching(parse_html_listing(html), pattern, extension)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare directory listing parse time: BeautifulSoup vs the regex resolver")
+    parser.add_argument('--listing', help="Saved HTML listing to parse (generated and saved here if it does not exist)")
+    parser.add_argument('--entries', type=int, default=10000, help="Entries in a generated listing")
+    parser.add_argument('--pattern', default='t24-jars', help="File name pattern to match")
+    parser.add_argument('--extension', default='.zip', help="File extension to match")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per parser; the best time is reported")
+    args = parser.parse_args()
+
+    if args.listing and os.path.exists(args.listing):
+        with open(args.listing) as f:
+            html = f.read()
+    else:
+        html = generate_listing(args.entries)
+        if args.listing:
+            with open(args.listing, 'w') as f:
+                f.write(html)
+
+    print(f"Listing: {len(html) / 1024:.0f} KiB")
+    regex_time, regex_files = time_it(lambda: regex_resolve(html, args.pattern, args.extension), args.repeat)
+    print(f"regex + version sort : {regex_time * 1000:8.1f} ms, {len(regex_files)} matches, latest {regex_files[-1].split('/')[-1] if regex_files else None}")
+    try:
+        bs4_time, bs4_files = time_it(lambda: bs4_resolve(html, args.pattern, args.extension), args.repeat)
+    except ImportError:
+        print("beautifulsoup4 not installed, skipping the html.parser baseline")
+        return
+    print(f"bs4 + lexical sort   : {bs4_time * 1000:8.1f} ms, {len(bs4_files)} matches, latest {bs4_files[-1].split('/')[-1] if bs4_files else None}")
+    print(f"speedup: {bs4_time / regex_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Linux FICLONE ioctl: copy-on-write clone on btrfs/xfs
+FICLONE = 0x40049409
+
+# Link a cached object into place: reflink, then hardlink, then plain copy
+def place_file(src, dest):
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        return 'hardlink'  # Already linked from a previous run
+    tmp_dest = f"{dest}.tmp-{os.getpid()}-{threading.get_ident()}"
+    if os.path.exists(tmp_dest):
+        os.remove(tmp_dest)
+    try:
+        with open(src, 'rb') as s, open(tmp_dest, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        method = 'reflink'
+    except OSError:
+        if os.path.exists(tmp_dest):
+            os.remove(tmp_dest)
+        try:
+            os.link(src, tmp_dest)
+            method = 'hardlink'
+        except OSError:
+            shutil.copyfile(src, tmp_dest)
+            method = 'copy'
+    os.replace(tmp_dest, dest)
+    # rename() is a no-op when both names already link the same inode
+    if os.path.exists(tmp_dest):
+        os.remove(tmp_dest)
+    return method
+
+# Persistent on-disk cache: objects stored by SHA-256, indexed by URL, evicted LRU by size
+class ArtifactCache:
+    def __init__(self, cache_dir, max_bytes=None, max_age=0):
+        self.cache_dir = cache_dir
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.tmp_dir = os.path.join(cache_dir, 'tmp')
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.lock_path = os.path.join(cache_dir, '.lock')
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    # Serialise index updates across threads (lock) and processes (flock)
+    def _locked(self, update):
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                result = update(index)
+                self._write_index(index)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='index-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    # Return the cache entry for a URL if its object is still on disk
+    def lookup(self, url):
+        with self._lock:
+            entry = self._read_index().get(url)
+        if entry and os.path.exists(self.object_path(entry['sha256'])):
+            return entry
+        return None
+
+    # Entries younger than max_age seconds are served without revalidation
+    def is_fresh(self, entry):
+        return self.max_age > 0 and time.time() - entry.get('validated_at', 0) < self.max_age
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # Stable per-URL partial file, so an interrupted download can be resumed by the next run
+    def part_path(self, url):
+        return os.path.join(self.tmp_dir, hashlib.sha1(url.encode()).hexdigest() + '.part')
+
+    # Move a finished download into the object store and index it under its URL
+    def store(self, url, tmp_path, sha256, size, etag=None, last_modified=None):
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(tmp_path)  # Same content already cached under another URL
+        else:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, object_path)
+
+        now = time.time()
+        entry = {'sha256': sha256, 'size': size, 'etag': etag, 'last_modified': last_modified,
+                 'validated_at': now, 'last_access': now}
+
+        def update(index):
+            index[url] = entry
+            self._evict(index, keep=sha256)
+
+        self._locked(update)
+        return entry
+
+    # Record a hit or 304 so the entry moves to the back of the LRU queue
+    def touch(self, url, revalidated=False):
+        def update(index):
+            entry = index.get(url)
+            if entry:
+                entry['last_access'] = time.time()
+                if revalidated:
+                    entry['validated_at'] = entry['last_access']
+
+        self._locked(update)
+
+    def place(self, entry, dest):
+        return place_file(self.object_path(entry['sha256']), dest)
+
+    # Drop least-recently-used objects until the cache fits in max_bytes
+    def _evict(self, index, keep=None):
+        if not self.max_bytes:
+            return
+        objects = {}
+        for url, entry in index.items():
+            obj = objects.setdefault(entry['sha256'], {'size': entry['size'], 'last_access': 0, 'urls': []})
+            obj['last_access'] = max(obj['last_access'], entry.get('last_access', 0))
+            obj['urls'].append(url)
+
+        total = sum(obj['size'] for obj in objects.values())
+        for sha256, obj in sorted(objects.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            if sha256 == keep:
+                continue
+            try:
+                os.remove(self.object_path(sha256))
+            except FileNotFoundError:
+                pass
+            for url in obj['urls']:
+                del index[url]
+            total -= obj['size']
+            print(f"Evicted {sha256[:12]} ({obj['size']} bytes) from artifact cache")
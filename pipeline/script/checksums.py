@@ -0,0 +1,60 @@
+import hashlib
+import re
+
+import requests
+
+# Checksum headers sent by Artifactory, strongest first
+CHECKSUM_HEADERS = [
+    ('sha256', 'X-Checksum-Sha256'),
+    ('sha1', 'X-Checksum-Sha1'),
+    ('md5', 'X-Checksum-Md5'),
+]
+
+# Sidecar files published next to artifacts by Maven/Nexus and Artifactory
+SIDECAR_EXTENSIONS = [
+    ('sha256', '.sha256'),
+    ('sha1', '.sha1'),
+    ('md5', '.md5'),
+]
+
+HEX_LENGTHS = {'sha256': 64, 'sha1': 40, 'md5': 32}
+
+class ChecksumMismatch(Exception):
+    pass
+
+# Sidecars contain the digest, optionally followed by the file name ("<hex>  file.zip")
+def parse_sidecar(text, algorithm):
+    match = re.search(r'\b([0-9a-fA-F]{%d})\b' % HEX_LENGTHS[algorithm], text)
+    return match.group(1).lower() if match else None
+
+# Expected digests for an artifact: response headers first, then the first sidecar that exists
+def expected_checksums(sessions, url, auth=None, headers=None):
+    expected = {}
+    for algorithm, header in CHECKSUM_HEADERS:
+        value = (headers or {}).get(header)
+        if value and len(value) == HEX_LENGTHS[algorithm]:
+            expected[algorithm] = value.lower()
+    if expected:
+        return expected, 'headers'
+
+    for algorithm, extension in SIDECAR_EXTENSIONS:
+        try:
+            response = sessions.get(url + extension, auth=auth)
+        except requests.RequestException as e:
+            print(f"Could not fetch checksum sidecar {url + extension}: {e}")
+            continue
+        if response.status_code != 200:
+            continue
+        digest = parse_sidecar(response.text, algorithm)
+        if digest:
+            return {algorithm: digest}, extension
+    return {}, None
+
+def new_hashers(algorithms):
+    return {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+
+# Return the algorithms whose computed digest differs from the expected one
+def mismatched(hashers, expected):
+    return {algorithm: (digest, hashers[algorithm].hexdigest())
+            for algorithm, digest in expected.items()
+            if hashers[algorithm].hexdigest() != digest}
@@ -1,44 +1,147 @@
-import requests
 import argparse
 import os
+import sys
 import json
-from bs4 import BeautifulSoup
+import contextlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 import urllib3
+from http_sessions import SessionPool
+from artifact_cache import ArtifactCache, place_file
+from range_download import download_to_part, DEFAULT_CHUNK_SIZE
+from resolver import list_directory, latest_matching, ListingCache
+from zip_extract import extract_remote_zip, extract_local_zip
+from checksums import expected_checksums, new_hashers, mismatched, ChecksumMismatch
+from telemetry import Telemetry, timed
 
 # Suppress SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Function to download the file
-def download_package(full_url, download_dir, auth=None, verify_ssl=True):
-    local_filename = os.path.join(download_dir, full_url.split('/')[-1])
+def download_package(full_url, download_dir, auth=None, verify_ssl=True, sessions=None, cache=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, segments=1, segment_min_size=64 * 1024 * 1024,
+                     verify=True, verify_retries=2, dest_path=None, fsync=False, trace=None):
+    sessions = sessions or SessionPool(verify_ssl=verify_ssl)
+    local_filename = dest_path or os.path.join(download_dir, full_url.split('/')[-1])
+    os.makedirs(os.path.dirname(local_filename), exist_ok=True)
+    result = {'file': local_filename, 'cache': None, 'bytes_downloaded': 0, 'size': None, 'resumed_from': 0, 'segments': 0,
+              'verified': None}
+
+    # Serve from the artifact cache when the entry is fresh, or revalidate it with a conditional GET
+    entry = cache.lookup(full_url) if cache else None
+    if entry and cache.is_fresh(entry):
+        method = cache.place(entry, local_filename)
+        cache.touch(full_url)
+        print(f"Cache hit for {full_url}, placed {local_filename} ({method})")
+        result.update(cache='hit', size=entry['size'])
+        return result
 
     print(f"Downloading {full_url} to {local_filename} (SSL Verification: {verify_ssl})")
 
     # Make the HTTP request with or without credentials
-    with requests.get(full_url, stream=True, auth=auth, verify=verify_ssl) as r:
+    headers = cache.conditional_headers(entry) if entry else {}
+    with sessions.get(full_url, stream=True, auth=auth, headers=headers, trace=trace) as r:
+        if entry and r.status_code == 304:
+            method = cache.place(entry, local_filename)
+            cache.touch(full_url, revalidated=True)
+            print(f"Cache revalidated for {full_url} (304), placed {local_filename} ({method})")
+            result.update(cache='revalidated', size=entry['size'])
+            return result
+
         r.raise_for_status()  # Check for HTTP errors
-        with open(local_filename, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
 
-    print(f"Downloaded {local_filename}")
+        # Expected digests come from Artifactory checksum headers or the published sidecar files
+        expected, checksum_source = expected_checksums(sessions, full_url, auth, r.headers) if verify else ({}, None)
+        algorithms = set(expected) | ({'sha256'} if cache else set())
+
+        # Stream into a .part file (resumable, optionally segmented), hashing as it arrives
+        part_path = cache.part_path(full_url) if cache else local_filename + '.part'
+        response = r
+        content_length = r.headers.get('Content-Length')
+        if trace:
+            trace.start_transfer(int(content_length) if content_length and content_length.isdigit() else None)
+        try:
+            for attempt in range(verify_retries + 1):
+                hashers = new_hashers(algorithms)
+                transfer = download_to_part(sessions, full_url, response, part_path, auth=auth, hashers=hashers, chunk_size=chunk_size,
+                                            segments=segments, segment_min_size=segment_min_size, progress=trace.advance if trace else None)
+                if trace and transfer['resumes']:
+                    trace.on_retry(transfer['resumes'])
+                result['bytes_downloaded'] += transfer['bytes_downloaded']
+                result.update(size=transfer['size'], resumed_from=transfer['resumed_from'], segments=transfer['segments'])
+
+                bad = mismatched(hashers, expected)
+                if not bad:
+                    break
+                # Drop the corrupt file (and any resume state) and fetch it again from scratch
+                os.remove(part_path)
+                details = ', '.join(f"{algorithm} expected {want} got {got}" for algorithm, (want, got) in bad.items())
+                if attempt == verify_retries:
+                    raise ChecksumMismatch(f"Checksum mismatch for {full_url} ({details})")
+                print(f"Checksum mismatch for {full_url} ({details}), re-fetching ({attempt + 1}/{verify_retries})")
+                if trace:
+                    trace.on_retry()
+                response.close()
+                response = sessions.get(full_url, stream=True, auth=auth, trace=trace)
+                response.raise_for_status()
+        finally:
+            # r is closed by its with block too; this covers the re-fetches
+            response.close()
+        if trace:
+            trace.end_transfer()
+
+        if expected:
+            result['verified'] = checksum_source
+            print(f"Verified {', '.join(sorted(expected))} for {full_url} (from {checksum_source})")
+
+        # Flush the data to disk before it is published under its final name
+        if fsync:
+            with timed(trace, 'fsync'):
+                fd = os.open(part_path, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+
+        if not cache:
+            os.replace(part_path, local_filename)
+            print(f"Downloaded {local_filename}")
+            return result
+
+        # Move the finished download into the cache, then link the object into the download dir
+        entry = cache.store(full_url, part_path, hashers['sha256'].hexdigest(), transfer['size'],
+                            etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+
+    method = cache.place(entry, local_filename)
+    result['cache'] = 'miss'
+    print(f"Downloaded {local_filename} (cached as {entry['sha256'][:12]}, {method})")
+    return result
 
 # Function to get the latest file from a directory listing
-def get_latest_file_from_directory(url, file_name_pattern, auth=None, verify_ssl=True, extension=".zip", is_utp_url=False):
+def get_latest_file_from_directory(url, file_name_pattern, auth=None, verify_ssl=True, extension=".zip", is_utp_url=False, sessions=None,
+                                   listing_cache=None, use_api=True, trace=None):
+    sessions = sessions or SessionPool(verify_ssl=verify_ssl)
     print(f"Fetching contents of {url} (SSL Verification: {verify_ssl})")
-    response = requests.get(url, auth=auth, verify=verify_ssl)
-    response.raise_for_status()  # Raise an error for bad HTTP responses
-    soup = BeautifulSoup(response.text, 'html.parser')
 
-    # List files matching the pattern and ensure only the required extension is included
-    files = [a['href'] for a in soup.find_all('a') if file_name_pattern in a['href'] and a['href'].endswith(extension)]
+    # Artifactory (UTP) directories are listed through the storage JSON API, everything else from HTML
+    use_api = use_api and is_utp_url
+    fetch = lambda: list_directory(sessions, url, auth=auth, use_api=use_api, trace=trace)
+    if listing_cache:
+        listing, source = listing_cache.get(f"{'api' if use_api else 'html'}:{url}", fetch)
+    else:
+        listing, source = fetch()
+
+    # List files matching the pattern and ensure only the required extension is included,
+    # ordered by the version/build numbers in their names
+    with timed(trace, 'parse'):
+        files = latest_matching(listing, file_name_pattern, extension)
 
     if not files:
         raise ValueError(f"No valid files found matching the pattern: {file_name_pattern} with extension {extension}")
 
-    files.sort()
-
-    print("Available files in the directory:")
+    print(f"Available files in the directory ({source}):")
     for file in files:
         print(file)
 
@@ -51,17 +154,317 @@ def get_latest_file_from_directory(url, file_name_pattern, auth=None, verify_ssl
 
     return latest_file
 
+# Per-host limiter so concurrent fetches do not hammer a single server
+class HostLimiter:
+    def __init__(self, max_per_host):
+        self.max_per_host = max_per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def for_url(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+# Build the list of package jobs for a product, with version/db_type substituted
+def resolve_package_jobs(product, version, db_type, username=None, password=None, token=None):
+    jobs = []
+    for package in product['packages']:
+        base_url = package['base_url']
+        package_url = base_url + package['path'].replace('{{version}}', version)
+
+        # Handle credentials if required
+        credentials = None
+        if package.get('credentials_required', False):
+            if token:
+                credentials = (username, token)
+            elif password:
+                credentials = (username, password)
+            else:
+                raise ValueError("Authentication required but no token or password provided")
+
+        jobs.append({
+            'package_name': package.get('package_name', package['file_name_pattern']),
+            'url': package_url,
+            # Pattern to find the file
+            'file_name_pattern': package['file_name_pattern'].replace('{{version}}', version).replace('{{db_type}}', db_type),
+            # Use extension from JSON
+            'extension': package.get('file_extension', '.zip'),
+            'is_utp_url': package.get('is_utp_url', False),
+            'db_filter': package.get('db_filter', True),
+            'assemble': package.get('assemble'),
+            'auth': credentials,
+        })
+    return jobs
+
+# Expand comma-separated --product_groups/--version/--db_type (or a --matrix JSON list) into combinations
+def parse_matrix(args):
+    if args.matrix:
+        text = args.matrix
+        if os.path.exists(text):
+            with open(text) as f:
+                text = f.read()
+        return [(entry['product_groups'], str(entry['version']), entry['db_type']) for entry in json.loads(text)]
+
+    if not (args.product_groups and args.version and args.db_type):
+        raise ValueError("--product_groups, --version and --db_type are required unless --matrix is given")
+    split = lambda value: [item.strip() for item in value.split(',') if item.strip()]
+    return [(product, version, db_type)
+            for product in split(args.product_groups)
+            for version in split(args.version)
+            for db_type in split(args.db_type)]
+
+# Build one deduplicated job list for every product/version/db_type combination. Packages whose
+# substituted URL and pattern are identical (db_filter: false packages across db types) become one
+# job that records every combination needing it.
+def build_download_plan(config, combos, username=None, password=None, token=None):
+    jobs = {}
+    for product_name, version, db_type in combos:
+        products = [product for product in config['products'] if product['name'] == product_name]
+        if not products:
+            raise ValueError(f"Product group {product_name} not found in config")
+        for product in products:
+            print(f"Processing product: {product['name']} (version {version}, db_type {db_type})")
+            for job in resolve_package_jobs(product, version, db_type, username, password, token):
+                key = (job['url'], job['file_name_pattern'], job['extension'], job['is_utp_url'])
+                if key not in jobs:
+                    job['consumers'] = []
+                    jobs[key] = job
+                jobs[key]['consumers'].append({'product_groups': product_name, 'version': version, 'db_type': db_type})
+
+    # Disambiguate package names once more than one combination is being planned
+    if len(combos) > 1:
+        for job in jobs.values():
+            versions = sorted({c['version'] for c in job['consumers']})
+            scope = ','.join(versions)
+            if job['db_filter']:
+                scope += '/' + ','.join(sorted({c['db_type'] for c in job['consumers']}))
+            job['package_name'] = f"{job['package_name']} [{scope}]"
+    return list(jobs.values())
+
+# Resolve the latest file for every job concurrently, recording resolved_url or error on the job
+def resolve_jobs(jobs, verify_ssl=True, max_workers=1, max_per_host=None, sessions=None, listing_options=None, telemetry=None):
+    limiter = HostLimiter(max_per_host) if max_per_host else None
+
+    def resolve(job):
+        host_slot = limiter.for_url(job['url']) if limiter else None
+        try:
+            if host_slot:
+                host_slot.acquire()
+            job['resolved_url'] = get_latest_file_from_directory(job['url'], job['file_name_pattern'], auth=job['auth'], verify_ssl=verify_ssl, extension=job['extension'], is_utp_url=job['is_utp_url'], sessions=sessions,
+                                                                 trace=telemetry.package(job['package_name']) if telemetry else None, **(listing_options or {}))
+        except Exception as e:
+            print(f"Failed to resolve {job['package_name']}: {e}")
+            job['error'] = str(e)
+        finally:
+            if host_slot:
+                host_slot.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        list(executor.map(resolve, jobs))
+    return jobs
+
+# JSON view of the plan (never includes credentials), optionally merged with download results
+def plan_to_json(jobs, download_dir, results=None):
+    packages = []
+    for index, job in enumerate(jobs):
+        entry = {key: job.get(key) for key in ('package_name', 'url', 'file_name_pattern', 'extension', 'is_utp_url', 'db_filter', 'consumers')}
+        entry['credentials_required'] = job['auth'] is not None
+        resolved_url = results[index]['file'] if results else job.get('resolved_url')
+        entry['resolved_url'] = resolved_url
+        entry['file_name'] = resolved_url.split('/')[-1] if resolved_url else None
+        if results:
+            entry['status'] = results[index]['status']
+            entry['error'] = results[index]['error']
+        elif job.get('error'):
+            entry['error'] = job['error']
+        packages.append(entry)
+    return {'download_dir': download_dir, 'packages': packages}
+
+# Work out where each package lands under extract_to from its "assemble" spec. Destinations may use
+# variables provided by other packages (e.g. {{app_dir}} is the preimage zip's name without extension),
+# resolved separately for every product/version/db_type combination that consumes the package.
+def plan_assembly(jobs, extract_to):
+    variables = {}
+    for job in jobs:
+        provides = (job.get('assemble') or {}).get('provides')
+        if provides and job.get('resolved_url'):
+            stem = os.path.splitext(job['resolved_url'].split('/')[-1])[0]
+            for consumer in job.get('consumers', [{}]):
+                variables.setdefault(tuple(sorted(consumer.items())), {})[provides] = stem
+
+    for job in jobs:
+        spec = job.get('assemble')
+        if not spec or not job.get('resolved_url'):
+            continue
+        targets = []
+        unresolved = []
+        for consumer in job.get('consumers', [{}]):
+            dest = spec['dest']
+            for name, value in variables.get(tuple(sorted(consumer.items())), {}).items():
+                dest = dest.replace('{{' + name + '}}', value)
+            if '{{' in dest:
+                unresolved.append(dest)
+                continue
+            target = os.path.join(extract_to, dest)
+            if target not in targets:
+                targets.append(target)
+        # A combination whose providing package failed is skipped; the others still get assembled
+        if unresolved and not targets:
+            job['assemble_error'] = f"Unresolved variable in assemble destination {unresolved[0]} (did the providing package resolve?)"
+        elif unresolved:
+            print(f"Skipping {len(unresolved)} assemble destination(s) of {job['package_name']} with unresolved variables")
+        job['assemble_targets'] = targets
+
+# Place a resolved package at its assemble destinations: zips are unpacked in parallel (straight from
+# the server by range when possible, so the archive never hits the disk), other files are placed as-is
+def assemble_package(job, latest_file, download_dir, verify_ssl=True, sessions=None, cache=None, download_options=None, extract_workers=4,
+                     trace=None):
+    options = download_options or {}
+    targets = job['assemble_targets']
+    if not job['assemble'].get('extract'):
+        download = download_package(latest_file, download_dir, auth=job['auth'], verify_ssl=verify_ssl, sessions=sessions, cache=cache,
+                                    dest_path=targets[0], trace=trace, **options)
+        for target in targets[1:]:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            place_file(targets[0], target)
+        print(f"Placed {latest_file.split('/')[-1]} at {', '.join(targets)}")
+        return download
+
+    # A single, uncached target can be extracted directly from the server
+    if not cache and len(targets) == 1:
+        with timed(trace, 'extract'):
+            extracted = extract_remote_zip(sessions, latest_file, targets[0], auth=job['auth'], workers=extract_workers,
+                                           chunk_size=options.get('chunk_size', DEFAULT_CHUNK_SIZE))
+        if extracted:
+            if trace:
+                trace.advance(extracted['bytes_downloaded'])
+            print(f"Extracted {extracted['members']} members of {latest_file} into {targets[0]} "
+                  f"over {extracted['range_requests']} range requests")
+            return {'file': targets[0], 'cache': None, 'bytes_downloaded': extracted['bytes_downloaded'],
+                    'size': extracted['bytes_extracted'], 'verified': 'zip-crc'}
+        print(f"{latest_file} does not support range requests, downloading before extracting")
+
+    download = download_package(latest_file, download_dir, auth=job['auth'], verify_ssl=verify_ssl, sessions=sessions, cache=cache, trace=trace,
+                                **options)
+    for target in targets:
+        with timed(trace, 'extract'):
+            extracted = extract_local_zip(download['file'], target, workers=extract_workers)
+        print(f"Extracted {extracted['members']} members of {download['file']} into {target}")
+    return download
+
+# Resolve and download a single package, returning a result record instead of raising
+def fetch_package(job, download_dir, verify_ssl=True, limiter=None, sessions=None, cache=None, download_options=None, listing_options=None,
+                  extract_workers=4, telemetry=None):
+    result = {'package_name': job['package_name'], 'status': 'failed', 'file': None, 'error': None,
+              'cache': None, 'bytes_downloaded': 0, 'size': None, 'verified': None}
+    trace = telemetry.package(job['package_name']) if telemetry else None
+    start = time.monotonic()
+    host_slot = limiter.for_url(job['url']) if limiter else None
+    try:
+        if host_slot:
+            host_slot.acquire()
+        try:
+            if job.get('assemble_error'):
+                raise ValueError(job['assemble_error'])
+            # Fetch the latest file based on the pattern, unless the plan already resolved it
+            latest_file = job.get('resolved_url') or get_latest_file_from_directory(job['url'], job['file_name_pattern'], auth=job['auth'], verify_ssl=verify_ssl, extension=job['extension'], is_utp_url=job['is_utp_url'], sessions=sessions,
+                                                         trace=trace, **(listing_options or {}))
+            # Download the latest file, or place it straight into the assemble layout
+            if job.get('assemble_targets'):
+                download = assemble_package(job, latest_file, download_dir, verify_ssl=verify_ssl, sessions=sessions, cache=cache,
+                                            download_options=download_options, extract_workers=extract_workers, trace=trace)
+            else:
+                download = download_package(latest_file, download_dir, auth=job['auth'], verify_ssl=verify_ssl, sessions=sessions, cache=cache,
+                                            trace=trace, **(download_options or {}))
+        finally:
+            if host_slot:
+                host_slot.release()
+        result['status'] = 'ok'
+        result['file'] = latest_file
+        result.update(cache=download['cache'], bytes_downloaded=download['bytes_downloaded'], size=download['size'],
+                      verified=download['verified'])
+    except Exception as e:
+        print(f"Failed to fetch {job['package_name']}: {e}")
+        result['error'] = str(e)
+    result['elapsed'] = time.monotonic() - start
+    if trace:
+        telemetry.finish(trace, result['status'], result['elapsed'], cache=result['cache'], verified=result['verified'],
+                         error=result['error'])
+    return result
+
+# Run all package jobs, at most max_workers in flight overall and max_per_host per server
+def fetch_packages(jobs, download_dir, verify_ssl=True, max_workers=1, max_per_host=None, sessions=None, cache=None, download_options=None,
+                   listing_options=None, extract_workers=4, telemetry=None):
+    sessions = sessions or SessionPool(verify_ssl=verify_ssl, pool_size=max(max_workers, max_per_host or 1))
+    limiter = HostLimiter(max_per_host) if max_per_host else None
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(fetch_package, job, download_dir, verify_ssl, limiter, sessions, cache, download_options, listing_options, extract_workers, telemetry): index for index, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            # Keep config order so the output is stable between runs
+            results[futures[future]] = future.result()
+    return results
+
+# Print a per-package summary and return the number of failures
+def print_fetch_summary(results, wall_time, sessions=None):
+    print("Download summary:")
+    for result in results:
+        detail = result['file'] if result['status'] == 'ok' else result['error']
+        if result['cache']:
+            detail = f"{detail} [cache {result['cache']}]"
+        print(f"  [{result['status'].upper():6}] {result['package_name']} ({result['elapsed']:.1f}s): {detail}")
+    failures = [r for r in results if r['status'] != 'ok']
+    print(f"{len(results) - len(failures)}/{len(results)} packages downloaded in {wall_time:.1f}s")
+    cached = [r for r in results if r['cache'] in ('hit', 'revalidated')]
+    if cached:
+        saved = sum(r['size'] or 0 for r in cached)
+        print(f"Artifact cache: {len(cached)} served from cache, {saved / (1024 * 1024):.1f} MB not downloaded")
+    if sessions:
+        stats = sessions.stats()
+        print(f"HTTP: {stats['requests']} requests over {stats['connections_opened']} connections "
+              f"({stats['connections_reused']} reused), {stats['retries']} retries")
+    return len(failures)
+
 # Main logic to fetch the page, filter the packages, and download them
 def main():
-    parser = argparse.ArgumentParser(description="Download the latest package for a given database type")
+    parser = argparse.ArgumentParser(description="Download the latest packages for one or more product/version/database type combinations")
     parser.add_argument('--config', required=True, help="Path to the JSON config file")
-    parser.add_argument('--product_groups', required=True, help="Product group to download (e.g., T24, FCM)")
-    parser.add_argument('--version', required=True, help="Version of the product to download")
-    parser.add_argument('--db_type', required=True, help="Database type (e.g., pos, h2d, etc.)")
+    parser.add_argument('--product_groups', help="Product group(s) to download, comma-separated (e.g., T24 or T24,FCM)")
+    parser.add_argument('--version', help="Version(s) of the product to download, comma-separated")
+    parser.add_argument('--db_type', help="Database type(s), comma-separated (e.g., pos or pos,h2d)")
+    parser.add_argument('--matrix', help="JSON list (or file) of {product_groups, version, db_type} combinations, instead of the three options above")
+    parser.add_argument('--plan_only', '--plan-only', action='store_true', help="Resolve the deduplicated download plan, print it as JSON and exit")
+    parser.add_argument('--extract_to', help="Assemble directory: unpack/place packages that have an \"assemble\" spec directly into their layout")
+    parser.add_argument('--extract_workers', type=int, default=4, help="Threads unpacking each zip with --extract_to")
+    parser.add_argument('--plan_file', help="Write the download plan (with per-package results) as JSON to this file")
     parser.add_argument('--ignore_ssl', action='store_true', help="Ignore SSL certificate errors")
     parser.add_argument('--username', help="Username for authenticated downloads")
     parser.add_argument('--password', help="Password for authenticated downloads")
     parser.add_argument('--token', help="Token for authenticated downloads")  # New argument for token
+    parser.add_argument('--max_workers', type=int, default=1, help="Number of packages to fetch concurrently (default: 1, sequential)")
+    parser.add_argument('--max_per_host', type=int, default=None, help="Maximum concurrent fetches against a single host")
+    parser.add_argument('--connect_timeout', type=float, default=10, help="HTTP connect timeout in seconds")
+    parser.add_argument('--read_timeout', type=float, default=60, help="HTTP read timeout in seconds")
+    parser.add_argument('--retries', type=int, default=3, help="Retries for failed or transient (429/5xx) GET requests")
+    parser.add_argument('--backoff', type=float, default=1.0, help="Base delay in seconds for jittered exponential backoff")
+    parser.add_argument('--cache_dir', help="Persistent artifact cache directory (disabled when not set)")
+    parser.add_argument('--cache_max_size', type=float, default=20, help="Artifact cache size limit in GB before LRU eviction")
+    parser.add_argument('--cache_max_age', type=int, default=0, help="Seconds a cache entry is trusted without revalidation (default: always revalidate)")
+    parser.add_argument('--chunk_size', type=int, default=DEFAULT_CHUNK_SIZE // 1024, help="Read/write buffer size in KiB")
+    parser.add_argument('--segments', type=int, default=1, help="Parallel byte-range segments per large file (needs Accept-Ranges)")
+    parser.add_argument('--segment_min_size', type=int, default=64, help="Only split files of at least this many MB into segments")
+    parser.add_argument('--no_verify', action='store_true', help="Skip checksum verification against Artifactory headers/sidecars")
+    parser.add_argument('--verify_retries', type=int, default=2, help="Re-fetch attempts after a checksum mismatch")
+    parser.add_argument('--listing_mode', choices=['api', 'html'], default='api', help="List UTP/Artifactory directories via the storage API (falls back to HTML) or HTML only")
+    parser.add_argument('--listing_ttl', type=int, default=0, help="Seconds a listing saved in --listing_cache_dir stays valid for later runs (default: 0, re-list every run)")
+    parser.add_argument('--listing_cache_dir', help="Persist directory listings here so later runs can reuse them within --listing_ttl")
+    parser.add_argument('--fsync', action='store_true', help="fsync every downloaded file before moving it into place")
+    parser.add_argument('--telemetry_file', help="Write per-package timing and progress events to this file as JSON lines")
+    parser.add_argument('--metrics_file', help="Write per-package metrics in Prometheus text format to this file (node_exporter textfile collector)")
+    parser.add_argument('--progress_interval', type=float, default=5, help="Seconds between progress lines for each package")
 
     args = parser.parse_args()
 
@@ -69,36 +472,65 @@ def main():
     with open(args.config) as f:
         config = json.load(f)
 
-    # Loop through the products in the config
-    for product in config['products']:
-        if product['name'] == args.product_groups:
-            print(f"Processing product: {product['name']}")
-            for package in product['packages']:
-                base_url = package['base_url']
-                package_url = base_url + package['path'].replace('{{version}}', args.version)
-                
-                # Handle credentials if required
-                credentials = None
-                if package.get('credentials_required', False):
-                    if args.token:
-                        credentials = (args.username, args.token)
-                    elif args.password:
-                        credentials = (args.username, args.password)
-                    else:
-                        raise ValueError("Authentication required but no token or password provided")
-
-                # Pattern to find the file
-                file_name_pattern = package['file_name_pattern'].replace('{{version}}', args.version).replace('{{db_type}}', args.db_type)
-
-                # Use extension from JSON
-                extension = package.get('file_extension', '.zip')
-                is_utp_url = package.get('is_utp_url', False)
-
-                # Fetch the latest file based on the pattern
-                latest_file = get_latest_file_from_directory(package_url, file_name_pattern, auth=credentials, verify_ssl=not args.ignore_ssl, extension=extension, is_utp_url=is_utp_url)
-
-                # Download the latest file
-                download_package(latest_file, config['download_dir'], auth=credentials, verify_ssl=not args.ignore_ssl)
+    # Plan every requested product/version/db_type combination, fetching shared packages once.
+    # With --plan_only the progress output goes to stderr so stdout stays valid JSON.
+    log_stream = sys.stderr if args.plan_only else sys.stdout
+    with contextlib.redirect_stdout(log_stream):
+        jobs = build_download_plan(config, parse_matrix(args), args.username, args.password, args.token)
+
+    sessions = SessionPool(verify_ssl=not args.ignore_ssl, pool_size=max(args.max_workers, args.max_per_host or 1) * max(1, args.segments),
+                           retries=args.retries, backoff=args.backoff,
+                           connect_timeout=args.connect_timeout, read_timeout=args.read_timeout)
+    cache = None
+    if args.cache_dir:
+        cache = ArtifactCache(args.cache_dir, max_bytes=int(args.cache_max_size * 1024 ** 3), max_age=args.cache_max_age)
+    download_options = {
+        'chunk_size': args.chunk_size * 1024,
+        'segments': args.segments,
+        'segment_min_size': args.segment_min_size * 1024 * 1024,
+        'verify': not args.no_verify,
+        'verify_retries': args.verify_retries,
+        'fsync': args.fsync,
+    }
+    listing_options = {
+        'listing_cache': ListingCache(ttl=args.listing_ttl, cache_dir=args.listing_cache_dir),
+        'use_api': args.listing_mode == 'api',
+    }
+    if args.plan_only:
+        with contextlib.redirect_stdout(log_stream):
+            resolve_jobs(jobs, verify_ssl=not args.ignore_ssl, max_workers=args.max_workers, max_per_host=args.max_per_host, sessions=sessions, listing_options=listing_options)
+        plan = plan_to_json(jobs, config['download_dir'])
+        if args.plan_file:
+            with open(args.plan_file, 'w') as f:
+                json.dump(plan, f, indent=2)
+        print(json.dumps(plan, indent=2))
+        sessions.close()
+        if any(job.get('error') for job in jobs):
+            sys.exit(1)
+        return
+
+    start = time.monotonic()
+    telemetry = Telemetry(args.telemetry_file, progress_interval=args.progress_interval)
+    telemetry.event('run_start', packages=len(jobs), max_workers=args.max_workers, segments=args.segments)
+    if args.extract_to:
+        # The layout depends on resolved file names, so resolve everything before fetching
+        resolve_jobs(jobs, verify_ssl=not args.ignore_ssl, max_workers=args.max_workers, max_per_host=args.max_per_host, sessions=sessions, listing_options=listing_options,
+                     telemetry=telemetry)
+        plan_assembly(jobs, args.extract_to)
+    results = fetch_packages(jobs, config['download_dir'], verify_ssl=not args.ignore_ssl, max_workers=args.max_workers, max_per_host=args.max_per_host, sessions=sessions, cache=cache, download_options=download_options,
+                             listing_options=listing_options, extract_workers=args.extract_workers, telemetry=telemetry)
+    wall_time = time.monotonic() - start
+    failures = print_fetch_summary(results, wall_time, sessions)
+    telemetry.print_table()
+    telemetry.close(failures=failures, http=sessions.stats())
+    if args.metrics_file:
+        telemetry.write_prometheus(args.metrics_file, wall_time)
+    if args.plan_file:
+        with open(args.plan_file, 'w') as f:
+            json.dump(plan_to_json(jobs, config['download_dir'], results), f, indent=2)
+    sessions.close()
+    if failures:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Status codes worth retrying for idempotent GETs
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Adapter whose pools count every new socket, so connection reuse can be reported
+class CountingHTTPAdapter(HTTPAdapter):
+    def __init__(self, on_connect, **kwargs):
+        self.on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        on_connect = self.on_connect
+
+        def counting(pool_cls):
+            class CountingConnection(pool_cls.ConnectionCls):
+                def connect(self):
+                    start = time.perf_counter()
+                    try:
+                        return super().connect()
+                    finally:
+                        on_connect(time.perf_counter() - start)
+
+            return type(pool_cls.__name__, (pool_cls,), {'ConnectionCls': CountingConnection})
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting(HTTPConnectionPool),
+            'https': counting(HTTPSConnectionPool),
+        }
+
+# Shared, keep-alive sessions per host with retry/backoff for GET requests
+class SessionPool:
+    def __init__(self, verify_ssl=True, pool_size=10, retries=3, backoff=1.0, max_backoff=30.0,
+                 connect_timeout=10, read_timeout=60):
+        self.verify_ssl = verify_ssl
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_count = 0
+        self.request_count = 0
+        self.connect_count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()  # Connect time of the request in flight on this thread
+        self._sessions = {}
+
+    # One session per (scheme, host, credentials); auth is applied once on the session
+    def session_for(self, url, auth=None):
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc, auth)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.auth = auth
+                session.verify = self.verify_ssl
+                adapter = CountingHTTPAdapter(self._count_connect, pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[key] = session
+            return session
+
+    def _count_connect(self, seconds):
+        with self._lock:
+            self.connect_count += 1
+        self._local.connect_seconds = getattr(self._local, 'connect_seconds', 0.0) + seconds
+
+    # Full-jitter exponential backoff: uniform(0, min(max_backoff, backoff * 2^attempt))
+    def _sleep_before_retry(self, attempt, trace=None):
+        with self._lock:
+            self.retry_count += 1
+        if trace:
+            trace.on_retry()
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt))))
+
+    # GET with retries; a trace (telemetry.PackageTrace) gets the retries plus connect/header timings
+    def get(self, url, auth=None, trace=None, **kwargs):
+        session = self.session_for(url, auth)
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            with self._lock:
+                self.request_count += 1
+            self._local.connect_seconds = 0.0
+            start = time.perf_counter()
+            try:
+                response = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                print(f"GET {url} failed ({e}), retrying ({attempt + 1}/{self.retries})")
+                self._sleep_before_retry(attempt, trace)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                print(f"GET {url} returned {response.status_code}, retrying ({attempt + 1}/{self.retries})")
+                response.close()
+                self._sleep_before_retry(attempt, trace)
+                continue
+            if trace:
+                trace.on_response(self._local.connect_seconds, time.perf_counter() - start, kwargs.get('stream', False))
+            return response
+
+    # Connection statistics: every request that did not open a socket reused one
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'requests': self.request_count,
+                'connections_opened': self.connect_count,
+                'connections_reused': max(0, self.request_count - self.connect_count),
+                'retries': self.retry_count,
+            }
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Errors raised by iter_content when a connection drops mid-body
+STREAM_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# How often (bytes per segment) a segmented download saves its progress to the .part.json sidecar
+SEGMENT_CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+class RangeNotSatisfied(Exception):
+    pass
+
+def _validator(response):
+    return response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+def _content_length(response):
+    if response.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    length = response.headers.get('Content-Length')
+    return int(length) if length and length.isdigit() else None
+
+def _supports_ranges(response):
+    return response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# The sidecar of a segmented download also holds its size and every segment as [start, end, next byte]
+def _write_meta(meta_path, url, validator, size=None, segments=None):
+    meta = {'url': url, 'validator': validator}
+    if segments is not None:
+        meta.update(size=size, segments=segments)
+    tmp_path = meta_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+# Feed an existing file through the hashers (resumed prefix, or a segmented download)
+def _hash_file(path, hashers, chunk_size, limit=None):
+    if not hashers:
+        return
+    remaining = limit
+    with open(path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            for h in hashers.values():
+                h.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+def _range_get(sessions, url, auth, start, end=None, validator=None):
+    headers = {'Range': f"bytes={start}-{'' if end is None else end}"}
+    if validator:
+        headers['If-Range'] = validator
+    return sessions.get(url, auth=auth, stream=True, headers=headers)
+
+# Single stream into part_path, appending from `offset` and resuming after mid-stream drops
+def _stream(sessions, url, auth, response, part_path, offset, hashers, chunk_size, resumable, validator, max_resumes, progress=None):
+    resumes = 0
+    downloaded = 0
+    with open(part_path, 'r+b' if offset else 'wb') as f:
+        f.seek(offset)
+        f.truncate()
+        while True:
+            try:
+                with response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        offset += len(chunk)
+                        downloaded += len(chunk)
+                        for h in hashers.values():
+                            h.update(chunk)
+                        if progress:
+                            progress(len(chunk))
+                return downloaded, resumes
+            except STREAM_ERRORS as e:
+                if not resumable or resumes >= max_resumes:
+                    raise
+                resumes += 1
+                print(f"Connection dropped at byte {offset} of {url} ({e}), resuming ({resumes}/{max_resumes})")
+                f.flush()
+                response = _range_get(sessions, url, auth, offset, validator=validator)
+                if response.status_code != 206:
+                    response.close()
+                    raise RangeNotSatisfied(f"Server answered {response.status_code} to a resume request for {url}")
+
+# Fetch the rest of a [start, end, next byte] segment with pwrite, resuming it from where it stopped.
+# segment[2] moves as bytes land; checkpoint() is called every SEGMENT_CHECKPOINT_BYTES.
+def _fetch_segment(sessions, url, auth, fd, segment, validator, chunk_size, max_resumes, progress=None, checkpoint=None):
+    start, end, position = segment
+    first = position
+    unsaved = 0
+    resumes = 0
+    while True:
+        response = _range_get(sessions, url, auth, segment[2], end, validator)
+        try:
+            with response:
+                if response.status_code != 206:
+                    raise RangeNotSatisfied(f"Server answered {response.status_code} to a range request for {url}")
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    os.pwrite(fd, chunk, segment[2])
+                    segment[2] += len(chunk)
+                    unsaved += len(chunk)
+                    if progress:
+                        progress(len(chunk))
+                    if checkpoint and unsaved >= SEGMENT_CHECKPOINT_BYTES:
+                        checkpoint()
+                        unsaved = 0
+            if segment[2] != end + 1:
+                raise requests.exceptions.ChunkedEncodingError(f"Segment {start}-{end} ended at byte {segment[2]}")
+            return end + 1 - first, resumes
+        except STREAM_ERRORS as e:
+            if resumes >= max_resumes:
+                raise
+            resumes += 1
+            print(f"Segment {start}-{end} of {url} dropped at byte {segment[2]} ({e}), resuming ({resumes}/{max_resumes})")
+
+# Download part_path as N parallel byte ranges. The segments and their progress are saved in the sidecar,
+# so a run interrupted part way (this one failing, or the job being killed) is picked up by the next run:
+# a sidecar for the same validator and size resumes every segment where it stopped; anything else starts
+# over with a preallocated file. Returns (bytes downloaded, resumes, segments, bytes already there).
+def _segmented(sessions, url, auth, part_path, meta_path, size, segments, validator, chunk_size, max_resumes, progress=None):
+    meta = _read_meta(meta_path)
+    state = meta.get('segments') if meta.get('validator') == validator and meta.get('size') == size else None
+    if state and os.path.exists(part_path) and os.path.getsize(part_path) == size:
+        fd = os.open(part_path, os.O_RDWR)
+        resumed = sum(position - start for start, _, position in state)
+        print(f"Resuming {len(state)} segment(s) of {url} ({resumed} of {size} bytes already downloaded)")
+    else:
+        segment_size = -(-size // segments)
+        state = [[start, min(start + segment_size, size) - 1, start] for start in range(0, size, segment_size)]
+        resumed = 0
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    lock = threading.Lock()
+
+    def checkpoint():
+        with lock:
+            _write_meta(meta_path, url, validator, size, state)
+
+    checkpoint()
+    try:
+        remaining = [segment for segment in state if segment[2] <= segment[1]]
+        with ThreadPoolExecutor(max_workers=max(1, len(remaining))) as executor:
+            futures = [executor.submit(_fetch_segment, sessions, url, auth, fd, segment, validator, chunk_size, max_resumes, progress, checkpoint)
+                       for segment in remaining]
+            results = [future.result() for future in futures]
+    finally:
+        os.close(fd)
+        checkpoint()
+    return sum(r[0] for r in results), sum(r[1] for r in results), len(state), resumed
+
+# Download url into part_path, given the already-open 200 response from the initial GET.
+# Resumes a .part left by an interrupted run when the server supports ranges and the
+# validator (ETag/Last-Modified) still matches, and splits large files into segments.
+# progress(n) is called (from several threads when segmented) for every n bytes received.
+def download_to_part(sessions, url, response, part_path, auth=None, hashers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     segments=1, segment_min_size=64 * 1024 * 1024, max_resumes=3, progress=None):
+    hashers = hashers if hashers is not None else {}
+    meta_path = part_path + '.json'
+    size = _content_length(response)
+    validator = _validator(response)
+    resumable = _supports_ranges(response) and validator is not None
+    result = {'size': size, 'bytes_downloaded': 0, 'resumed_from': 0, 'resumes': 0, 'segments': 1}
+
+    # Split big files across parallel range requests
+    if resumable and size and segments > 1 and size >= segment_min_size:
+        response.close()
+        try:
+            downloaded, resumes, used, resumed = _segmented(sessions, url, auth, part_path, meta_path, size, segments, validator,
+                                                            chunk_size, max_resumes, progress)
+            # Segments arrive out of order and digests need the bytes in order, so this is a second read of
+            # the file; single-stream downloads hash as they go
+            _hash_file(part_path, hashers, chunk_size)
+            result.update(bytes_downloaded=downloaded, resumes=resumes, segments=used, resumed_from=resumed)
+            os.remove(meta_path)
+            return result
+        except RangeNotSatisfied as e:
+            print(f"{e}; falling back to a single stream")
+            os.remove(meta_path)  # Without ranges nothing of the preallocated file can be reused
+            response = sessions.get(url, auth=auth, stream=True)
+
+    # A .part left by a single stream is a prefix as long as the file; one left by a segmented download
+    # is only contiguous up to where its first segment got to
+    offset = 0
+    meta = _read_meta(meta_path)
+    if resumable and os.path.exists(part_path) and meta.get('validator') == validator:
+        offset = meta['segments'][0][2] if meta.get('segments') else os.path.getsize(part_path)
+        if size is not None and offset > size:
+            offset = 0
+    if offset:
+        response.close()
+        if offset == size:
+            response = None
+        else:
+            response = _range_get(sessions, url, auth, offset, validator=validator)
+            if response.status_code != 206:
+                offset = 0  # Content changed or range ignored; the 200 body is the whole file
+        if offset:
+            print(f"Resuming {url} from byte {offset}")
+            _hash_file(part_path, hashers, chunk_size, limit=offset)
+            result['resumed_from'] = offset
+
+    _write_meta(meta_path, url, validator if resumable else None)
+    if response is not None:
+        downloaded, resumes = _stream(sessions, url, auth, response, part_path, offset, hashers, chunk_size,
+                                      resumable, validator, max_resumes, progress)
+        result.update(bytes_downloaded=downloaded, resumes=resumes)
+    if result['size'] is None:
+        result['size'] = os.path.getsize(part_path)
+    os.remove(meta_path)
+    return result
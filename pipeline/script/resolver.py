@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import unquote
+
+from telemetry import timed
+
+# Anchors in Maven/Nexus and Artifactory HTML listings; a regex is far cheaper than a DOM parse
+HREF_RE = re.compile(r'<a\s[^>]*?href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+TOKEN_RE = re.compile(r'(\d+)')
+
+def parse_html_listing(html):
+    return [unquote(href) for href in HREF_RE.findall(html)]
+
+# Artifactory storage API: {"children": [{"uri": "/name.war", "folder": false}, ...]}
+def parse_storage_listing(payload):
+    return [child['uri'].lstrip('/') for child in payload.get('children', []) if not child.get('folder')]
+
+# Natural/version sort key: digit runs compare as numbers, so build 10 ranks above build 9
+def version_key(href):
+    name = href.rstrip('/').split('/')[-1]
+    return [(0, int(token), '') if token.isdigit() else (1, 0, token) for token in TOKEN_RE.split(name) if token]
+
+def latest_matching(files, file_name_pattern, extension):
+    matches = [f for f in files if file_name_pattern in f and f.endswith(extension)]
+    matches.sort(key=version_key)
+    return matches
+
+# https://host/artifactory/<repo>/<path>/ -> https://host/artifactory/api/storage/<repo>/<path>/
+def storage_api_url(url):
+    marker = '/artifactory/'
+    if marker not in url or '/api/storage/' in url:
+        return None
+    head, tail = url.split(marker, 1)
+    return f"{head}{marker}api/storage/{tail}"
+
+# Directory listings are shared for the life of the process (concurrent lookups of the same
+# URL wait for one fetch) and, with a cache_dir, reused by later runs for `ttl` seconds.
+class ListingCache:
+    def __init__(self, ttl=0, cache_dir=None):
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+    def _load(self, key):
+        entry = self._entries.get(key)
+        if entry is not None or not self.cache_dir or self.ttl <= 0:
+            return entry
+        try:
+            with open(self._disk_path(key)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - entry['fetched_at'] < self.ttl:
+            self._entries[key] = entry
+            return entry
+        return None
+
+    def _save(self, key, entry):
+        self._entries[key] = entry
+        if self.cache_dir and self.ttl > 0:
+            tmp_path = self._disk_path(key) + f".{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._disk_path(key))
+
+    # Return (files, source) for key, calling fetch() only when there is no fresh entry
+    def get(self, key, fetch):
+        while True:
+            with self._lock:
+                entry = self._load(key)
+                if entry:
+                    return entry['files'], entry['source'] + ' (cached)'
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait()
+        try:
+            files, source = fetch()
+            with self._lock:
+                self._save(key, {'files': files, 'source': source, 'fetched_at': time.time()})
+            return files, source
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+# List a directory through the Artifactory storage API (when allowed) or its HTML page.
+# With a trace, the request and body download count as 'listing' and the parse as 'parse'.
+def list_directory(sessions, url, auth=None, use_api=False, trace=None):
+    api_url = storage_api_url(url) if use_api else None
+    if api_url:
+        with timed(trace, 'listing'):
+            response = sessions.get(api_url, auth=auth, trace=trace)
+            body = response.content
+        if response.status_code == 200:
+            try:
+                with timed(trace, 'parse'):
+                    return parse_storage_listing(json.loads(body)), 'storage-api'
+            except ValueError:
+                pass
+        print(f"Artifactory storage API unavailable for {url} ({response.status_code}), falling back to HTML listing")
+
+    with timed(trace, 'listing'):
+        response = sessions.get(url, auth=auth, trace=trace)
+        response.raise_for_status()  # Raise an error for bad HTTP responses
+        html = response.text
+    with timed(trace, 'parse'):
+        return parse_html_listing(html), 'html'
@@ -0,0 +1,203 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Phases in the order a package goes through them; each one is wall time, they do not overlap.
+# connect/ttfb belong to the first artifact request (connect is 0 when a pooled connection was reused),
+# transfer runs from its headers to the last byte, fsync/extract only appear when they happen.
+PHASES = ('listing', 'parse', 'connect', 'ttfb', 'transfer', 'fsync', 'extract')
+
+# Time a phase on an optional trace
+def timed(trace, phase):
+    return trace.phase(phase) if trace else contextlib.nullcontext()
+
+# Timings and counters for one package; safe to update from segment threads
+class PackageTrace:
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+        self.phases = {}
+        self.requests = 0
+        self.retries = 0
+        self.bytes_received = 0
+        self.total_bytes = None
+        self.status = None
+        self.elapsed = None
+        self._lock = threading.Lock()
+        self._transfer_start = None
+        self._last_progress = 0.0
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    # Called by SessionPool.get for every response; the first streamed one is the artifact request
+    def on_response(self, connect_seconds, wait_seconds, streamed):
+        with self._lock:
+            self.requests += 1
+            if streamed and 'ttfb' not in self.phases:
+                self.phases['connect'] = connect_seconds
+                self.phases['ttfb'] = max(0.0, wait_seconds - connect_seconds)
+
+    def on_retry(self, count=1):
+        with self._lock:
+            self.retries += count
+
+    def start_transfer(self, total_bytes):
+        with self._lock:
+            self.total_bytes = total_bytes
+            self._transfer_start = time.perf_counter()
+            self._last_progress = self._transfer_start
+
+    def end_transfer(self):
+        with self._lock:
+            if self._transfer_start is not None:
+                self.phases['transfer'] = self.phases.get('transfer', 0.0) + time.perf_counter() - self._transfer_start
+                self._transfer_start = None
+
+    # Progress callback for download_to_part: emits at most one event per progress_interval
+    def advance(self, received):
+        with self._lock:
+            self.bytes_received += received
+            now = time.perf_counter()
+            if self._transfer_start is None or now - self._last_progress < self.telemetry.progress_interval:
+                return
+            self._last_progress = now
+            rate = self.bytes_received / (now - self._transfer_start)
+            done, total = self.bytes_received, self.total_bytes
+        self.telemetry.progress(self, done, total, rate)
+
+    def throughput(self):
+        transfer = self.phases.get('transfer')
+        return self.bytes_received / transfer if transfer and self.bytes_received else None
+
+    def to_json(self):
+        throughput = self.throughput()
+        return {
+            'package': self.name,
+            'status': self.status,
+            'elapsed_s': round(self.elapsed, 3) if self.elapsed is not None else None,
+            'phases_s': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+            'bytes': self.bytes_received,
+            'mb_s': round(throughput / (1024 * 1024), 2) if throughput else None,
+            'requests': self.requests,
+            'retries': self.retries,
+        }
+
+# Collects a PackageTrace per package, writes events as JSON lines and renders the end-of-run
+# summary table and a Prometheus text-format file
+class Telemetry:
+    def __init__(self, events_path=None, progress_interval=5.0):
+        self.progress_interval = progress_interval
+        self.traces = {}
+        self._lock = threading.Lock()
+        self._events = open(events_path, 'w') if events_path else None
+        self._start = time.monotonic()
+
+    def event(self, name, **fields):
+        if not self._events:
+            return
+        line = json.dumps({'ts': round(time.time(), 3), 'event': name, **fields})
+        with self._lock:
+            self._events.write(line + '\n')
+            self._events.flush()
+
+    def package(self, name):
+        with self._lock:
+            trace = self.traces.get(name)
+            if trace is None:
+                trace = self.traces[name] = PackageTrace(self, name)
+                created = True
+            else:
+                created = False
+        if created:
+            self.event('package_start', package=name)
+        return trace
+
+    def progress(self, trace, done, total, rate):
+        percent = f" ({100 * done / total:.0f}%)" if total else ''
+        of_total = f"/{total / (1024 * 1024):.1f}" if total else ''
+        print(f"  {trace.name}: {done / (1024 * 1024):.1f}{of_total} MB{percent} at {rate / (1024 * 1024):.1f} MB/s")
+        self.event('progress', package=trace.name, bytes=done, total_bytes=total, mb_s=round(rate / (1024 * 1024), 2))
+
+    def finish(self, trace, status, elapsed, **fields):
+        trace.status = status
+        trace.elapsed = elapsed
+        self.event('package_end', **trace.to_json(), **fields)
+
+    def close(self, **fields):
+        self.event('run_end', wall_time_s=round(time.monotonic() - self._start, 3), **fields)
+        if self._events:
+            self._events.close()
+            self._events = None
+
+    def print_table(self):
+        traces = list(self.traces.values())
+        if not traces:
+            return
+        phases = [phase for phase in PHASES if any(phase in trace.phases for trace in traces)]
+        width = max(len('Package'), *(len(trace.name) for trace in traces))
+        header = f"{'Package':<{width}} {'Status':<6}" + ''.join(f" {phase:>9}" for phase in phases) + \
+                 f" {'Total':>9} {'MB':>9} {'MB/s':>8} {'Retries':>7}"
+        print("Download timings (seconds):")
+        print(header)
+        print('-' * len(header))
+        for trace in traces:
+            throughput = trace.throughput()
+            row = f"{trace.name:<{width}} {(trace.status or '-'):<6}"
+            row += ''.join(f" {trace.phases[phase]:9.3f}" if phase in trace.phases else f" {'-':>9}" for phase in phases)
+            row += f" {trace.elapsed or 0:9.2f} {trace.bytes_received / (1024 * 1024):9.1f}"
+            row += f" {throughput / (1024 * 1024):8.1f}" if throughput else f" {'-':>8}"
+            row += f" {trace.retries:7}"
+            print(row)
+
+    # Prometheus text exposition format, written atomically for the node_exporter textfile collector
+    def write_prometheus(self, path, wall_time=None):
+        def label(value):
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        metrics = [
+            ('download_package_phase_seconds', 'Wall time spent in each download phase', []),
+            ('download_package_bytes', 'Bytes received for the package', []),
+            ('download_package_throughput_bytes_per_second', 'Transfer throughput for the package', []),
+            ('download_package_retries', 'HTTP retries, stream resumes and checksum re-fetches', []),
+            ('download_package_duration_seconds', 'Total time to resolve and fetch the package', []),
+            ('download_package_success', '1 when the package was fetched, 0 when it failed', []),
+        ]
+        for trace in self.traces.values():
+            name = label(trace.name)
+            for phase, seconds in trace.phases.items():
+                metrics[0][2].append((f'package="{name}",phase="{phase}"', seconds))
+            metrics[1][2].append((f'package="{name}"', trace.bytes_received))
+            if trace.throughput():
+                metrics[2][2].append((f'package="{name}"', trace.throughput()))
+            metrics[3][2].append((f'package="{name}"', trace.retries))
+            if trace.elapsed is not None:
+                metrics[4][2].append((f'package="{name}"', trace.elapsed))
+            metrics[5][2].append((f'package="{name}"', 1 if trace.status == 'ok' else 0))
+
+        lines = []
+        for metric, help_text, samples in metrics:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.extend(f"{metric}{{{labels}}} {value if isinstance(value, int) else round(value, 6)}" for labels, value in samples)
+        if wall_time is not None:
+            lines += ["# HELP download_run_duration_seconds Wall time of the whole download run",
+                      "# TYPE download_run_duration_seconds gauge", f"download_run_duration_seconds {round(wall_time, 6)}"]
+        lines += ["# HELP download_run_timestamp_seconds When the download run finished",
+                  "# TYPE download_run_timestamp_seconds gauge", f"download_run_timestamp_seconds {time.time():.0f}"]
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
@@ -0,0 +1,161 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from range_download import DEFAULT_CHUNK_SIZE
+
+# Seekable, read-only view of a remote file over HTTP Range requests. Sequential reads share one
+# open-ended range stream; short forward seeks skip ahead on it, anything else starts a new range.
+class HttpRangeFile(io.RawIOBase):
+    def __init__(self, sessions, url, size, auth=None, skip_limit=1024 * 1024):
+        self.sessions = sessions
+        self.url = url
+        self.size = size
+        self.auth = auth
+        self.skip_limit = skip_limit
+        self.requests = 0
+        self.bytes_read = 0
+        self._pos = 0
+        self._stream = None
+        self._stream_pos = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        else:
+            self._pos = self.size + offset
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+        self._stream = None
+        self._stream_pos = None
+
+    def readinto(self, buffer):
+        if self._pos >= self.size:
+            return 0
+        if self._stream is not None and self._pos != self._stream_pos:
+            gap = self._pos - self._stream_pos
+            if 0 < gap <= self.skip_limit:
+                while gap:
+                    skipped = len(self._stream.raw.read(min(gap, 64 * 1024)))
+                    if not skipped:
+                        break
+                    gap -= skipped
+                    self._stream_pos += skipped
+                    self.bytes_read += skipped
+            if self._pos != self._stream_pos:
+                self._close_stream()
+        if self._stream is None:
+            self.requests += 1
+            response = self.sessions.get(self.url, auth=self.auth, stream=True, headers={'Range': f"bytes={self._pos}-"})
+            if response.status_code != 206:
+                response.close()
+                raise IOError(f"Range request for {self.url} returned {response.status_code}")
+            self._stream = response
+            self._stream_pos = self._pos
+
+        data = self._stream.raw.read(len(buffer))
+        if not data:
+            self._close_stream()
+            raise IOError(f"Unexpected end of range stream for {self.url} at byte {self._pos}")
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        self._stream_pos += len(data)
+        self.bytes_read += len(data)
+        return len(data)
+
+    def close(self):
+        self._close_stream()
+        super().close()
+
+# Probe whether url can be read by range and return its size (None when ranges are unsupported)
+def remote_size(sessions, url, auth=None):
+    with sessions.get(url, auth=auth, stream=True, headers={'Range': 'bytes=0-0'}) as response:
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code != 206 or '/' not in content_range:
+            return None
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+
+# Split members (in archive order) into contiguous groups of roughly equal compressed size
+def _partition(infos, groups):
+    order = sorted(range(len(infos)), key=lambda i: infos[i].header_offset)
+    target = max(1, sum(info.compress_size for info in infos) // max(1, groups))
+    partitions, current, current_size = [], [], 0
+    for index in order:
+        current.append(index)
+        current_size += infos[index].compress_size
+        if current_size >= target and len(partitions) < groups - 1:
+            partitions.append(current)
+            current, current_size = [], 0
+    if current:
+        partitions.append(current)
+    return partitions
+
+def _extract_members(open_zip, indexes, target_dir):
+    extracted = 0
+    with open_zip() as zf:
+        infos = zf.infolist()
+        for index in indexes:
+            info = infos[index]
+            try:
+                path = zf.extract(info, target_dir)  # Sanitises names and checks each member's CRC
+            except FileExistsError:
+                # Another worker created the same parent directory between exists() and makedirs()
+                path = zf.extract(info, target_dir)
+            mode = (info.external_attr >> 16) & 0o777
+            if mode and not info.is_dir():
+                os.chmod(path, mode)
+            extracted += info.file_size
+    return extracted
+
+# Extract every member of a zip into target_dir using `workers` threads, each with its own handle
+def extract_zip(open_zip, target_dir, workers=4):
+    os.makedirs(target_dir, exist_ok=True)
+    with open_zip() as zf:
+        infos = zf.infolist()
+    partitions = _partition(infos, workers)
+    with ThreadPoolExecutor(max_workers=max(1, len(partitions))) as executor:
+        sizes = list(executor.map(lambda indexes: _extract_members(open_zip, indexes, target_dir), partitions))
+    return {'members': len(infos), 'bytes_extracted': sum(sizes)}
+
+def extract_local_zip(path, target_dir, workers=4):
+    return extract_zip(lambda: zipfile.ZipFile(path), target_dir, workers)
+
+# Extract a remote zip straight from the server: the central directory is read by range from the
+# end of the archive and members are inflated into target_dir without writing the zip to disk.
+# Returns None when the server does not support ranges.
+def extract_remote_zip(sessions, url, target_dir, auth=None, workers=4, chunk_size=DEFAULT_CHUNK_SIZE):
+    size = remote_size(sessions, url, auth)
+    if size is None:
+        return None
+    handles = []
+
+    def open_zip():
+        raw = HttpRangeFile(sessions, url, size, auth=auth)
+        handles.append(raw)
+        return zipfile.ZipFile(io.BufferedReader(raw, buffer_size=chunk_size))
+
+    try:
+        result = extract_zip(open_zip, target_dir, workers)
+    finally:
+        for raw in handles:
+            raw.close()
+    result['bytes_downloaded'] = sum(raw.bytes_read for raw in handles)
+    result['range_requests'] = sum(raw.requests for raw in handles)
+    return result
@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Run a dependency graph of provisioning steps. Each node is a dict:
+#   name:        key other nodes list in their deps
+#   deps:        names that must finish before the node starts
+#   start:       start(results) -> an LROPoller (anything with done()/result()) or an already final result;
+#                results holds the finished results of every node by name
+#   description: used in progress/failure messages ("Key Vault 'kv-1a2b3'")
+#   done:        optional done(result) -> message printed when the node finishes
+#   current:     optional current(results) -> the resource as it exists now, or None when it is missing
+#   drift:       optional drift(existing) -> list of differences from the desired spec; with current(),
+#                start is only called for missing or drifted resources, as start(results, existing)
+#   background:  optional; start() is a slow synchronous call (a lookup) and runs on a worker thread,
+#                polled like an LRO, instead of holding up the nodes started after it
+# Nodes start as soon as their dependencies are done, so independent long-running operations are in
+# flight together and polled in one loop. Returns (results, timeline); raises GraphError on failure.
+# The timeline holds a span per node, in seconds from the start of the run: start, submitted (start()
+# returned, i.e. the operation was accepted), end, plus http_requests/polls/retries and the individual
+# requests when the clients record them (azure_clients.OperationTracker).
+class GraphError(Exception):
+    def __init__(self, message, timeline):
+        super().__init__(message)
+        self.timeline = timeline
+
+_active = threading.local()
+
+# (span, origin) of the node whose start()/current() is running on this thread, or None
+def active_span():
+    return getattr(_active, 'span', None)
+
+def run_graph(nodes, poll_interval=1.0):
+    by_name = {node['name']: node for node in nodes}
+    for node in nodes:
+        missing = [dep for dep in node['deps'] if dep not in by_name]
+        if missing:
+            raise ValueError(f"Node {node['name']} depends on unknown node(s) {', '.join(missing)}")
+
+    origin = time.monotonic()
+    results = {}
+    timeline = {}
+    running = {}
+    pending = list(nodes)
+
+    def finish(node, result):
+        results[node['name']] = result
+        timeline[node['name']]['end'] = time.monotonic() - origin
+        elapsed = timeline[node['name']]['end'] - timeline[node['name']]['start']
+        action = 'updated' if timeline[node['name']].get('drifted') else 'created'
+        print(node['done'](result) if node.get('done') else f"{node['description']} {action} ({elapsed:.0f}s).")
+
+    def fail(node, error):
+        timeline[node['name']]['end'] = time.monotonic() - origin
+        timeline[node['name']]['error'] = str(error)
+        in_flight = ', '.join(name for name in running if name != node['name'])
+        message = f"Failed to create {node['description']}: {error}"
+        if in_flight:
+            message += f" (still running in Azure: {in_flight})"
+        raise GraphError(message, timeline) from error
+
+    # Requests made by a background node are attributed to its span, as for a node started on this thread
+    def run_in_background(node, span):
+        _active.span = (span, origin)
+        try:
+            return node['start'](results)
+        finally:
+            _active.span = None
+
+    background = ThreadPoolExecutor(max_workers=4, thread_name_prefix='graph')
+    try:
+        while pending or running:
+            # Start everything whose dependencies are satisfied
+            for node in [n for n in pending if all(dep in results for dep in n['deps'])]:
+                pending.remove(node)
+                span = timeline[node['name']] = {'start': time.monotonic() - origin, 'deps': list(node['deps']),
+                                                 'http_requests': 0, 'polls': 0, 'retries': 0, 'requests': []}
+                _active.span = (span, origin)
+                try:
+                    if node.get('background'):
+                        value = background.submit(run_in_background, node, span)
+                    elif 'current' in node:
+                        existing = node['current'](results)
+                        differences = node['drift'](existing) if existing is not None and 'drift' in node else []
+                        if existing is not None and not differences:
+                            results[node['name']] = existing
+                            timeline[node['name']].update(end=time.monotonic() - origin, unchanged=True)
+                            print(f"{node['description']} is up to date.")
+                            continue
+                        if existing is None:
+                            print(f"{node['description']} not found.")
+                        else:
+                            print(f"{node['description']} has drifted: {'; '.join(differences)}")
+                            timeline[node['name']]['drifted'] = differences
+                        value = node['start'](results, existing)
+                    else:
+                        value = node['start'](results)
+                except Exception as e:
+                    fail(node, e)
+                finally:
+                    _active.span = None
+                span['submitted'] = time.monotonic() - origin
+                if hasattr(value, 'done') and hasattr(value, 'result'):
+                    if not node.get('background'):
+                        print(f"Creating {node['description']}...")
+                    running[node['name']] = value
+                else:
+                    finish(node, value)
+
+            if pending and not running and not any(all(dep in results for dep in n['deps']) for n in pending):
+                raise ValueError(f"Dependency cycle between {', '.join(n['name'] for n in pending)}")
+
+            # Poll every in-flight operation, collecting the ones that completed
+            completed = [name for name, poller in running.items() if poller.done()]
+            for name in completed:
+                poller = running.pop(name)
+                try:
+                    result = poller.result()
+                except Exception as e:
+                    running[name] = poller
+                    fail(by_name[name], e)
+                finish(by_name[name], result)
+            if running and not completed:
+                time.sleep(poll_interval)
+    finally:
+        background.shutdown(wait=False)
+
+    return results, timeline
+
+# Longest chain of dependencies that gated the end of the run: walk back from the node that finished
+# last through whichever dependency finished last
+def critical_path(timeline):
+    finished = {name: span for name, span in timeline.items() if 'end' in span}
+    if not finished:
+        return []
+    name = max(finished, key=lambda n: finished[n]['end'])
+    path = [name]
+    while finished[name]['deps']:
+        name = max(finished[name]['deps'], key=lambda n: finished[n]['end'])
+        path.append(name)
+    return list(reversed(path))
+
+def print_timeline(timeline):
+    if not timeline:
+        return
+    width = max(len(name) for name in timeline)
+    print("Provisioning timeline:")
+    for name, span in sorted(timeline.items(), key=lambda item: item[1]['start']):
+        end = span.get('end')
+        if end is None:
+            print(f"  {name:<{width}} {span['start']:7.1f}s -> (still running)")
+            continue
+        status = ' FAILED' if 'error' in span else ' unchanged' if span.get('unchanged') else ' updated' if span.get('drifted') else ''
+        requests = f"  {span['http_requests']} requests, {span['polls']} polls, {span['retries']} retries" if span.get('http_requests') else ''
+        print(f"  {name:<{width}} {span['start']:7.1f}s -> {end:7.1f}s {end - span['start']:7.1f}s{status}{requests}")
+    path = critical_path(timeline)
+    total = max(span.get('end', 0) for span in timeline.values())
+    if path:
+        path_time = timeline[path[-1]]['end'] - timeline[path[0]]['start']
+        print(f"Critical path: {' -> '.join(path)} ({path_time:.1f}s of {total:.1f}s)")
+
+def span_status(span):
+    if 'error' in span:
+        return 'failed'
+    if 'end' not in span:
+        return 'running'
+    return 'unchanged' if span.get('unchanged') else 'updated' if span.get('drifted') else 'done'
+
+# One span as plain JSON: lro_s is the time from the operation being accepted to the graph seeing it finish
+def span_json(name, span):
+    entry = {'name': name, 'status': span_status(span), 'deps': span['deps'], 'start_s': round(span['start'], 3)}
+    if 'submitted' in span:
+        entry['submitted_s'] = round(span['submitted'], 3)
+    if 'end' in span:
+        entry['end_s'] = round(span['end'], 3)
+        entry['duration_s'] = round(span['end'] - span['start'], 3)
+        if 'submitted' in span:
+            entry['lro_s'] = round(span['end'] - span['submitted'], 3)
+    entry.update(http_requests=span.get('http_requests', 0), polls=span.get('polls', 0), retries=span.get('retries', 0))
+    if 'error' in span:
+        entry['error'] = span['error']
+    if span.get('drifted'):
+        entry['drifted'] = span['drifted']
+    entry['requests'] = span.get('requests', [])
+    return entry
+
+def timeline_json(timeline):
+    spans = [span_json(name, span) for name, span in sorted(timeline.items(), key=lambda item: item[1]['start'])]
+    return {'total_s': round(max((span.get('end', 0) for span in timeline.values()), default=0), 3),
+            'critical_path': critical_path(timeline), 'spans': spans}
+
+# Chrome trace event format (chrome://tracing, https://ui.perfetto.dev): one row per node with its
+# submit and LRO phases and every HTTP request nested underneath
+def chrome_trace(timeline):
+    events = []
+    total = max((span.get('end', span.get('submitted', span['start'])) for span in timeline.values()), default=0)
+    for row, (name, span) in enumerate(sorted(timeline.items(), key=lambda item: item[1]['start']), start=1):
+        end = span.get('end', total)
+        submitted = min(span.get('submitted', end), end)
+        events.append({'ph': 'M', 'pid': 1, 'tid': row, 'name': 'thread_name', 'args': {'name': name}})
+        events.append({'ph': 'X', 'pid': 1, 'tid': row, 'cat': 'node', 'name': name, 'ts': span['start'] * 1e6,
+                       'dur': (end - span['start']) * 1e6,
+                       'args': {key: value for key, value in span_json(name, span).items() if key != 'requests'}})
+        events.append({'ph': 'X', 'pid': 1, 'tid': row, 'cat': 'phase', 'name': 'submit', 'ts': span['start'] * 1e6,
+                       'dur': (submitted - span['start']) * 1e6})
+        if end > submitted:
+            events.append({'ph': 'X', 'pid': 1, 'tid': row, 'cat': 'phase', 'name': 'lro', 'ts': submitted * 1e6, 'dur': (end - submitted) * 1e6})
+        for request in span.get('requests', []):
+            events.append({'ph': 'X', 'pid': 1, 'tid': row, 'cat': 'http', 'name': f"{request['method']} {request['status']}",
+                           'ts': request['start_s'] * 1e6, 'dur': request['seconds'] * 1e6, 'args': request})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+def _write_json(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=1)
+    os.replace(tmp_path, path)
+
+# Write the spans (JSON) and/or the Chrome trace; either path may be None
+def write_timeline(timeline, spans_file=None, trace_file=None):
+    if spans_file:
+        _write_json(spans_file, timeline_json(timeline))
+        print(f"Provisioning spans written to {spans_file}")
+    if trace_file:
+        _write_json(trace_file, chrome_trace(timeline))
+        print(f"Provisioning trace written to {trace_file}")
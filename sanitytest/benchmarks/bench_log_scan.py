@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SANITY_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, SANITY_DIR)
+
+from log_scan import LogClassifier, LogScanner
+
+# WildFly-like lines: mostly INFO noise (some mentioning error handlers), a few ERROR lines that
+# differ only in timestamps, ids and numbers
+NOISE = [
+    "{ts} INFO  [org.jboss.as.server] (ServerService Thread Pool -- {n}) WFLYSRV0010: Deployed \"app-{n}.war\"",
+    "{ts} INFO  [io.undertow] (MSC service thread 1-{n}) errorHandler configured for context /api-{n}",
+    "{ts} DEBUG [com.temenos.tafj] (default task-{n}) request {uuid} served in {n} ms",
+]
+ERRORS = [
+    "{ts} ERROR [com.temenos.tafj] (default task-{n}) Transaction {uuid} failed: lock timeout after {n} ms",
+    "{ts} ERROR [org.jboss.as.controller] (Controller Boot Thread) WFLYCTL0013: Operation failed at 0x{hex}",
+    "{ts} FATAL [com.temenos.t24] (default task-{n}) Connection to 10.0.{n}.4:1521 refused",
+]
+
+def make_lines(count, error_rate, seed):
+    rng = random.Random(seed)
+    for index in range(count):
+        template = rng.choice(ERRORS) if rng.random() < error_rate else rng.choice(NOISE)
+        yield template.format(ts=f"2024-05-{1 + index % 28:02d} 12:{index % 60:02d}:{index % 60:02d},{index % 1000:03d}",
+                              n=rng.randrange(1000), uuid=f"{rng.getrandbits(128):032x}",
+                              hex=f"{rng.getrandbits(32):08x}")
+
+# The scan before the classifier: the exec output written to a file, read back, every line
+# lowercased and every match kept
+def legacy_scan(blocks):
+    with tempfile.NamedTemporaryFile("w+") as log_file:
+        log_file.write("".join(blocks))
+        log_file.seek(0)
+        return [line.strip() for line in log_file if 'error' in line.lower()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy 'error' substring scan with the compiled log classifier")
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--error_rate', type=float, default=0.01)
+    parser.add_argument('--classifier', help="App name in test_case_paths.json whose log_classifier to use (default: built-in)")
+    args = parser.parse_args()
+
+    config = None
+    if args.classifier:
+        with open(os.path.join(SANITY_DIR, "test_case_paths.json")) as f:
+            config = json.load(f)[args.classifier].get("log_classifier")
+    lines = list(make_lines(args.lines, args.error_rate, seed=1))
+    # The classifier gets the log the way the exec stream delivers it: blocks of whole lines
+    blocks = ["".join(line + "\n" for line in lines[index:index + 500]) for index in range(0, len(lines), 500)]
+
+    start = time.perf_counter()
+    legacy = legacy_scan(blocks)
+    legacy_seconds = time.perf_counter() - start
+
+    scanner = LogScanner(LogClassifier(config))
+    start = time.perf_counter()
+    for block in blocks:
+        scanner.feed(block)
+    classifier_seconds = time.perf_counter() - start
+    result = scanner.result()
+
+    legacy_size = len(json.dumps(legacy))
+    result_size = len(json.dumps(result))
+    print(f"{'Scan':<11} {'Seconds':>8} {'Matches':>8} {'Report bytes':>13}")
+    print(f"{'legacy':<11} {legacy_seconds:8.2f} {len(legacy):8} {legacy_size:13}")
+    print(f"{'classifier':<11} {classifier_seconds:8.2f} {result['matched_lines']:8} {result_size:13}")
+    print(f"{len(result['signatures'])} signature(s); report {legacy_size / max(1, result_size):.0f}x smaller, "
+          f"scan {legacy_seconds / classifier_seconds:.1f}x faster")
+    for entry in result['signatures']:
+        print(f"  {entry['count']:7}  {entry['signature']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import http.server
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from http_probe import ProbeEngine
+
+# Local app stand-in: answers after --latency seconds, with 503 for a fraction of requests and never
+# for paths under /hang (to exercise the timeout)
+class AppHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    unavailable_rate = 0.0
+    rng = random.Random(1)
+
+    def _answer(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        if self.path.startswith("/hang"):
+            time.sleep(60)
+        time.sleep(self.latency)
+        status = 503 if self.rng.random() < self.unavailable_rate else 200
+        body = b'{"status": "ok"}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _answer
+    do_POST = _answer
+
+    def log_message(self, format, *args):
+        pass
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Probe a local HTTP server with the sanity test's probe engine")
+    parser.add_argument('--pods', type=int, default=200, help="Pod URLs probed at the same time")
+    parser.add_argument('--latency', type=float, default=0.005, help="Seconds the server takes per request")
+    parser.add_argument('--unavailable_rate', type=float, default=0.05, help="Fraction of requests answered with 503")
+    parser.add_argument('--timeout', type=float, default=1.0, help="Seconds per probe attempt")
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--hanging', type=int, default=2, help="Probes to a path that never answers")
+    parser.add_argument('--json', help="Write every probe result as JSON")
+    args = parser.parse_args()
+
+    AppHandler.latency = args.latency
+    AppHandler.unavailable_rate = args.unavailable_rate
+    http.server.ThreadingHTTPServer.request_queue_size = 256  # Every probe may connect at once
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), AppHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    engine = ProbeEngine(timeout=args.timeout, connect_timeout=args.timeout, retries=args.retries)
+    urls = [("GET", f"{base_url}/api/v1.0.0/apis?pod={index}", None) for index in range(args.pods)]
+    urls += [("POST", f"{base_url}/login?pod={index}", {"username": "admin", "password": "admin"}) for index in range(args.pods)]
+    urls += [("GET", f"{base_url}/hang/{index}", None) for index in range(args.hanging)]
+    start = time.perf_counter()
+    futures = [engine.probe(method, url, data) for method, url, data in urls]
+    results = [future.result() for future in futures]
+    wall = time.perf_counter() - start
+    engine.close()
+    server.shutdown()
+
+    answered = [result for result in results if result["status"] != "000"]
+    totals = [result["timings_ms"]["total"] for result in answered]
+    print(f"{len(results)} probes in {wall:.2f}s: "
+          f"{sum(result['status'] == '200' for result in results)} x 200, "
+          f"{sum(result['status'] == '503' for result in results)} x 503, "
+          f"{sum(result['status'] == '000' for result in results)} failed, "
+          f"{sum(result['attempts'] - 1 for result in results)} retries")
+    for phase in ("dns", "connect", "ttfb", "total"):
+        values = [result["timings_ms"][phase] for result in answered]
+        print(f"  {phase:<8} p50 {percentile(values, 0.5):8.2f} ms  p95 {percentile(values, 0.95):8.2f} ms  max {max(values or [0]):8.2f} ms")
+    print(f"  mean total {statistics.mean(totals or [0]):.2f} ms per answered probe")
+    for result in results:
+        if "error" in result:
+            print(f"  failed after {result['attempts']} attempt(s): {result['error']}")
+            break
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"method": method, "url": url, **result} for (method, url, _), result in zip(urls, results)], f, indent=2)
+
+if __name__ == "__main__":
+    main()
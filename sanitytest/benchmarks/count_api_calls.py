@@ -0,0 +1,161 @@
+import argparse
+import collections
+import contextlib
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SANITY_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, SANITY_DIR)
+
+from fake_core_v1 import FakeCoreV1Api, FakeProbeEngine, install
+
+# API server budget per namespace, whatever the number of pods: one pod list and watch, plus one
+# event list and watch when some pod did not become ready
+POD_LISTS_PER_NAMESPACE = 1
+CALLS_PER_NAMESPACE = 4
+
+sanity = None
+
+def load_json(name):
+    with open(os.path.join(SANITY_DIR, name)) as f:
+        return json.load(f)
+
+# A pod the curl checks run in: matched by the label selector and ready (when readiness is checked)
+def curl_target(pod, app_paths, tests):
+    selector = app_paths.get("label_selector")
+    ready = "check_pod_readiness" not in tests or sanity.is_pod_ready(pod)
+    return bool(selector) and sanity.matches_label_selector(pod.metadata.labels, selector) and ready
+
+# Checks each (namespace, pod, check kind) should get: exactly one per check that applies to the pod;
+# with HTTP probing the curl checks are not exec'd at all, and they are skipped in pods that did not
+# become ready
+def expected_execs(api, namespaces, test_cases, test_case_paths, probe_mode):
+    expected = collections.Counter()
+    for namespace in namespaces:
+        app_name = sanity.get_app_name_from_namespace(namespace)
+        app_paths = sanity.get_app_paths(app_name, test_case_paths)
+        tests = test_cases.get(app_name, test_cases.get("default", []))
+        for pod in api.pods.get(namespace, []):
+            targeted = curl_target(pod, app_paths, tests)
+            if "check_deployment_files" in tests:
+                expected[(namespace, pod.metadata.name, "deployment_files")] = 1
+            if "perform_api_curl_on_pods" in tests and "api_curl_url" in app_paths and targeted and probe_mode == "exec":
+                expected[(namespace, pod.metadata.name, "api_curl")] = 1
+            if "perform_web_curl_on_pods" in tests and "web_curl_url" in app_paths and targeted and probe_mode == "exec":
+                expected[(namespace, pod.metadata.name, "web_curl")] = 1
+            if "check_log_for_errors" in tests:
+                expected[(namespace, pod.metadata.name, "log")] = 1
+    return expected
+
+# Probes each (method, URL) should get with HTTP probing: one per service URL and namespace, one per
+# pod-local URL and target pod
+def expected_probes(api, namespaces, test_cases, test_case_paths):
+    expected = collections.Counter()
+    for namespace in namespaces:
+        app_name = sanity.get_app_name_from_namespace(namespace)
+        app_paths = sanity.get_app_paths(app_name, test_case_paths)
+        tests = test_cases.get(app_name, test_cases.get("default", []))
+        for pod in api.pods.get(namespace, []):
+            if not curl_target(pod, app_paths, tests):
+                continue
+            for check_name, url_key in (("perform_api_curl_on_pods", "api_curl_url"), ("perform_web_curl_on_pods", "web_curl_url")):
+                if check_name in tests and url_key in app_paths:
+                    _, method, url, _ = sanity.probe_request(namespace, pod, app_paths, check_name)
+                    expected[(method, url)] = 1
+    return expected
+
+# The readiness timeout is read when the module is imported
+def load_sanity(readiness_timeout):
+    global sanity
+    os.environ["SANITY_READINESS_TIMEOUT"] = str(readiness_timeout)
+    sanity = importlib.import_module("sanitytest_containerversion")
+    return sanity
+
+# One sanity test run against a fake API with `pods` labelled application pods (the first not_ready of them
+# never ready) and other_pods outside the selector in each namespace; returns the fakes and the wall time
+def run(namespace_count, pods, other_pods=0, exec_delay=0.0, probe_mode="http", not_ready=0):
+    test_cases = load_json("test_cases.json")
+    test_case_paths = load_json("test_case_paths.json")
+    labels = dict(item.split("=", 1) for item in test_case_paths["transact"]["label_selector"].split(","))
+    namespaces = [f"transact-{index}" for index in range(namespace_count)]
+    api = FakeCoreV1Api(exec_delay=exec_delay)
+    for namespace in namespaces:
+        for index in range(pods):
+            api.add_pod(namespace, f"transact-app-{index}", labels=labels, ready=index >= not_ready)
+        for index in range(other_pods):
+            api.add_pod(namespace, f"sidecar-{index}", labels={"app": "other"})
+    engine = FakeProbeEngine() if probe_mode == "http" else None
+    install(sanity, api, namespaces, test_cases, test_case_paths, engine)
+
+    start = time.monotonic()
+    with contextlib.suppress(Exception):  # main() raises when the (fake) log has errors
+        sanity.main()
+    wall = time.monotonic() - start
+    api.watches_closed.set()
+    return api, engine, namespaces, wall
+
+# Every way the run went over its API budget: the problems, the checks it should have exec'd and the
+# probes it should have made
+def find_problems(api, engine, namespaces, probe_mode):
+    test_cases = load_json("test_cases.json")
+    test_case_paths = load_json("test_case_paths.json")
+    problems = []
+    for namespace in namespaces:
+        lists = api.calls_by_namespace[(namespace, "list_namespaced_pod")]
+        if lists != POD_LISTS_PER_NAMESPACE:
+            problems.append(f"{namespace}: {lists} pod lists, expected {POD_LISTS_PER_NAMESPACE}")
+        calls = sum(count for (call_namespace, method), count in api.calls_by_namespace.items()
+                    if call_namespace == namespace and method != "connect_get_namespaced_pod_exec")
+        if calls > CALLS_PER_NAMESPACE:
+            problems.append(f"{namespace}: {calls} list/watch calls, expected at most {CALLS_PER_NAMESPACE}")
+    expected = expected_execs(api, namespaces, test_cases, test_case_paths, probe_mode)
+    for key in sorted(set(expected) | set(api.execs)):
+        if api.execs[key] != expected[key]:
+            problems.append(f"{'/'.join(key)}: {api.execs[key]} run(s), expected {expected[key]}")
+    # All checks of a pod share one exec session
+    expected_sessions = {key[:2] for key in expected}
+    for key in sorted(expected_sessions | set(api.exec_sessions)):
+        sessions = api.exec_sessions[key]
+        if sessions != (1 if key in expected_sessions else 0):
+            problems.append(f"{'/'.join(key)}: {sessions} exec session(s), expected {1 if key in expected_sessions else 0}")
+    probes = expected_probes(api, namespaces, test_cases, test_case_paths) if engine else collections.Counter()
+    for key in sorted(set(probes) | set(engine.probes if engine else {})):
+        if engine.probes[key] != probes[key]:
+            problems.append(f"{' '.join(key)}: probed {engine.probes[key]} time(s), expected {probes[key]}")
+    return problems, expected, probes
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the sanity test against a fake CoreV1Api and check how many API calls it makes")
+    parser.add_argument('--namespaces', type=int, default=5, help="transact-N namespaces to check")
+    parser.add_argument('--pods', type=int, default=4, help="Labelled application pods per namespace")
+    parser.add_argument('--other_pods', type=int, default=1, help="Pods per namespace outside the app's label selector")
+    parser.add_argument('--exec_delay', type=float, default=0.0, help="Seconds every exec takes")
+    parser.add_argument('--probe_mode', choices=['http', 'exec'], default='http', help="How the curl checks run")
+    parser.add_argument('--not_ready', type=int, default=0, help="Application pods per namespace that never become ready")
+    parser.add_argument('--readiness_timeout', type=int, default=1, help="Seconds the sanity test waits for readiness")
+    args = parser.parse_args()
+
+    load_sanity(args.readiness_timeout)
+    logging.getLogger().setLevel(logging.WARNING)
+    api, engine, namespaces, wall = run(args.namespaces, args.pods, args.other_pods, args.exec_delay, args.probe_mode, args.not_ready)
+
+    print(f"{args.namespaces} namespace(s) x {args.pods + args.other_pods} pod(s) in {wall:.2f}s")
+    for method, count in sorted(api.calls.items()):
+        print(f"  {method:<34} {count:6}")
+
+    problems, expected, probes = find_problems(api, engine, namespaces, args.probe_mode)
+    if problems:
+        print(f"{len(problems)} problem(s):")
+        for problem in problems[:20]:
+            print(f"  {problem}")
+        sys.exit(1)
+    print(f"OK: {len({key[:2] for key in expected})} exec sessions (one per pod) running {sum(expected.values())} checks "
+          f"(one per check and target pod), {sum(probes.values())} HTTP probes, at most {CALLS_PER_NAMESPACE} list/watch calls per namespace")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import collections
+import concurrent.futures
+import re
+import threading
+import time
+import types
+
+# In-memory stand-in for kubernetes.client.CoreV1Api, enough for sanitytest_containerversion.py:
+# pod/event lists (and pod watches), plus batched exec sessions through a pass-through stream.stream.
+# Every API call is counted by method and namespace, exec sessions by pod, and the checks they carry
+# by the check they belong to.
+class FakeCoreV1Api:
+    def __init__(self, exec_delay=0.0, log_lines=None):
+        self.exec_delay = exec_delay
+        self.log_lines = log_lines or ["INFO WFLYSRV0025: started", "ERROR something failed"]
+        self.pods = {}  # namespace -> [pod]
+        self.calls = collections.Counter()
+        self.calls_by_namespace = collections.Counter()
+        self.execs = collections.Counter()  # (namespace, pod, check kind) -> count
+        self.exec_sessions = collections.Counter()  # (namespace, pod) -> count
+        self.events = {}  # namespace -> [event]
+        self.lock = threading.Lock()
+        self.watches_closed = threading.Event()
+
+    def add_pod(self, namespace, name, labels=None, ready=True):
+        pod = types.SimpleNamespace(
+            metadata=types.SimpleNamespace(name=name, namespace=namespace, labels=labels or {}, resource_version="1"),
+            status=types.SimpleNamespace(pod_ip="10.0.0.1", conditions=[types.SimpleNamespace(type="Ready", status="True" if ready else "False")]))
+        self.pods.setdefault(namespace, []).append(pod)
+        if not ready:
+            self.events.setdefault(namespace, []).append(types.SimpleNamespace(
+                metadata=types.SimpleNamespace(name=f"{name}.1", namespace=namespace),
+                involved_object=types.SimpleNamespace(name=name), last_timestamp="2024-01-01T00:00:00Z", type="Warning",
+                reason="Unhealthy", message="Readiness probe failed", source=types.SimpleNamespace(component="kubelet")))
+        return pod
+
+    def _count(self, method, namespace):
+        with self.lock:
+            self.calls[method] += 1
+            self.calls_by_namespace[(namespace, method)] += 1
+
+    def list_namespaced_pod(self, namespace, label_selector=None, watch=False, timeout_seconds=None, **kwargs):
+        """:rtype: V1PodList"""
+        self._count("watch_namespaced_pod" if watch else "list_namespaced_pod", namespace)
+        if watch:
+            return FakeWatchResponse(self.watches_closed, timeout_seconds)
+        return types.SimpleNamespace(items=list(self.pods.get(namespace, [])), metadata=types.SimpleNamespace(resource_version="1"))
+
+    def list_namespaced_event(self, namespace, watch=False, timeout_seconds=None, **kwargs):
+        """:rtype: CoreV1EventList"""
+        self._count("watch_namespaced_event" if watch else "list_namespaced_event", namespace)
+        if watch:
+            return FakeWatchResponse(self.watches_closed, timeout_seconds)
+        return types.SimpleNamespace(items=list(self.events.get(namespace, [])), metadata=types.SimpleNamespace(resource_version="1"))
+
+    # What each check's shell command looks like
+    @staticmethod
+    def check_kind(command):
+        if "*.failed" in command:
+            return "deployment_files"
+        if "curl" in command and "POST" in command:
+            return "web_curl"
+        if "curl" in command:
+            return "api_curl"
+        if "SANITY_LOG_META" in command:
+            return "log"
+        return "other"
+
+    def section_output(self, kind):
+        if kind == "deployment_files":
+            return "No deployment failed\n"
+        if kind in ("api_curl", "web_curl"):
+            return "200"
+        log = "\n".join(self.log_lines) + "\n"
+        return f"SANITY_LOG_META size={len(log)} start=0 end={len(log)}\n{log}"
+
+    # Answers each section of the batched script with canned output, framed the way the shell would
+    def connect_get_namespaced_pod_exec(self, name, namespace, command=None, **kwargs):
+        self._count("connect_get_namespaced_pod_exec", namespace)
+        output = []
+        for marker, section, body in SECTION_PATTERN.findall(command[-1]):
+            kind = self.check_kind(body)
+            with self.lock:
+                self.execs[(namespace, name, kind)] += 1
+            output.append(f"{marker} BEGIN {section}\n{self.section_output(kind)}{marker} END {section} 0\n")
+        with self.lock:
+            self.exec_sessions[(namespace, name)] += 1
+        if self.exec_delay:
+            time.sleep(self.exec_delay)
+        return FakeExecSession("".join(output))
+
+SECTION_PATTERN = re.compile(r"echo '(\S+) BEGIN (\S+)'\n\( (.*?)\n\) 2>&1", re.DOTALL)
+
+# Exec session with the same reading interface as the kubernetes WSClient; stdout arrives in small
+# frames so lines and markers get split across reads
+class FakeExecSession:
+    def __init__(self, output, frame_size=7):
+        self.frames = [output[index:index + frame_size] for index in range(0, len(output), frame_size)]
+        self.stdout = ""
+
+    def is_open(self):
+        return bool(self.frames)
+
+    def update(self, timeout=0):
+        if self.frames:
+            self.stdout += self.frames.pop(0)
+
+    def peek_stdout(self, timeout=0):
+        return self.stdout
+
+    def read_stdout(self, timeout=0):
+        data, self.stdout = self.stdout, ""
+        return data
+
+    def peek_stderr(self, timeout=0):
+        return ""
+
+    def read_stderr(self, timeout=0):
+        return ""
+
+    def close(self):
+        self.frames = []
+
+# Watch response without events (nothing changes in the fake) that stays open like a real watch, until
+# its timeout or until the fake's watches are closed
+class FakeWatchResponse:
+    def __init__(self, closed, timeout_seconds=None):
+        self.closed = closed
+        self.timeout_seconds = timeout_seconds
+
+    def stream(self, amt=None, decode_content=False):
+        self.closed.wait(self.timeout_seconds)
+        return iter(())
+
+    def close(self):
+        pass
+
+    def release_conn(self):
+        pass
+
+# Stand-in for http_probe.ProbeEngine that answers every probe with 200 and counts them by (method, URL)
+class FakeProbeEngine:
+    def __init__(self):
+        self.probes = collections.Counter()
+        self.lock = threading.Lock()
+
+    def probe(self, method, url, data=None):
+        with self.lock:
+            self.probes[(method, url)] += 1
+        future = concurrent.futures.Future()
+        future.set_result({"status": "200", "attempts": 1, "timings_ms": {"dns": 0.0, "connect": 0.0, "ttfb": 1.0, "total": 1.0}})
+        return future
+
+    def close(self):
+        pass
+
+# Point the sanity test module at the fake: every thread gets the fake API and exec calls it directly
+def install(module, api, namespaces, test_cases, test_case_paths, engine=None):
+    import pod_exec
+    module.core_v1_api = lambda: api
+    module.probe_mode = lambda: "http" if engine else "exec"
+    module.ProbeEngine = lambda: engine
+    pod_exec.stream = types.SimpleNamespace(stream=lambda method, *args, **kwargs: method(*args, **kwargs))
+    module.load_k8s_config = lambda: None
+    module.load_config_files = lambda: (namespaces, test_cases, test_case_paths)
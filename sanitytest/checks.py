@@ -0,0 +1,269 @@
+import time
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from kubernetes.client.rest import ApiException
+from pod_exec import run_sections
+
+# Extra seconds a batched exec gets on top of its checks' timeouts before the scheduler gives up on it
+EXEC_GRACE = 5
+
+# A check the sanity test can run. scope is "namespace" (runs once) or "pod" (once per pod it applies
+# to). after names checks that must have finished first; requires names checks that must also have
+# passed (for this pod: a namespace check can answer per pod with passed_for). A check provides one or
+# more ways to run:
+#   run(ctx) / run(ctx, pod)  -> result, on the check pool
+#   section(ctx, pod)         -> pod_exec.Section, batched with the pod's other shell checks in one exec
+#   probe(ctx, pod)           -> concurrent.futures.Future of the result, used when ctx.engine is set
+# and passed(result) decides whether it passed.
+class Check:
+    def __init__(self, name, scope, passed, run=None, section=None, probe=None, applies=None,
+                 after=(), requires=(), timeout=60, passed_for=None):
+        self.name = name
+        self.scope = scope
+        self.passed = passed
+        self.run = run
+        self.section = section
+        self.probe = probe
+        self.applies = applies or (lambda ctx, pod: True)
+        self.after = tuple(after) + tuple(requires)
+        self.requires = tuple(requires)
+        self.timeout = timeout
+        self.passed_for = passed_for or (lambda result, pod_name: passed(result))
+
+# Registered checks by name, in registration order (which is also their order in the reports)
+REGISTRY = {}
+
+def register(check):
+    REGISTRY[check.name] = check
+    return check
+
+# Everything a check needs to know about the namespace it runs in. pods is refreshed from the cache
+# before every dependency level.
+class NamespaceContext:
+    def __init__(self, namespace, tests, app_paths, cache, pool, engine=None, checkpoints=None, classifier=None):
+        self.namespace = namespace
+        self.tests = tests
+        self.app_paths = app_paths
+        self.cache = cache
+        self.pool = pool
+        self.engine = engine
+        self.checkpoints = checkpoints
+        self.classifier = classifier
+        self.pods = []
+        self.probes = {}  # (method, url) -> future, so pods share a probe of the same URL
+
+# The one place check results are recorded: one record per check and namespace (namespace scope) or
+# check and pod (pod scope), with its status (passed, failed, skipped, timeout or error) and duration.
+# Records go to the listeners (the report writers) as they are added and are not kept, apart from
+# the statuses, per-namespace counts and namespace checks' results the scheduler looks up.
+# Listeners provide add(record) and namespace_finished(namespace, counts, duration).
+class CheckResults:
+    def __init__(self):
+        self.listeners = []
+        self.counts = {}
+        self._statuses = {}
+        self._namespace_records = {}
+        self._lock = threading.Lock()
+
+    def add(self, namespace, pod_name, check_name, status, duration, result=None):
+        record = {
+            "namespace": namespace,
+            "pod": pod_name,
+            "check": check_name,
+            "status": status,
+            "duration_s": round(duration, 3),
+            "result": result
+        }
+        with self._lock:
+            self._statuses[(namespace, pod_name, check_name)] = status
+            if pod_name is None:
+                self._namespace_records[(namespace, check_name)] = record
+            counts = self.counts.setdefault(namespace, {})
+            counts[status] = counts.get(status, 0) + 1
+            for listener in self.listeners:
+                listener.add(record)
+        return record
+
+    def status(self, namespace, pod_name, check_name):
+        with self._lock:
+            return self._statuses.get((namespace, pod_name, check_name))
+
+    def namespace_record(self, namespace, check_name):
+        with self._lock:
+            return self._namespace_records.get((namespace, check_name))
+
+    # Tell the listeners a namespace has no more checks coming
+    def namespace_finished(self, namespace, duration):
+        with self._lock:
+            counts = dict(self.counts.get(namespace, {}))
+            for listener in self.listeners:
+                listener.namespace_finished(namespace, counts, duration)
+
+    def summary(self):
+        with self._lock:
+            total = sum(sum(counts.values()) for counts in self.counts.values())
+            passed = sum(counts.get("passed", 0) for counts in self.counts.values())
+        return total, passed, (passed / total) * 100 if total > 0 else 0
+
+# Enabled checks grouped so every check comes after the checks it waits for; a dependency that is not
+# enabled in the namespace is ignored
+def dependency_levels(checks):
+    names = {check.name for check in checks}
+    levels = []
+    done = set()
+    remaining = list(checks)
+    while remaining:
+        level = [check for check in remaining if all(dep in done or dep not in names for dep in check.after)]
+        if not level:
+            raise ValueError(f"Check dependencies form a cycle: {', '.join(check.name for check in remaining)}")
+        levels.append(level)
+        done.update(check.name for check in level)
+        remaining = [check for check in remaining if check not in level]
+    return levels
+
+# Checks this one requires that did not pass for the pod (or the namespace, for namespace checks). A
+# namespace check's record stands in for the pod when the pod has none of its own.
+def unmet_requirements(check, ctx, results, pod_name):
+    unmet = []
+    for name in check.requires:
+        if name not in ctx.tests or name not in REGISTRY:
+            continue
+        status = results.status(ctx.namespace, pod_name, name)
+        if status is not None:
+            met = status == "passed"
+        else:
+            record = results.namespace_record(ctx.namespace, name)
+            met = record is not None and record["status"] in ("passed", "failed") and (
+                pod_name is None and record["status"] == "passed" or
+                pod_name is not None and REGISTRY[name].passed_for(record["result"], pod_name))
+        if not met:
+            unmet.append(name)
+    return unmet
+
+def status_of(check, result):
+    return "passed" if check.passed(result) else "failed"
+
+# One batched exec for the shell checks of a pod; {check name: (status, duration, result)}
+def run_pod_batch(v1_api, ctx, pod_name, pod_checks):
+    sections = [check.section(ctx, pod_name) for check in pod_checks]
+    by_name = {check.name: check for check in pod_checks}
+    start = time.monotonic()
+    try:
+        router = run_sections(v1_api, ctx.namespace, pod_name, sections, timeout=sum(check.timeout for check in pod_checks))
+    except ApiException as e:
+        logging.error(f"Error executing checks on pod {pod_name}: {e}")
+        return {name: ("error", time.monotonic() - start, f"Error executing command: {e}") for name in by_name}
+    outcome = {}
+    for name, check in by_name.items():
+        if name in router.results:
+            outcome[name] = (status_of(check, router.results[name]), router.durations[name], router.results[name])
+        elif router.timed_out:
+            outcome[name] = ("timeout", time.monotonic() - start, f"Timed out after {check.timeout}s")
+        else:
+            outcome[name] = ("error", time.monotonic() - start, "Exec ended before the check finished")
+    return outcome
+
+# Something the scheduler waits for. Its timeout counts from begin(), when it actually starts running:
+# a check queued behind the pool's limits has not used any of it yet.
+class Pending:
+    def __init__(self, check_names, pod_name, timeout, batch=False):
+        self.check_names = check_names
+        self.pod_name = pod_name
+        self.timeout = timeout
+        self.batch = batch
+        self.future = None
+        self.pool = None
+        self.start = None
+        self.finished = None
+        self.running = threading.Event()
+
+    def begin(self):
+        self.start = time.monotonic()
+        self.running.set()
+
+    def track(self, future):
+        self.future = future
+        future.add_done_callback(self._done)
+        return self
+
+    def _done(self, future):
+        self.finished = time.monotonic()
+        if not self.running.is_set():  # Failed or cancelled before it ran
+            self.begin()
+
+# Queue fn(v1_api, *args) on the check pool, starting the item's clock when a worker picks it up
+def submit(ctx, item, fn, *args):
+    def run(v1_api):
+        item.begin()
+        return fn(v1_api, *args)
+    item.pool = ctx.pool
+    return item.track(ctx.pool.submit(ctx.namespace, run))
+
+# A future that is already running (a probe on the probe engine)
+def started(item, future):
+    item.begin()
+    return item.track(future)
+
+# Run the namespace's enabled checks level by level. Within a level everything runs at once: namespace
+# checks and single pod checks on the pool, each pod's shell checks as one batched exec, probes on the
+# probe engine. A check that does not finish within its timeout is recorded as timed out and left
+# behind (its thread ends on its own; execs carry the same timeout).
+def run_checks(ctx, checks, results):
+    for level in dependency_levels(checks):
+        ctx.pods = ctx.cache.pods.list()
+        pending = []
+        batches = {}
+        for check in level:
+            if check.scope == "namespace":
+                unmet = unmet_requirements(check, ctx, results, None)
+                if unmet:
+                    results.add(ctx.namespace, None, check.name, "skipped", 0, f"Requires {', '.join(unmet)}")
+                    continue
+                pending.append(submit(ctx, Pending([check.name], None, check.timeout), lambda v1_api, check=check: check.run(ctx)))
+                continue
+            for pod in ctx.pods:
+                pod_name = pod.metadata.name
+                if not check.applies(ctx, pod):
+                    continue
+                unmet = unmet_requirements(check, ctx, results, pod_name)
+                if unmet:
+                    results.add(ctx.namespace, pod_name, check.name, "skipped", 0, f"Requires {', '.join(unmet)}")
+                elif ctx.engine and check.probe:
+                    pending.append(started(Pending([check.name], pod_name, check.timeout), check.probe(ctx, pod)))
+                elif check.section:
+                    batches.setdefault(pod_name, []).append(check)
+                else:
+                    pending.append(submit(ctx, Pending([check.name], pod_name, check.timeout), lambda v1_api, check=check, pod=pod: check.run(ctx, pod)))
+        for pod_name, pod_checks in batches.items():
+            item = Pending([check.name for check in pod_checks], pod_name, sum(check.timeout for check in pod_checks) + EXEC_GRACE, batch=True)
+            pending.append(submit(ctx, item, run_pod_batch, ctx, pod_name, pod_checks))
+        for item in pending:
+            collect(ctx, item, results)
+
+def collect(ctx, item, results):
+    item.running.wait()  # Still queued; the timeout starts once it runs
+    try:
+        result = item.future.result(timeout=max(0, item.start + item.timeout - time.monotonic()))
+    except FutureTimeoutError:
+        logging.error(f"{', '.join(item.check_names)} in namespace {ctx.namespace}{f' pod {item.pod_name}' if item.pod_name else ''} "
+                      f"timed out; giving up on it")
+        if item.pool:
+            item.pool.abandon(item.future)
+        else:
+            item.future.cancel()
+        for name in item.check_names:
+            results.add(ctx.namespace, item.pod_name, name, "timeout", time.monotonic() - item.start, f"Timed out after {REGISTRY[name].timeout}s")
+        return
+    except Exception as e:
+        logging.error(f"{', '.join(item.check_names)} in namespace {ctx.namespace} failed: {e}")
+        for name in item.check_names:
+            results.add(ctx.namespace, item.pod_name, name, "error", time.monotonic() - item.start, f"Error: {e}")
+        return
+    if item.batch:
+        for name in item.check_names:
+            status, duration, value = result[name]
+            results.add(ctx.namespace, item.pod_name, name, status, duration, value)
+        return
+    name = item.check_names[0]
+    results.add(ctx.namespace, item.pod_name, name, status_of(REGISTRY[name], result), (item.finished or time.monotonic()) - item.start, result)
@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# "http" probes the URLs from this pod; "exec" runs curl inside the target pods like before
+PROBE_MODE = os.getenv("SANITY_PROBE_MODE", "http")
+
+# Seconds per attempt (whole request / connection setup), retries after the first attempt, and
+# connections open at the same time
+PROBE_TIMEOUT = float(os.getenv("SANITY_PROBE_TIMEOUT", "10"))
+PROBE_CONNECT_TIMEOUT = float(os.getenv("SANITY_PROBE_CONNECT_TIMEOUT", "3"))
+PROBE_RETRIES = int(os.getenv("SANITY_PROBE_RETRIES", "2"))
+PROBE_CONCURRENCY = int(os.getenv("SANITY_PROBE_CONCURRENCY", "100"))
+
+# Statuses worth another attempt: the service answered, but nothing healthy was behind it yet
+RETRY_STATUSES = {502, 503, 504}
+RETRY_BACKOFF = 0.2
+
+# Hosts a URL uses when it was written for curl running inside the pod itself
+LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+def probe_mode():
+    if PROBE_MODE == "http" and aiohttp is None:
+        logging.warning("aiohttp is not installed, probing with curl inside the pods instead")
+        return "exec"
+    return PROBE_MODE
+
+def is_pod_local(url):
+    return urlsplit(url).hostname in LOOPBACK_HOSTS
+
+# A pod-local URL pointed at the pod's IP instead. The fragment is dropped, as curl never sends it.
+def pod_url(url, pod_ip):
+    parts = urlsplit(url)
+    host = f"[{pod_ip}]" if ":" in pod_ip else pod_ip
+    netloc = f"{host}:{parts.port}" if parts.port else host
+    return urlunsplit((parts.scheme, netloc, parts.path, parts.query, ""))
+
+def _mark(name):
+    async def handler(session, context, params):
+        context.trace_request_ctx.setdefault(name, time.perf_counter())
+    return handler
+
+# Timestamps of each phase of a request, kept in the dict passed as trace_request_ctx
+def trace_config():
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_mark("start"))
+    trace.on_dns_resolvehost_start.append(_mark("dns_start"))
+    trace.on_dns_resolvehost_end.append(_mark("dns_end"))
+    trace.on_connection_create_start.append(_mark("connect_start"))
+    trace.on_connection_create_end.append(_mark("connect_end"))
+    trace.on_request_end.append(_mark("headers"))
+    return trace
+
+# Milliseconds per phase; DNS and connect are 0 when the lookup was cached or the connection reused
+def phase_timings(marks):
+    def span(start, end):
+        if start in marks and end in marks:
+            return round((marks[end] - marks[start]) * 1000, 2)
+        return 0.0
+    return {
+        "dns": span("dns_start", "dns_end"),
+        "connect": span("connect_start", "connect_end"),
+        "ttfb": span("start", "headers"),
+        "total": span("start", "done")
+    }
+
+# Probes URLs over one pooled aiohttp session, on an event loop running in its own thread. probe() can
+# be called from any thread and returns a concurrent.futures.Future, so the probes of every namespace
+# share the connection pool and run side by side with the exec checks.
+class ProbeEngine:
+    def __init__(self, concurrency=PROBE_CONCURRENCY, timeout=PROBE_TIMEOUT,
+                 connect_timeout=PROBE_CONNECT_TIMEOUT, retries=PROBE_RETRIES):
+        self.retries = retries
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="probe", daemon=True)
+        self.thread.start()
+        self.session = self._submit(self._open_session(concurrency, timeout, connect_timeout)).result()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    # The session has to be created on the loop that uses it
+    async def _open_session(self, concurrency, timeout, connect_timeout):
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout),
+            trace_configs=[trace_config()]
+        )
+
+    # Future of {"status", "attempts", "timings_ms"[, "error"]}; status is "000" when no response came
+    def probe(self, method, url, data=None):
+        return self._submit(self._probe(method, url, data))
+
+    async def _probe(self, method, url, data):
+        attempt = 0
+        while True:
+            attempt += 1
+            marks = {}
+            try:
+                # Redirects are not followed, the same as curl without -L
+                async with self.session.request(method, url, data=data, allow_redirects=False, trace_request_ctx=marks) as response:
+                    async for _ in response.content.iter_chunked(64 * 1024):
+                        pass
+                marks["done"] = time.perf_counter()
+                result = {"status": str(response.status), "attempts": attempt, "timings_ms": phase_timings(marks)}
+                if response.status not in RETRY_STATUSES or attempt > self.retries:
+                    return result
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt > self.retries:
+                    error = str(e) or type(e).__name__
+                    return {"status": "000", "attempts": attempt, "timings_ms": phase_timings(marks), "error": error}
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+
+    def close(self):
+        self._submit(self.session.close()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
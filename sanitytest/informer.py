@@ -0,0 +1,133 @@
+import time
+import logging
+import threading
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+
+# Seconds one watch request stays open before it is renewed from the last resourceVersion; also how
+# long a stopped informer's thread can linger
+WATCH_TIMEOUT = 60
+
+# Seconds to wait before watching again after a failed watch
+WATCH_RETRY_DELAY = 1
+
+# In-memory copy of one kind of object in one namespace: listed once, then kept current by a watch
+# thread that resumes from the last resourceVersion (bookmarks included) and relists on 410 Gone.
+# index maps an object to a key it can be looked up by. Readers never hit the API server.
+class Informer:
+    def __init__(self, api_factory, resource, namespace, index=None):
+        self.api_factory = api_factory
+        self.method = f"list_namespaced_{resource}"
+        self.resource = resource
+        self.namespace = namespace
+        self.index = index
+        self.condition = threading.Condition()
+        self.objects = {}
+        self.indexed = {}
+        self.resource_version = None
+        self.started = False
+        self._stopped = threading.Event()
+
+    def _replace(self, objects, resource_version):
+        with self.condition:
+            self.objects = {obj.metadata.name: obj for obj in objects}
+            self.indexed = {}
+            for obj in self.objects.values():
+                self._index(obj)
+            self.resource_version = resource_version
+            self.condition.notify_all()
+
+    def _index(self, obj):
+        if self.index:
+            self.indexed.setdefault(self.index(obj), {})[obj.metadata.name] = obj
+
+    def _unindex(self, obj):
+        if self.index:
+            self.indexed.get(self.index(obj), {}).pop(obj.metadata.name, None)
+
+    def _list(self, v1_api):
+        result = getattr(v1_api, self.method)(self.namespace)
+        self._replace(result.items, result.metadata.resource_version)
+
+    def _apply(self, event, resource_version):
+        with self.condition:
+            obj = event["object"]
+            if event["type"] in ("ADDED", "MODIFIED", "DELETED"):
+                previous = self.objects.pop(obj.metadata.name, None)
+                if previous is not None:
+                    self._unindex(previous)
+                if event["type"] != "DELETED":
+                    self.objects[obj.metadata.name] = obj
+                    self._index(obj)
+            self.resource_version = resource_version or self.resource_version
+            self.condition.notify_all()
+
+    # The first list happens in the caller's thread, so its errors reach the caller
+    def start(self):
+        if self.started:
+            return
+        self._list(self.api_factory())
+        self.started = True
+        threading.Thread(target=self._run, name=f"watch-{self.resource}-{self.namespace}", daemon=True).start()
+
+    def _run(self):
+        v1_api = self.api_factory()
+        while not self._stopped.is_set():
+            object_watch = watch.Watch()
+            try:
+                if self.resource_version is None:
+                    self._list(v1_api)
+                for event in object_watch.stream(getattr(v1_api, self.method), self.namespace, resource_version=self.resource_version,
+                                                 timeout_seconds=WATCH_TIMEOUT, allow_watch_bookmarks=True):
+                    self._apply(event, object_watch.resource_version)
+                    if self._stopped.is_set():
+                        object_watch.stop()
+                        break
+            except ApiException as e:
+                if e.status == 410:
+                    logging.info(f"{self.resource.capitalize()} watch in namespace {self.namespace} expired, relisting")
+                    self.resource_version = None
+                    continue
+                logging.warning(f"{self.resource.capitalize()} watch in namespace {self.namespace} failed: {e}")
+                time.sleep(WATCH_RETRY_DELAY)
+            except Exception as e:
+                logging.warning(f"{self.resource.capitalize()} watch in namespace {self.namespace} failed: {e}")
+                time.sleep(WATCH_RETRY_DELAY)
+
+    def stop(self):
+        self._stopped.set()
+
+    def list(self):
+        with self.condition:
+            return list(self.objects.values())
+
+    def by_index(self, key):
+        with self.condition:
+            return list(self.indexed.get(key, {}).values())
+
+    # Block until predicate(objects) holds or timeout seconds pass; returns whether it holds
+    def wait_until(self, predicate, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: predicate(list(self.objects.values())), timeout)
+
+# Pods and events of one namespace. Pods are listed and watched from the start; events only once
+# something asks for them (usually never: they are read for pods that did not become ready).
+class NamespaceCache:
+    def __init__(self, api_factory, namespace):
+        self.namespace = namespace
+        self.pods = Informer(api_factory, "pod", namespace)
+        self.events = Informer(api_factory, "event", namespace, index=lambda event: event.involved_object.name)
+        self._events_lock = threading.Lock()
+
+    def start(self):
+        self.pods.start()
+
+    # Events of one pod, from the event index
+    def pod_events(self, pod_name):
+        with self._events_lock:
+            self.events.start()
+        return self.events.by_index(pod_name)
+
+    def stop(self):
+        self.pods.stop()
+        self.events.stop()
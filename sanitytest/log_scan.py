@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import shlex
+import logging
+import threading
+from pod_exec import Section
+
+# How much of a pod's log one run reads: the last LOG_TAIL_BYTES of the unread part and at most
+# LOG_MAX_BYTES in total (0 means no limit)
+LOG_TAIL_BYTES = int(os.getenv("SANITY_LOG_TAIL_BYTES", "0"))
+LOG_MAX_BYTES = int(os.getenv("SANITY_LOG_MAX_BYTES", "0"))
+
+# Classifier used for apps without a log_classifier entry in test_case_paths.json
+DEFAULT_CLASSIFIER = {
+    "include": [r"\bERROR\b", r"\bFATAL\b"],
+    "exclude": [],
+    "ignore_case": True,
+    "samples": 3,
+    "max_signatures": 50
+}
+
+# Variable parts of a log line, replaced so lines that differ only in them share a signature. One
+# pass over the line; every alternative starts with a digit or hex letter, which the lookahead checks
+# before trying them.
+SIGNATURE_PATTERN = re.compile(
+    r"(?=[0-9a-fA-F])(?:"
+    r"(?P<ts>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?|\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b)"
+    r"|(?P<uuid>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)"
+    r"|(?P<hex>\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)[0-9a-fA-F]{12,}\b)"
+    r"|(?P<ip>\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b)"
+    r"|(?P<n>\b\d+\b))"
+)
+
+# The signature only depends on where digits are, not which ones, so it is cached by the line with
+# every digit zeroed; most repeated errors differ only in their numbers
+ZERO_DIGITS = str.maketrans("123456789", "000000000")
+MAX_CACHED_SIGNATURES = 4096
+
+# Longest signature and sample line kept in the report
+MAX_SIGNATURE_LENGTH = 300
+MAX_SAMPLE_LENGTH = 1000
+
+# Where the byte offset already scanned in each pod's log is kept between runs (unset: always scan from the start)
+LOG_CHECKPOINT_FILE = os.getenv("SANITY_LOG_CHECKPOINT_FILE", "")
+
+# First line of the log section, written by the shell before the log data
+META_PREFIX = "SANITY_LOG_META"
+
+# Byte offsets already scanned, per namespace/pod/log file, saved to a JSON file after every update
+class LogCheckpoints:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.offsets = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.offsets = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable log checkpoint file {path}: {e}")
+
+    @staticmethod
+    def key(namespace, pod_name, log_file_path):
+        return f"{namespace}/{pod_name}:{log_file_path}"
+
+    def get(self, key):
+        with self._lock:
+            return self.offsets.get(key, 0)
+
+    def set(self, key, offset):
+        with self._lock:
+            self.offsets[key] = offset
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.offsets, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+# A pattern usable as a substring pre-filter: plain text, optionally between \b anchors. Returned with
+# whether it needs a word boundary before and after it.
+def pattern_keyword(pattern):
+    keyword = re.sub(r"^\\b|\\b$", "", pattern)
+    if not keyword or re.escape(keyword) != keyword:
+        return None
+    return keyword, pattern.startswith(r"\b"), pattern.endswith(r"\b")
+
+def is_word_char(char):
+    return char.isalnum() or char == "_"
+
+# An app's log_classifier from test_case_paths.json, compiled once: the include patterns as one regex,
+# the exclude patterns as another. CPython's re is slow on alternations, so when every include pattern
+# is a plain word (the usual ERROR/FATAL), blocks of log are searched for the words with str.find and
+# only the lines containing one go through the regex. With ignore_case the block is lowercased once and
+# searched for the lowercased words; hits inside a longer word (errorHandler) are skipped when the
+# pattern has \b anchors, as the regex would reject those lines anyway.
+class LogClassifier:
+    def __init__(self, config=None):
+        config = {**DEFAULT_CLASSIFIER, **(config or {})}
+        flags = re.IGNORECASE if config["ignore_case"] else 0
+        self.include = re.compile("|".join(f"(?:{pattern})" for pattern in config["include"]), flags)
+        self.exclude = re.compile("|".join(f"(?:{pattern})" for pattern in config["exclude"]), flags) if config["exclude"] else None
+        keywords = [pattern_keyword(pattern) for pattern in config["include"]]
+        self.ignore_case = config["ignore_case"]
+        if keywords and all(keywords):
+            self.keywords = [(keyword.lower(), before, after) for keyword, before, after in keywords] if self.ignore_case else keywords
+        else:
+            self.keywords = None
+        self.samples = config["samples"]
+        self.max_signatures = config["max_signatures"]
+        self._signatures = {}
+
+    def matches(self, line):
+        if not self.include.search(line):
+            return False
+        return not (self.exclude and self.exclude.search(line))
+
+    # The lines of a block of text worth matching: those containing a keyword, or every line
+    def candidates(self, text):
+        if self.keywords is None:
+            return text.splitlines()
+        # Positions found in the lowercased block are used on the original, so it has to keep its length
+        # (it does unless the block has one of the few non-ASCII characters that lowercase to two)
+        haystack = text.lower() if self.ignore_case else text
+        if len(haystack) != len(text):
+            return text.splitlines()
+        spans = {}
+        for keyword, before, after in self.keywords:
+            position = haystack.find(keyword)
+            while position >= 0:
+                stop = position + len(keyword)
+                if ((before and position > 0 and is_word_char(haystack[position - 1]))
+                        or (after and stop < len(haystack) and is_word_char(haystack[stop]))):
+                    position = haystack.find(keyword, position + 1)
+                    continue
+                start = haystack.rfind('\n', 0, position) + 1
+                end = haystack.find('\n', position)
+                if end < 0:
+                    end = len(haystack)
+                spans[start] = end
+                position = haystack.find(keyword, end)
+        return [text[start:spans[start]] for start in sorted(spans)]
+
+    def signature(self, line):
+        key = line.translate(ZERO_DIGITS)
+        signature = self._signatures.get(key)
+        if signature is None:
+            signature = " ".join(SIGNATURE_PATTERN.sub(lambda match: f"<{match.lastgroup}>", line).split())[:MAX_SIGNATURE_LENGTH]
+            if len(self._signatures) >= MAX_CACHED_SIGNATURES:
+                self._signatures.clear()
+            self._signatures[key] = signature
+        return signature
+
+# Classifies the log as it streams in and folds the matches into signatures with counts and a few
+# sample lines. At most max_signatures distinct signatures are kept; matches with a new signature
+# past that are only counted.
+class LogScanner:
+    def __init__(self, classifier=None):
+        self.classifier = classifier or LogClassifier()
+        self.meta = None
+        self.signatures = {}
+        self.matched = 0
+        self.other = 0
+
+    def feed(self, text):
+        if self.meta is None and text.startswith(META_PREFIX):
+            line, _, text = text.partition('\n')
+            self.meta = dict(field.split("=", 1) for field in line.split()[1:] if "=" in field)
+            self.meta.setdefault("missing", "missing" in line.split())
+        for line in self.classifier.candidates(text):
+            if self.classifier.matches(line):
+                self.add_match(line)
+
+    def add_match(self, line):
+        self.matched += 1
+        signature = self.classifier.signature(line)
+        entry = self.signatures.get(signature)
+        if entry is None:
+            if len(self.signatures) >= self.classifier.max_signatures:
+                self.other += 1
+                return
+            entry = self.signatures[signature] = {"signature": signature, "count": 0, "samples": []}
+        entry["count"] += 1
+        if len(entry["samples"]) < self.classifier.samples:
+            entry["samples"].append(line.strip()[:MAX_SAMPLE_LENGTH])
+
+    def result(self, error=None):
+        result = {
+            "matched_lines": self.matched,
+            "signatures": sorted(self.signatures.values(), key=lambda entry: (-entry["count"], entry["signature"]))
+        }
+        if self.other:
+            result["other_signatures_count"] = self.other
+        if error:
+            result["error"] = error
+        return result
+
+# Shell that prints the META line and then the part of the log to scan: from the checkpoint offset
+# (or the start, when the file is now shorter than the offset because it was rotated), narrowed to
+# the last tail_bytes and capped at max_bytes. head -c stops at the size measured up front, so the
+# end offset is exactly what was read even while the pod keeps logging.
+def log_script(log_file_path, offset=0, tail_bytes=0, max_bytes=0):
+    return "\n".join([
+        f"f={shlex.quote(log_file_path)}",
+        f'if [ ! -r "$f" ]; then echo "{META_PREFIX} missing"; exit 0; fi',
+        'size=$(wc -c < "$f" | tr -d " ")',
+        f"start={int(offset)}",
+        'if [ "$size" -lt "$start" ]; then start=0; fi',
+        f'if [ {int(tail_bytes)} -gt 0 ] && [ $((size - {int(tail_bytes)})) -gt "$start" ]; then start=$((size - {int(tail_bytes)})); fi',
+        "end=$size",
+        f'if [ {int(max_bytes)} -gt 0 ] && [ $((end - start)) -gt {int(max_bytes)} ]; then end=$((start + {int(max_bytes)})); fi',
+        f'echo "{META_PREFIX} size=$size start=$start end=$end"',
+        'tail -c +$((start + 1)) "$f" | head -c $((end - start))',
+    ])
+
+# Log check as a section of the pod's batched exec: classified line by line while it streams, nothing
+# is written to disk, and the checkpoint moves to the end offset once the section completed
+def log_section(namespace, pod_name, log_file_path, checkpoints=None, classifier=None,
+                tail_bytes=LOG_TAIL_BYTES, max_bytes=LOG_MAX_BYTES):
+    key = LogCheckpoints.key(namespace, pod_name, log_file_path)
+    offset = checkpoints.get(key) if checkpoints else 0
+    scanner = LogScanner(classifier)
+
+    def finish(output, exit_code):
+        meta = scanner.meta or {}
+        if meta.get("missing"):
+            logging.warning(f"Log file {log_file_path} not found in pod {pod_name}")
+            return scanner.result()
+        if exit_code != 0 or "end" not in meta:
+            return scanner.result(f"Error reading {log_file_path}: exit code {exit_code}")
+        if checkpoints:
+            checkpoints.set(key, int(meta["end"]))
+        logging.info(f"Scanned {int(meta['end']) - int(meta['start'])} byte(s) of {log_file_path} in pod {pod_name} "
+                     f"({scanner.matched} matching line(s), {len(scanner.signatures)} signature(s))")
+        return scanner.result()
+
+    return Section("check_log_for_errors", log_script(log_file_path, offset, tail_bytes, max_bytes), finish, on_data=scanner.feed)
@@ -0,0 +1,137 @@
+import time
+import uuid
+import logging
+from kubernetes import stream
+
+# Seconds one batched exec session may take before it is abandoned
+EXEC_TIMEOUT = 600
+
+# A line growing past this without a newline is cut (the rest of it is dropped), so one runaway line
+# cannot grow memory
+MAX_LINE_LENGTH = 64 * 1024
+
+# One shell-based check inside a batched exec. script is run in a subshell with stderr folded into
+# stdout. Streaming consumers get the output as it arrives through on_data, in blocks of whole lines
+# (only the block right before the section ends may lack its final newline); otherwise the output is
+# collected. finish(output, exit_code) turns it into the check's result (output is None when it was
+# streamed).
+class Section:
+    def __init__(self, name, script, finish, on_data=None):
+        self.name = name
+        self.script = script
+        self.finish = finish
+        self.on_data = on_data
+
+# Every section runs in order in one `sh -c`, framed by marker lines carrying a per-session random token
+def build_script(marker, sections):
+    parts = []
+    for section in sections:
+        parts.append(f"echo '{marker} BEGIN {section.name}'\n( {section.script}\n) 2>&1\necho \"{marker} END {section.name} $?\"")
+    return "\n".join(parts)
+
+# Splits the exec's stdout back into sections as it streams in. Output is handed on in blocks rather
+# than line by line; only marker lines are looked at individually.
+class SectionRouter:
+    def __init__(self, marker, sections):
+        self.marker = marker
+        self.sections = {section.name: section for section in sections}
+        self.results = {}
+        self.durations = {}
+        self.timed_out = False
+        self._started = None
+        self._current = None
+        self._chunks = []
+        self._buffer = ''
+        self._skipping = False
+
+    def feed(self, data):
+        self._buffer += data
+        while True:
+            position = self._buffer.find(self.marker)
+            if position < 0:
+                break
+            # Output without a trailing newline ends up in front of the END marker
+            self._deliver(self._buffer[:position])
+            end = self._buffer.find('\n', position)
+            if end < 0:
+                self._buffer = self._buffer[position:]
+                return
+            self._marker_line(self._buffer[position + len(self.marker):end])
+            self._buffer = self._buffer[end + 1:]
+        cut = self._buffer.rfind('\n') + 1
+        if cut:
+            self._deliver(self._buffer[:cut])
+            self._buffer = self._buffer[cut:]
+        if len(self._buffer) > MAX_LINE_LENGTH:
+            # Keep enough of the tail for a marker that is split across reads
+            self._deliver(self._buffer[:MAX_LINE_LENGTH] + '\n')
+            self._buffer = self._buffer[-len(self.marker):]
+            self._skipping = True
+
+    def close(self):
+        if self._buffer:
+            self._deliver(self._buffer)
+            self._buffer = ''
+
+    def _deliver(self, text):
+        if self._skipping and text:
+            newline = text.find('\n')
+            if newline < 0:
+                return
+            text = text[newline + 1:]
+            self._skipping = False
+        if not text or self._current is None:
+            return
+        if self._current.on_data:
+            self._current.on_data(text)
+        else:
+            self._chunks.append(text)
+
+    def _marker_line(self, line):
+        fields = line.split()
+        if len(fields) >= 2 and fields[0] == 'BEGIN' and fields[1] in self.sections:
+            self._current = self.sections[fields[1]]
+            self._chunks = []
+            self._started = time.monotonic()
+        elif len(fields) >= 3 and fields[0] == 'END' and self._current is not None:
+            section = self._current
+            output = None if section.on_data else ''.join(self._chunks).rstrip('\n')
+            self.results[section.name] = section.finish(output, int(fields[2]) if fields[2].isdigit() else -1)
+            self.durations[section.name] = time.monotonic() - self._started
+            self._current = None
+            self._chunks = []
+
+# Run all sections in a single exec session and return the router, holding {section name: result} and
+# each section's duration. Output is consumed as it arrives, so memory stays flat whatever the sections
+# print. Sections that never finished (exec timed out or was cut off) are missing from the results;
+# the caller decides what that means.
+def run_sections(v1_api, namespace, pod_name, sections, timeout=EXEC_TIMEOUT):
+    marker = f"__SANITY_{uuid.uuid4().hex}__"
+    router = SectionRouter(marker, sections)
+    response = stream.stream(
+        v1_api.connect_get_namespaced_pod_exec,
+        pod_name,
+        namespace,
+        command=['/bin/sh', '-c', build_script(marker, sections)],
+        stderr=True, stdin=False,
+        stdout=True, tty=False,
+        _preload_content=False
+    )
+    deadline = time.monotonic() + timeout
+    try:
+        while response.is_open():
+            if time.monotonic() > deadline:
+                logging.error(f"Exec in pod {pod_name} timed out after {timeout}s")
+                router.timed_out = True
+                break
+            response.update(timeout=1)
+            if response.peek_stdout(timeout=0):
+                router.feed(response.read_stdout(timeout=0))
+            if response.peek_stderr(timeout=0):
+                response.read_stderr(timeout=0)  # Sections fold stderr into stdout; this is the outer shell
+        if response.peek_stdout(timeout=0):
+            router.feed(response.read_stdout(timeout=0))
+        router.close()
+    finally:
+        response.close()
+    return router
@@ -0,0 +1,104 @@
+import re
+import json
+import time
+import threading
+from xml.sax.saxutils import escape, quoteattr
+
+# Characters XML 1.0 does not allow, which log samples can contain (terminal colour codes and the like)
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+# One JSON object per line, written and flushed as each check finishes: "check" lines carry the check
+# record (with its duration), a "namespace" line follows once all of a namespace's checks are done, and
+# a "summary" line ends the file. Whatever was written before a crash stays readable line by line.
+class JsonLinesWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w")
+        self._lock = threading.Lock()
+
+    def _write(self, entry):
+        with self._lock:
+            self.file.write(json.dumps(entry, default=str) + "\n")
+            self.file.flush()
+
+    def add(self, record):
+        self._write({"type": "check", **record})
+
+    def namespace_finished(self, namespace, counts, duration):
+        self._write({"type": "namespace", "namespace": namespace, "checks": counts, "duration_s": round(duration, 3)})
+
+    def close(self, total, passed, percentage):
+        self._write({"type": "summary", "total": total, "passed": passed, "success_percentage": round(percentage, 2)})
+        self.file.close()
+
+# JUnit XML as Jenkins reads it: a <testsuite> per namespace, a <testcase> per check and pod (classname
+# namespace.pod, or namespace.namespace for namespace checks) with the check's duration as its time.
+# Test cases are rendered as their records come in, and a namespace's suite is written the moment the
+# namespace is done, with its cases sorted by pod and then check (namespace checks first, checks in
+# check_order) so a suite does not depend on which check finished first. The closing </testsuites> is
+# written after every suite and overwritten by the next one, so the file is a complete report of the
+# namespaces finished so far at any moment. close() adds a "summary" suite whose properties carry the
+# run's TotalTests, PassedTests and SuccessPercentage.
+class JUnitWriter:
+    def __init__(self, path, check_order=()):
+        self.path = path
+        self.check_order = {name: index for index, name in enumerate(check_order)}
+        self.file = open(path, "w")
+        self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites name="sanitytest">\n')
+        self._end = self.file.tell()
+        self._close_root()
+        self._cases = {}
+        self._lock = threading.Lock()
+
+    def _close_root(self):
+        self.file.write("</testsuites>\n")
+        self.file.flush()
+
+    def _write(self, suite):
+        self.file.seek(self._end)
+        self.file.truncate()
+        self.file.write(suite)
+        self._end = self.file.tell()
+        self._close_root()
+
+    def add(self, record):
+        key = (record["pod"] is not None, record["pod"] or "", self.check_order.get(record["check"], len(self.check_order)), record["check"])
+        case = testcase(record)
+        with self._lock:
+            self._cases.setdefault(record["namespace"], []).append((key, case))
+
+    def namespace_finished(self, namespace, counts, duration):
+        with self._lock:
+            cases = [case for _, case in sorted(self._cases.pop(namespace, []), key=lambda item: item[0])]
+            attributes = (f'name={quoteattr(namespace)} tests="{sum(counts.values())}" failures="{counts.get("failed", 0)}" '
+                          f'errors="{counts.get("error", 0) + counts.get("timeout", 0)}" skipped="{counts.get("skipped", 0)}" '
+                          f'time="{duration:.3f}" timestamp="{time.strftime("%Y-%m-%dT%H:%M:%S")}"')
+            self._write(f"  <testsuite {attributes}>\n{''.join(cases)}  </testsuite>\n")
+
+    def close(self, total, passed, percentage):
+        with self._lock:
+            properties = "".join(f'      <property name="{name}" value="{value}"/>\n' for name, value in
+                                 (("TotalTests", total), ("PassedTests", passed), ("SuccessPercentage", f"{percentage:.2f}%")))
+            self._write(f'  <testsuite name="summary" tests="0" failures="0" errors="0" skipped="0" time="0">\n'
+                        f'    <properties>\n{properties}    </properties>\n  </testsuite>\n')
+            self.file.close()
+
+def xml_text(value):
+    if not isinstance(value, str):
+        value = json.dumps(value, indent=2, default=str)
+    return escape(INVALID_XML_CHARS.sub("?", value))
+
+def testcase(record):
+    classname = f"{record['namespace']}.{record['pod'] or 'namespace'}"
+    status = record["status"]
+    body = ""
+    if status == "failed":
+        body = f'      <failure message="Check failed">{xml_text(record["result"])}</failure>\n'
+    elif status in ("error", "timeout"):
+        body = f'      <error type="{status}" message={quoteattr(INVALID_XML_CHARS.sub("?", str(record["result"])))}/>\n'
+    elif status == "skipped":
+        body = f'      <skipped message={quoteattr(str(record["result"]))}/>\n'
+    if status == "passed" and record["result"] is not None:
+        body += f'      <system-out>{xml_text(record["result"])}</system-out>\n'
+    return (f'    <testcase classname={quoteattr(classname)} name={quoteattr(record["check"])} time="{record["duration_s"]:.3f}">\n'
+            f'{body}    </testcase>\n')
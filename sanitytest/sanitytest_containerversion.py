@@ -1,13 +1,42 @@
 import os
 import json
 import time
+import queue
 import logging
-import xml.etree.ElementTree as ET
-from kubernetes import client, config, stream
+import itertools
+import threading
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+from kubernetes import client, config
 from kubernetes.client.rest import ApiException
+from pod_exec import Section
+from log_scan import LOG_CHECKPOINT_FILE, LogCheckpoints, LogClassifier, log_section
+from http_probe import PROBE_TIMEOUT, PROBE_RETRIES, ProbeEngine, is_pod_local, pod_url, probe_mode
+from informer import NamespaceCache
+from checks import REGISTRY, Check, CheckResults, NamespaceContext, register, run_checks
+from reports import JsonLinesWriter, JUnitWriter
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+
+# Concurrency limits: checks in flight across the whole run and within one namespace (both bound the
+# exec/API load on the API server), and namespaces handled at the same time
+MAX_WORKERS = int(os.getenv("SANITY_MAX_WORKERS", "64"))
+MAX_WORKERS_PER_NAMESPACE = int(os.getenv("SANITY_MAX_WORKERS_PER_NAMESPACE", "4"))
+MAX_PARALLEL_NAMESPACES = int(os.getenv("SANITY_MAX_PARALLEL_NAMESPACES", "20"))
+
+# Seconds pods get to become ready
+READINESS_TIMEOUT = int(os.getenv("SANITY_READINESS_TIMEOUT", "300"))
+
+# Seconds the in-pod checks may take: deployment files (and curl when exec'd), log scan, and curl
+# checks (over HTTP every attempt of a probe has its own timeout on top of this limit)
+EXEC_CHECK_TIMEOUT = int(os.getenv("SANITY_EXEC_CHECK_TIMEOUT", "60"))
+LOG_CHECK_TIMEOUT = int(os.getenv("SANITY_LOG_CHECK_TIMEOUT", "600"))
+CURL_CHECK_TIMEOUT = int(os.getenv("SANITY_CURL_CHECK_TIMEOUT", str(int(PROBE_TIMEOUT * (PROBE_RETRIES + 1) + 10))))
+
+# Reports, written as the checks finish: one JSON line per check record and JUnit XML for Jenkins
+RESULTS_FILE = os.getenv("SANITY_RESULTS_FILE", "/tmp/pod_test_results.jsonl")
+JUNIT_FILE = os.getenv("SANITY_JUNIT_FILE", "/tmp/test_report.xml")
 
 # Load externalized configuration files
 def load_config_files():
@@ -42,335 +71,377 @@ def load_k8s_config():
             logging.error(f"Failed to load kubeconfig: {e}")
             raise
 
+_thread_local = threading.local()
+
+# stream.stream swaps ApiClient.request for the duration of an exec, so an ApiClient must never be
+# shared between threads; every thread gets its own CoreV1Api
+def core_v1_api():
+    if not hasattr(_thread_local, "v1_api"):
+        _thread_local.v1_api = client.CoreV1Api(client.ApiClient())
+    return _thread_local.v1_api
+
+# Bounded worker pool for pod checks. The pool size is the global limit. A namespace past its own limit
+# gets its checks held in a backlog (not queued) until one of its running checks ends, so it never holds
+# pool threads other namespaces could use, and submit() never blocks. Workers are daemon threads: a
+# check the scheduler gave up on (abandon) gets its namespace slot back and its worker is replaced, so
+# hung checks can neither starve the pool nor keep the process from exiting.
+class CheckPool:
+    def __init__(self, max_workers, max_per_namespace):
+        self.max_per_namespace = max_per_namespace
+        self._queue = queue.Queue()
+        self._namespaces = {}  # namespace -> {"running": slots in use, "backlog": jobs waiting for one}
+        self._jobs = {}  # future -> job, until the job gives its slot back (or leaves the backlog)
+        self._workers = set()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        for _ in range(max_workers):
+            self._start_worker()
+
+    def _start_worker(self):
+        thread = threading.Thread(target=self._work, name=f"check_{next(self._ids)}", daemon=True)
+        with self._lock:
+            self._workers.add(thread)
+        thread.start()
+
+    def _work(self):
+        me = threading.current_thread()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                job["thread"] = me
+            future = job["future"]
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job["fn"](core_v1_api(), *job["args"])
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            with self._lock:
+                if me not in self._workers:
+                    return  # Abandoned while running; a replacement worker has taken its place
+
+    # Give the job's slot back (exactly once: when it finishes or is abandoned, whichever comes first)
+    # and hand it to the namespace's next waiting job
+    def _release(self, future):
+        with self._lock:
+            job = self._jobs.pop(future, None)
+            if job is None:
+                return
+            namespace = self._namespaces[job["namespace"]]
+            if not job["slot"]:
+                namespace["backlog"].remove(job)  # Cancelled while waiting
+                return
+            if namespace["backlog"]:
+                waiting = namespace["backlog"].popleft()
+                waiting["slot"] = True
+                self._queue.put(waiting)
+            else:
+                namespace["running"] -= 1
+
+    # Run fn(v1_api, *args) on a pool thread with that thread's CoreV1Api
+    def submit(self, namespace, fn, *args):
+        future = Future()
+        job = {"future": future, "fn": fn, "args": args, "namespace": namespace, "slot": False, "thread": None}
+        with self._lock:
+            state = self._namespaces.setdefault(namespace, {"running": 0, "backlog": collections.deque()})
+            self._jobs[future] = job
+            if state["running"] < self.max_per_namespace:
+                state["running"] += 1
+                job["slot"] = True
+                self._queue.put(job)
+            else:
+                state["backlog"].append(job)
+        future.add_done_callback(self._release)
+        return future
+
+    # Give up on a check that overran its timeout: cancel it if it has not started, otherwise free its
+    # namespace slot and write its worker off, starting another in its place
+    def abandon(self, future):
+        if future.cancel():
+            return
+        with self._lock:
+            job = self._jobs.get(future)
+            replace = job is not None and job["thread"] in self._workers
+            if replace:
+                self._workers.discard(job["thread"])
+        self._release(future)
+        if replace:
+            self._start_worker()
+
+    # Let the live workers finish what is queued; abandoned ones are not waited for
+    def shutdown(self):
+        with self._lock:
+            workers = list(self._workers)
+        for _ in workers:
+            self._queue.put(None)
+        for thread in workers:
+            thread.join()
+
 def is_pod_ready(pod):
-    conditions = pod.status.conditions
+    conditions = pod.status.conditions or []  # None while the pod is still pending
     for condition in conditions:
         if condition.type == "Ready" and condition.status == "True":
             return True
     return False
 
-def get_pod_events(v1_api, namespace, pod_name):
-    try:
-        events = v1_api.list_namespaced_event(namespace, field_selector=f"involvedObject.name={pod_name}")
-        event_details = []
-        for event in events.items:
-            event_details.append({
-                "timestamp": str(event.last_timestamp),
-                "type": event.type,
-                "reason": event.reason,
-                "message": event.message,
-                "source": event.source.component
-            })
-        return event_details
-    except ApiException as e:
-        logging.error(f"Error getting events for pod {pod_name}: {e}")
-        return [{"error": str(e)}]
+def event_details(event):
+    return {
+        "timestamp": str(event.last_timestamp),
+        "type": event.type,
+        "reason": event.reason,
+        "message": event.message,
+        "source": event.source.component
+    }
 
-def check_pod_readiness(v1_api, namespace):
-    timeout = 300
-    check_interval = 5
-    end_time = time.time() + timeout
+# Wait on the namespace's pod cache until every pod is ready or the deadline passes. The cache's
+# watch delivers every readiness change, so nothing here talks to the API server; events are only
+# read, from the event cache, for the pods still not ready at the end.
+def check_pod_readiness(cache, namespace, timeout=READINESS_TIMEOUT):
+    start = time.monotonic()
     namespace_status = {
         "namespace": namespace,
         "test_case": "check_pod_readiness",
         "pods": []
     }
 
-    while time.time() < end_time:
-        try:
-            api_response = v1_api.list_namespaced_pod(namespace)
-            pods = api_response.items
-            all_ready = True
-
-            for pod in pods:
-                pod_name = pod.metadata.name
-                ready = is_pod_ready(pod)
-                pod_details = {
-                    "name": pod_name,
-                    "ready": ready,
-                    "events": get_pod_events(v1_api, namespace, pod_name) if not ready else []
-                }
-                namespace_status["pods"].append(pod_details)
-                if not ready:
-                    all_ready = False
-
-            if all_ready:
-                return namespace_status
-
-            time.sleep(check_interval)
-        except ApiException as e:
-            logging.error(f"Error listing pods in namespace {namespace}: {e}")
-            return {"error": str(e)}
-
-    for pod in namespace_status["pods"]:
-        if not pod["ready"]:
-            pod["events"] = get_pod_events(v1_api, namespace, pod["name"])
+    cache.pods.wait_until(lambda pods: all(is_pod_ready(pod) for pod in pods), timeout)
+    pods = {pod.metadata.name: is_pod_ready(pod) for pod in cache.pods.list()}
+    not_ready = sorted(name for name, ready in pods.items() if not ready)
+    for pod_name in sorted(pods):
+        events = []
+        if not pods[pod_name]:
+            try:
+                events = [event_details(event) for event in cache.pod_events(pod_name)]
+            except ApiException as e:
+                logging.error(f"Error getting events in namespace {namespace}: {e}")
+                events = [{"error": str(e)}]
+        namespace_status["pods"].append({
+            "name": pod_name,
+            "ready": pods[pod_name],
+            "events": events
+        })
+    if not_ready:
+        logging.error(f"Pods not ready in namespace {namespace} after {timeout}s: {', '.join(not_ready)}")
+    else:
+        logging.info(f"All {len(pods)} pod(s) in namespace {namespace} ready after {time.monotonic() - start:.1f}s")
     return namespace_status
 
-def check_deployment_files(v1_api, namespace, pod_name, deployment_directory):
-    exec_command = [
-        '/bin/sh',
-        '-c',
-        f'ls -l {deployment_directory}/*.failed || echo "No deployment failed"'
-    ]
-
-    try:
-        response = stream.stream(
-            v1_api.connect_get_namespaced_pod_exec,
-            pod_name,
-            namespace,
-            command=exec_command,
-            stderr=True, stdin=False,
-            stdout=True, tty=False
-        )
-
-        if "No deployment failed" in response:
+# Shell-based checks are sections of one exec per pod (see pod_exec.py); each builds its section here
+def deployment_files_section(deployment_directory):
+    def finish(output, exit_code):
+        if "No deployment failed" in output:
             return "All deployments succeeded"
-        else:
-            return f"Failed deployments:\n{response}"
-
-    except ApiException as e:
-        logging.error(f"Error executing command on pod {pod_name}: {e}")
-        return f"Error executing command: {e}"
+        return f"Failed deployments:\n{output}"
+    return Section("check_deployment_files", f'ls -l {deployment_directory}/*.failed || echo "No deployment failed"', finish)
 
 def substitute_namespace_in_url(url_template, namespace):
     if not url_template:
         return None
     return url_template.replace("{namespace}", namespace)
 
-def perform_api_curl_on_pods(v1_api, namespace, app_paths):
-    label_selector = app_paths.get("label_selector", "")
-    api_curl_url_template = app_paths.get("api_curl_url", "")
-    api_curl_url = substitute_namespace_in_url(api_curl_url_template, namespace)
-    
-    if not label_selector or not api_curl_url:
-        logging.error("API curl test cannot proceed due to missing label_selector or api_curl_url.")
-        return []
-
-    try:
-        api_response = v1_api.list_namespaced_pod(namespace, label_selector=label_selector)
-        pods = api_response.items
-        curl_results = []
-
-        for pod in pods:
-            pod_name = pod.metadata.name
-            api_exec_command = [
-                '/bin/sh',
-                '-c',
-                f'curl -v -s -w "%{{http_code}}" -o /dev/null {api_curl_url}'
-            ]
-
-            try:
-                api_response = stream.stream(
-                    v1_api.connect_get_namespaced_pod_exec,
-                    pod_name,
-                    namespace,
-                    command=api_exec_command,
-                    stderr=True, stdin=False,
-                    stdout=True, tty=False
-                )
-
-                curl_results.append({
-                    "pod_name": pod_name,
-                    "api_curl_status": api_response.strip()
-                })
-
-            except ApiException as e:
-                logging.error(f"Error performing API curl on pod {pod_name}: {e}")
-                curl_results.append({
-                    "pod_name": pod_name,
-                    "error": f"Error: {e}"
-                })
-
-        return curl_results
-
-    except ApiException as e:
-        logging.error(f"Error listing pods in namespace {namespace}: {e}")
-        return [{"error": str(e)}]
-
-def perform_web_curl_on_pods(v1_api, namespace, app_paths):
-    label_selector = app_paths.get("label_selector", "")
-    web_curl_url_template = app_paths.get("web_curl_url", "")
-    web_curl_url = substitute_namespace_in_url(web_curl_url_template, namespace)
+# Kubernetes label selector match for the forms the config uses: key=value, key==value, key!=value,
+# key (exists) and !key (does not exist), comma separated
+def matches_label_selector(labels, label_selector):
+    labels = labels or {}
+    for requirement in filter(None, (part.strip() for part in label_selector.split(","))):
+        if "!=" in requirement:
+            key, value = (item.strip() for item in requirement.split("!=", 1))
+            if labels.get(key) == value:
+                return False
+        elif "=" in requirement:
+            key, value = (item.strip() for item in requirement.replace("==", "=").split("=", 1))
+            if labels.get(key) != value:
+                return False
+        elif requirement.startswith("!"):
+            if requirement[1:].strip() in labels:
+                return False
+        elif requirement not in labels:
+            return False
+    return True
+
+# Pods the curl checks run in: the ones matching the app's label_selector
+def is_curl_target(ctx, pod):
+    label_selector = ctx.app_paths.get("label_selector", "")
+    return bool(label_selector) and matches_label_selector(pod.metadata.labels, label_selector)
+
+# curl writes the status code last (-w), after anything it printed to stderr
+def curl_section(name, pod_name, command, result_key):
+    def finish(output, exit_code):
+        lines = output.strip().splitlines()
+        return {"pod_name": pod_name, result_key: lines[-1].strip() if lines else ""}
+    return Section(name, command, finish)
+
+# API curl from inside one target pod
+def api_curl_section(namespace, pod_name, app_paths):
+    api_curl_url = substitute_namespace_in_url(app_paths.get("api_curl_url", ""), namespace)
+    return curl_section("perform_api_curl_on_pods", pod_name, f'curl -v -s -w "\\n%{{http_code}}" -o /dev/null {api_curl_url}', "api_curl_status")
+
+# Web login POST from inside one target pod
+def web_curl_section(namespace, pod_name, app_paths):
+    web_curl_url = substitute_namespace_in_url(app_paths.get("web_curl_url", ""), namespace)
     web_username = app_paths.get("web_username", "")
     web_password = app_paths.get("web_password", "")
-    
-    if not label_selector or not web_curl_url:
-        logging.error("Web curl test cannot proceed due to missing label_selector or web_curl_url.")
-        return []
-
+    command = f'curl -o /dev/null -s -w "%{{http_code}}" -X POST -d "username={web_username}&password={web_password}" {web_curl_url}'
+    return curl_section("perform_web_curl_on_pods", pod_name, command, "web_curl_status")
+
+# The HTTP request behind a curl check as (status key, method, url, form data). URLs written for curl
+# inside the pod (127.0.0.1) go to the pod's IP (None while it has none); service URLs stay as they are.
+def probe_request(namespace, pod, app_paths, check_name):
+    if check_name == "perform_api_curl_on_pods":
+        key, method, url, form = "api_curl_status", "GET", app_paths["api_curl_url"], None
+    else:
+        key, method, url = "web_curl_status", "POST", app_paths["web_curl_url"]
+        form = {"username": app_paths.get("web_username", ""), "password": app_paths.get("web_password", "")}
+    url = substitute_namespace_in_url(url, namespace)
+    if is_pod_local(url):
+        url = pod_url(url, pod.status.pod_ip) if pod.status.pod_ip else None
+    return key, method, url, form
+
+# Future of a curl check's result, probed over HTTP. The probe of a service URL is started once per
+# namespace and shared by the target pods.
+def start_probe(ctx, pod, check_name):
+    pod_name = pod.metadata.name
+    key, method, url, form = probe_request(ctx.namespace, pod, ctx.app_paths, check_name)
+    result = Future()
+    if url is None:
+        result.set_result({"pod_name": pod_name, key: "000", "url": None, "error": "Error: pod has no IP"})
+        return result
+    if (method, url) not in ctx.probes:
+        ctx.probes[(method, url)] = ctx.engine.probe(method, url, form)
+
+    def done(probe):
+        try:
+            result.set_result(probe_result(pod_name, key, url, probe.result()))
+        except Exception as e:
+            result.set_exception(e)
+    ctx.probes[(method, url)].add_done_callback(done)
+    return result
+
+def probe_result(pod_name, key, url, probe):
+    result = {"pod_name": pod_name, key: probe["status"], "url": url, "attempts": probe["attempts"], "timings_ms": probe["timings_ms"]}
+    if "error" in probe:
+        result["error"] = f"Error: {probe['error']}"
+    return result
+
+# The checks, their scope, what they wait for and how long they may take. Readiness gates the curl
+# checks (they are skipped in pods that never became ready); the in-pod checks only run after it.
+register(Check(
+    "check_pod_readiness", "namespace",
+    run=lambda ctx: check_pod_readiness(ctx.cache, ctx.namespace),
+    passed=lambda result: all(pod["ready"] for pod in result["pods"]),
+    passed_for=lambda result, pod_name: any(pod["name"] == pod_name and pod["ready"] for pod in result["pods"]),
+    timeout=READINESS_TIMEOUT + 30
+))
+register(Check(
+    "check_deployment_files", "pod",
+    section=lambda ctx, pod_name: deployment_files_section(ctx.app_paths["deployment_directory"]),
+    passed=lambda result: result == "All deployments succeeded",
+    applies=lambda ctx, pod: "deployment_directory" in ctx.app_paths,
+    after=["check_pod_readiness"],
+    timeout=EXEC_CHECK_TIMEOUT
+))
+register(Check(
+    "perform_api_curl_on_pods", "pod",
+    section=lambda ctx, pod_name: api_curl_section(ctx.namespace, pod_name, ctx.app_paths),
+    probe=lambda ctx, pod: start_probe(ctx, pod, "perform_api_curl_on_pods"),
+    passed=lambda result: result.get("api_curl_status") == "200",
+    applies=lambda ctx, pod: "api_curl_url" in ctx.app_paths and is_curl_target(ctx, pod),
+    requires=["check_pod_readiness"],
+    timeout=CURL_CHECK_TIMEOUT
+))
+register(Check(
+    "perform_web_curl_on_pods", "pod",
+    section=lambda ctx, pod_name: web_curl_section(ctx.namespace, pod_name, ctx.app_paths),
+    probe=lambda ctx, pod: start_probe(ctx, pod, "perform_web_curl_on_pods"),
+    passed=lambda result: result.get("web_curl_status") == "200",
+    applies=lambda ctx, pod: "web_curl_url" in ctx.app_paths and is_curl_target(ctx, pod),
+    requires=["check_pod_readiness"],
+    timeout=CURL_CHECK_TIMEOUT
+))
+register(Check(
+    "check_log_for_errors", "pod",
+    section=lambda ctx, pod_name: log_section(ctx.namespace, pod_name, ctx.app_paths["log_file_path"], ctx.checkpoints, ctx.classifier),
+    passed=lambda result: result["matched_lines"] == 0 and "error" not in result,
+    applies=lambda ctx, pod: "log_file_path" in ctx.app_paths,
+    after=["check_pod_readiness"],
+    timeout=LOG_CHECK_TIMEOUT
+))
+
+# Readiness first, then the checks that wait for it, scheduled by checks.run_checks: one batched exec
+# per pod on the shared pool, and the HTTP probes on the probe engine (when there is one) alongside.
+# Pods come from the namespace's cache, listed and watched once. Every outcome goes into results.
+def check_namespace(pool, namespace, test_cases, test_case_paths, results, checkpoints=None, engine=None):
+    start = time.monotonic()
+    # Extract app name from namespace
+    app_name = get_app_name_from_namespace(namespace)
+
+    app_paths = get_app_paths(app_name, test_case_paths)
+    tests = test_cases.get(app_name, test_cases.get("default", []))
+    checks = [REGISTRY[name] for name in tests if name in REGISTRY]
+    for name in tests:
+        if name not in REGISTRY:
+            logging.warning(f"Unknown check {name} for namespace {namespace}, ignoring it")
+
+    cache = NamespaceCache(core_v1_api, namespace)
     try:
-        api_response = v1_api.list_namespaced_pod(namespace, label_selector=label_selector)
-        pods = api_response.items
-        curl_results = []
-
-        for pod in pods:
-            pod_name = pod.metadata.name
-            web_exec_command = [
-                '/bin/sh',
-                '-c',
-                f'curl -o /dev/null -s -w "%{{http_code}}" -X POST -d "username={web_username}&password={web_password}" {web_curl_url}'
-            ]
-
-            try:
-                web_response = stream.stream(
-                    v1_api.connect_get_namespaced_pod_exec,
-                    pod_name,
-                    namespace,
-                    command=web_exec_command,
-                    stderr=True, stdin=False,
-                    stdout=True, tty=False
-                )
-
-                curl_results.append({
-                    "pod_name": pod_name,
-                    "web_curl_status": web_response.strip()
-                })
-
-            except ApiException as e:
-                logging.error(f"Error performing web curl on pod {pod_name}: {e}")
-                curl_results.append({
-                    "pod_name": pod_name,
-                    "error": f"Error: {e}"
-                })
-
-        return curl_results
-
+        cache.start()
     except ApiException as e:
         logging.error(f"Error listing pods in namespace {namespace}: {e}")
-        return [{"error": str(e)}]
-
-def check_log_for_errors(v1_api, namespace, pod_name, log_file_path):
-    exec_command = [
-        '/bin/sh',
-        '-c',
-        f'cat {log_file_path}'
-    ]
-
+        for check in checks:
+            results.add(namespace, None, check.name, "error", time.monotonic() - start, f"Error listing pods: {e}")
+        results.namespace_finished(namespace, time.monotonic() - start)
+        return
+
+    if any(check.name in ("perform_api_curl_on_pods", "perform_web_curl_on_pods") for check in checks) and not app_paths.get("label_selector"):
+        logging.error(f"Curl tests in namespace {namespace} cannot proceed due to missing label_selector.")
+    ctx = NamespaceContext(namespace, tests, app_paths, cache, pool, engine, checkpoints, LogClassifier(app_paths.get("log_classifier")))
     try:
-        response = stream.stream(
-            v1_api.connect_get_namespaced_pod_exec,
-            pod_name,
-            namespace,
-            command=exec_command,
-            stderr=True, stdin=False,
-            stdout=True, tty=False
-        )
-
-        with open("/tmp/pod_log_output.log", "w") as log_file:
-            log_file.write(response)
-
-        errors = []
-        with open("/tmp/pod_log_output.log", 'r') as file:
-            for line in file:
-                if 'error' in line.lower():
-                    errors.append(line.strip())
-
-        return errors if errors else []
+        run_checks(ctx, checks, results)
+    finally:
+        cache.stop()
+        results.namespace_finished(namespace, time.monotonic() - start)
 
-    except ApiException as e:
-        logging.error(f"Error executing command on pod {pod_name}: {e}")
-        return [f"Error executing command: {e}"]
-
-def calculate_test_results(report):
-    total_tests = 0
-    passed_tests = 0
-
-    for namespace_report in report:
-        tests = namespace_report["tests"]
-        total_tests += len(tests)
-        
-        for pod in namespace_report["pods"]:
-            for test in tests:
-                if "check_pod_readiness" in test and all([pod.get("ready", False) for pod in namespace_report["pods"]]):
-                    passed_tests += 1
-                if "perform_api_curl_on_pods" in test and pod.get("api_curl_status", "000") == "200":
-                    passed_tests += 1
-                if "perform_web_curl_on_pods" in test and pod.get("web_curl_status", "000") == "200":
-                    passed_tests += 1
-                if "check_log_for_errors" in test and not pod.get("errors", []):
-                    passed_tests += 1
-
-    success_percentage = (passed_tests / total_tests) * 100 if total_tests > 0 else 0
-    return total_tests, passed_tests, success_percentage
-
-def generate_xml_report(report, total_tests, passed_tests, success_percentage):
-    root = ET.Element("TestReport")
-    tests_summary = ET.SubElement(root, "Summary")
-    ET.SubElement(tests_summary, "TotalTests").text = str(total_tests)
-    ET.SubElement(tests_summary, "PassedTests").text = str(passed_tests)
-    ET.SubElement(tests_summary, "SuccessPercentage").text = f"{success_percentage:.2f}%"
-
-    for namespace_report in report:
-        namespace_element = ET.SubElement(root, "Namespace", name=namespace_report["namespace"])
-        for pod in namespace_report["pods"]:
-            pod_element = ET.SubElement(namespace_element, "Pod", name=pod["name"])
-            for key, value in pod.items():
-                if isinstance(value, list):
-                    list_element = ET.SubElement(pod_element, key)
-                    for item in value:
-                        ET.SubElement(list_element, "Item").text = str(item)
-                else:
-                    ET.SubElement(pod_element, key).text = str(value)
-
-    tree = ET.ElementTree(root)
-    xml_report_path = "/tmp/test_report.xml"
-    tree.write(xml_report_path)
-    return xml_report_path
+    logging.info(f"Namespace {namespace} checked in {time.monotonic() - start:.1f}s")
 
 def main():
     load_k8s_config()
-    v1_api = client.CoreV1Api()
+    start = time.monotonic()
 
     # Load the external config files
     namespaces, test_cases, test_case_paths = load_config_files()
 
-    report = []
-    for namespace in namespaces:
-        # Extract app name from namespace
-        app_name = get_app_name_from_namespace(namespace)
-        
-        app_paths = get_app_paths(app_name, test_case_paths)
-        tests = test_cases.get(app_name, test_cases.get("default", []))
-        namespace_report = {
-            "namespace": namespace,
-            "tests": tests,
-            "pods": []
-        }
-
-        if "check_pod_readiness" in tests:
-            pod_readiness = check_pod_readiness(v1_api, namespace)
-            namespace_report["pods"].extend(pod_readiness["pods"])
-
-        api_response = v1_api.list_namespaced_pod(namespace)
-        for pod in api_response.items:
-            pod_details = {
-                "name": pod.metadata.name
-            }
-            if "check_deployment_files" in tests:
-                pod_details["check_deployment_files"] = check_deployment_files(v1_api, namespace, pod.metadata.name, app_paths["deployment_directory"])
-            if "perform_api_curl_on_pods" in tests and "api_curl_url" in app_paths:
-                pod_details["perform_api_curl_on_pods"] = perform_api_curl_on_pods(v1_api, namespace, app_paths)
-            if "perform_web_curl_on_pods" in tests and "web_curl_url" in app_paths:
-                pod_details["perform_web_curl_on_pods"] = perform_web_curl_on_pods(v1_api, namespace, app_paths)
-            if "check_log_for_errors" in tests:
-                pod_details["check_log_for_errors"] = check_log_for_errors(v1_api, namespace, pod.metadata.name, app_paths["log_file_path"])
-
-            namespace_report["pods"].append(pod_details)
-
-        report.append(namespace_report)
-
-    # Write the report to /tmp
-    report_file_path = "/tmp/pod_test_results.json"
-    with open(report_file_path, "w") as results_file:
-        json.dump(report, results_file, indent=2)
-
-    logging.info(f"Test results written to {report_file_path}")
-    
-    # Calculate test results and generate XML report
-    total_tests, passed_tests, success_percentage = calculate_test_results(report)
-    xml_report_path = generate_xml_report(report, total_tests, passed_tests, success_percentage)
-    logging.info(f"XML Test Report: {xml_report_path}")
+    # Byte offsets of the pod logs already scanned by earlier runs, when a checkpoint file is configured
+    checkpoints = LogCheckpoints(LOG_CHECKPOINT_FILE) if LOG_CHECKPOINT_FILE else None
+
+    # Curl checks go straight from this pod over HTTP, or through exec in the target pods
+    engine = ProbeEngine() if probe_mode() == "http" else None
+
+    # Namespaces run side by side; every check result is written to the JSON lines as soon as it is known,
+    # and each namespace's JUnit suite as soon as the namespace is done
+    results = CheckResults()
+    writers = [JsonLinesWriter(RESULTS_FILE), JUnitWriter(JUNIT_FILE, list(REGISTRY))]
+    results.listeners.extend(writers)
+    pool = CheckPool(MAX_WORKERS, MAX_WORKERS_PER_NAMESPACE)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_NAMESPACES, len(namespaces))), thread_name_prefix="namespace") as executor:
+            futures = [executor.submit(check_namespace, pool, namespace, test_cases, test_case_paths, results, checkpoints, engine) for namespace in namespaces]
+            for future in futures:
+                future.result()
+    finally:
+        pool.shutdown()
+        if engine:
+            engine.close()
+        total_tests, passed_tests, success_percentage = results.summary()
+        for writer in writers:
+            writer.close(total_tests, passed_tests, success_percentage)
+    logging.info(f"Checked {len(namespaces)} namespace(s) in {time.monotonic() - start:.1f}s")
+    logging.info(f"Test results written to {RESULTS_FILE}")
+    logging.info(f"JUnit XML report: {JUNIT_FILE}")
+    logging.info(f"{passed_tests} of {total_tests} check(s) passed")
 
     # Print the test results to stdout
     if success_percentage < 100:
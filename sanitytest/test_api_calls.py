@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import count_api_calls
+
+@pytest.fixture(scope="module")
+def sanity():
+    return count_api_calls.load_sanity(readiness_timeout=1)
+
+# One pod list per namespace, one exec session per pod running every exec check of that pod once, and
+# one probe per URL, with and without pods that never become ready
+@pytest.mark.parametrize("not_ready", [0, 1])
+@pytest.mark.parametrize("probe_mode", ["http", "exec"])
+def test_api_calls(sanity, probe_mode, not_ready, tmp_path, monkeypatch):
+    monkeypatch.setattr(sanity, "RESULTS_FILE", str(tmp_path / "results.jsonl"))
+    monkeypatch.setattr(sanity, "JUNIT_FILE", str(tmp_path / "report.xml"))
+    api, engine, namespaces, _ = count_api_calls.run(3, pods=3, other_pods=1, probe_mode=probe_mode, not_ready=not_ready)
+
+    assert [api.calls_by_namespace[(namespace, "list_namespaced_pod")] for namespace in namespaces] == [1] * len(namespaces)
+    problems, expected, probes = count_api_calls.find_problems(api, engine, namespaces, probe_mode)
+    assert problems == []
+    assert sum(api.exec_sessions.values()) == len({key[:2] for key in expected})
+    if probe_mode == "http":
+        assert sum(engine.probes.values()) == sum(probes.values()) > 0
+    else:
+        assert any(kind in ("api_curl", "web_curl") for _, _, kind in expected)
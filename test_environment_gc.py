@@ -0,0 +1,22 @@
+import datetime
+from types import SimpleNamespace
+
+from environment_gc import expiry_reason
+
+def _group(**tags):
+    return SimpleNamespace(name='rg-test', tags=tags)
+
+def _days_ago(days):
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+def test_old_environment_expires_by_age():
+    group = _group(PurposeOfCreation='Testing', DateOfCommission=_days_ago(30))
+    assert expiry_reason(group, max_age_days=7) == f"created {_days_ago(30)}, older than 7 days"
+
+def test_stable_environment_is_not_aged_out():
+    group = _group(PurposeOfCreation='Testing', DateOfCommission=_days_ago(30), DateOfDecommission='TBD')
+    assert expiry_reason(group, max_age_days=7) is None
+
+def test_past_decommission_date_expires():
+    group = _group(DateOfCommission=_days_ago(3), DateOfDecommission=_days_ago(1))
+    assert expiry_reason(group) == f"decommission date {_days_ago(1)} reached"